@@ -63,6 +63,22 @@ def get_accidente_scoped_or_404(user, codigo, select_related=()):
     return acc
 
 
+# Roles que solo pueden abrir los accidentes que tienen asignados (ver get_accidente_scoped_or_404)
+ROLES_SOLO_ASIGNADOS = {"investigador_ist", "investigador"}
+
+
+def accidentes_accesibles(user):
+    """
+    Accidentes que el usuario puede abrir: visibles_para(user) y, para los
+    investigadores, solo los asignados. Para listados y búsquedas que muestran
+    contenido de los casos (mismo criterio que get_accidente_scoped_or_404).
+    """
+    qs = Accidentes.objects.visibles_para(user)
+    if getattr(user, "rol", None) in ROLES_SOLO_ASIGNADOS:
+        qs = qs.filter(usuario_asignado_id=getattr(user, "id", None))
+    return qs
+
+
 def scope_empresas_q(user) -> Q:
     rol = getattr(user, "rol", None)
     if rol in {"admin", "admin_ist", "investigador_ist"}:
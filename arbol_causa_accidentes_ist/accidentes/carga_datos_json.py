@@ -15,6 +15,7 @@ from accidentes.models import (
     Accidentes, ArbolCausas, Declaraciones, Documentos,
     Hechos, Informes, PreguntasGuia, Prescripciones, AccidenteJsonData, Relato
 )
+from accidentes.utils.arbol_historial import archivar_anteriores, desarchivar
 
 from pathlib import Path
 from typing import Any, Dict, List, Union, Tuple, Optional
@@ -978,6 +979,7 @@ def upsert_arbol_causas(records: List[Dict[str, Any]]) -> Tuple[int, int, List[s
     logs: List[str] = []
 
     supports_fecha = _model_has_field(ArbolCausas, "fecha_registro")
+    casos: set = set()
 
     for idx, r in enumerate(records, 1):
         old_aid = r.get("accidente_id")
@@ -1023,11 +1025,17 @@ def upsert_arbol_causas(records: List[Dict[str, Any]]) -> Tuple[int, int, List[s
                 defaults["fecha_registro"] = dt
 
         try:
+            # Una versión archivada puede ser base de otras: se materializa antes de sobrescribirla
+            existente = ArbolCausas.objects.filter(accidente=accidente, version=version).first()
+            if existente is not None:
+                desarchivar(existente)
+
             obj, was_created = ArbolCausas.objects.update_or_create(
                 accidente=accidente,
                 version=version,
                 defaults=defaults
             )
+            casos.add(accidente.pk)
 
             if was_created:
                 created += 1
@@ -1039,6 +1047,13 @@ def upsert_arbol_causas(records: List[Dict[str, Any]]) -> Tuple[int, int, List[s
         except Exception as e:
             errors.append(f"[arbol_causas:{idx}] ERROR -> {e}")
 
+    # Versiones no vigentes -> historial comprimido
+    for accidente_pk in casos:
+        try:
+            archivar_anteriores(accidente_pk)
+        except Exception as e:
+            errors.append(f"[arbol_causas] accidente={accidente_pk} ERROR al archivar -> {e}")
+
     return created, updated, logs, errors
 
 # ========== HECHOS (CON MAPEO MEJORADO) ==========
@@ -0,0 +1,41 @@
+# accidentes/management/commands/agrupar_causas.py
+"""
+Recalcula los grupos de causas recurrentes (CausaCluster) que leen los
+tableros del panel de administración. Pensado para cron (p.ej. cada noche).
+
+Con django-tenants, por esquema:
+    python manage.py tenant_command agrupar_causas --schema=<schema>
+    python manage.py all_tenants_command agrupar_causas
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from accidentes.utils.causa_clusters import MAX_CLUSTERS, UMBRAL, ambitos, calcular
+
+
+class Command(BaseCommand):
+    help = "Agrupa las causas raíz (hojas de los árboles vigentes) por similitud TF-IDF, por ámbito."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--umbral", type=float, default=UMBRAL,
+                            help=f"Similitud coseno mínima con el centro del grupo (por defecto {UMBRAL}).")
+        parser.add_argument("--max-clusters", type=int, default=MAX_CLUSTERS,
+                            help=f"Grupos guardados por ámbito (por defecto {MAX_CLUSTERS}).")
+        parser.add_argument("--solo-global", action="store_true",
+                            help="Solo el ámbito global (sin holdings ni empresas).")
+
+    def handle(self, *args, **opts):
+        t0 = time.monotonic()
+        n_ambitos = n_grupos = 0
+        for ambito, ambito_id in ambitos():
+            if opts["solo_global"] and ambito_id is not None:
+                break
+            grupos = calcular(ambito, ambito_id, umbral=opts["umbral"], max_clusters=opts["max_clusters"])
+            self.stdout.write(f"  {ambito}{'' if ambito_id is None else f' {ambito_id}'}: {grupos} grupos")
+            n_ambitos += 1
+            n_grupos += grupos
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Causas recurrentes: {n_grupos} grupos en {n_ambitos} ámbitos ({time.monotonic() - t0:.1f}s)"
+        ))
@@ -0,0 +1,320 @@
+# accidentes/management/commands/bench_arbol.py
+"""
+Benchmark reproducible de CausalTree y del dibujo del árbol (sin red; Graphviz
+solo si está el binario 'dot' local).
+
+Árboles sintéticos (semilla fija) de tres formas y varios tamaños:
+  balanceado : cada nodo con hasta 4 hijos, por niveles
+  profundo   : cadenas de hasta 100 niveles colgando de la raíz
+  ancho      : todos los nodos hijos directos de la raíz
+
+Métricas (ms, mediana y mínimo de --repeticiones): construir, cada edición
+(sobre un árbol recién construido), export JSON, DOT, SVG nativo (en frío y
+con caché de formas) y SVG con dot. Con --vistas, además ArbolIAView
+(GET del partial y POST add_child) dentro de una transacción que se revierte.
+
+  python manage.py bench_arbol --salida bench.json
+  python manage.py bench_arbol --tamanos 10 100 --comparar bench.json --estricto
+"""
+import gc
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from importlib import import_module
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from graphviz import ExecutableNotFound
+
+from accidentes.utils import clave_5q, graphviz_service, tree_layout
+from accidentes.utils.causal_tree import CausalTree
+
+FORMAS = ("balanceado", "profundo", "ancho")
+TAMANOS = (10, 100, 1000, 5000)
+RAMAS_BALANCEADO = 4
+PROFUNDIDAD_MAX = 100
+BASE_PATH = "/bench/arbol/"
+
+PALABRAS = (
+    "falta de EPP superficie resbaladiza piso mojado fatiga turno extendido iluminación "
+    "deficiente capacitación insuficiente supervisión herramienta dañada procedimiento "
+    "ausente ruido calor andamio escalera bodega derrame presión tiempo trabajador"
+).split()
+
+
+class _Revertir(Exception):
+    """Fuerza el rollback de la transacción de --vistas."""
+
+
+# ----------------- árboles sintéticos -----------------
+def arbol_sintetico(forma: str, n: int, semilla: int) -> dict:
+    rnd = random.Random(f"{forma}:{n}:{semilla}")
+
+    def etiqueta():
+        return " ".join(rnd.choice(PALABRAS) for _ in range(rnd.randint(2, 9))).capitalize()
+
+    hijos = {clave_5q.RAIZ: 0}
+    codes = [clave_5q.RAIZ]
+
+    def agregar(padre: int) -> int:
+        hijos[padre] += 1
+        code = clave_5q.con_digito(padre, clave_5q.nivel(padre), hijos[padre])
+        hijos[code] = 0
+        codes.append(code)
+        return code
+
+    if forma == "balanceado":
+        i = 0
+        while len(codes) < n:
+            padre = codes[i]
+            for _ in range(min(RAMAS_BALANCEADO, n - len(codes))):
+                agregar(padre)
+            i += 1
+    elif forma == "profundo":
+        actual = clave_5q.RAIZ
+        while len(codes) < n:
+            actual = agregar(actual if clave_5q.nivel(actual) < PROFUNDIDAD_MAX else clave_5q.RAIZ)
+    elif forma == "ancho":
+        while len(codes) < n:
+            agregar(clave_5q.RAIZ)
+    else:
+        raise CommandError(f"Forma desconocida: {forma}")
+
+    return {clave_5q.decodificar(c): etiqueta() for c in codes}
+
+
+def _nodo_medio(data: dict) -> str:
+    """Nodo no raíz, determinista, con padre (y en general con subárbol)."""
+    claves = list(data)
+    return claves[max(1, len(claves) // 3)]
+
+
+def _padre(clave: str) -> str:
+    return clave_5q.decodificar(clave_5q.padre(clave_5q.codificar(clave)))
+
+
+# ----------------- medición -----------------
+def medir(fn, repeticiones: int, preparar=None):
+    """Lista de tiempos (ms). 'preparar' arma el argumento fuera del cronómetro."""
+    fn(preparar() if preparar else None)  # calentamiento (imports, cachés de Python)
+    tiempos = []
+    for _ in range(repeticiones):
+        arg = preparar() if preparar else None
+        gc_activo = gc.isenabled()
+        gc.disable()
+        try:
+            t0 = time.perf_counter()
+            fn(arg)
+            tiempos.append((time.perf_counter() - t0) * 1000)
+        finally:
+            if gc_activo:
+                gc.enable()
+    return tiempos
+
+
+def _version_dot():
+    try:
+        proc = subprocess.run([graphviz_service.DOT_BIN, "-V"], capture_output=True, timeout=10)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    return (proc.stderr or proc.stdout).decode("utf-8", errors="replace").strip() or None
+
+
+def _commit_git():
+    try:
+        proc = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              timeout=10, cwd=settings.BASE_DIR)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    return proc.stdout.decode().strip() or None
+
+
+class Command(BaseCommand):
+    help = "Benchmark de CausalTree (construir, editar, exportar, DOT, SVG) con árboles sintéticos."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--formas", nargs="+", choices=FORMAS, default=list(FORMAS))
+        parser.add_argument("--tamanos", nargs="+", type=int, default=list(TAMANOS))
+        parser.add_argument("--repeticiones", type=int, default=5)
+        parser.add_argument("--semilla", type=int, default=1)
+        parser.add_argument("--dot-max", type=int, default=5000,
+                            help="Tamaño máximo para medir el render con dot (0 = no medir).")
+        parser.add_argument("--dot-timeout", type=float, default=120.0)
+        parser.add_argument("--vistas", action="store_true",
+                            help="Mide también ArbolIAView (usa la BD dentro de una transacción revertida).")
+        parser.add_argument("--salida", help="Escribe los resultados en este archivo JSON.")
+        parser.add_argument("--comparar", help="JSON de una corrida anterior para comparar.")
+        parser.add_argument("--tolerancia", type=float, default=0.25,
+                            help="Regresión = mediana > base * (1 + tolerancia). Por defecto 0.25.")
+        parser.add_argument("--estricto", action="store_true",
+                            help="Termina con error si hay regresiones al comparar.")
+
+    # ----------------- casos -----------------
+    def _bench_arbol(self, forma, n, data, rep, dot_max, dot_timeout):
+        texto = json.dumps(data, ensure_ascii=False)
+        nodo = _nodo_medio(data)
+        padre = _padre(nodo)
+        r = {}
+
+        def fresco(current=nodo):
+            tree = CausalTree(texto)
+            tree.set_current(current)
+            return tree
+
+        r["construir"] = medir(lambda _: CausalTree(texto), rep)
+        r["add_child"] = medir(lambda t: t.add_child_node("Nueva causa de prueba"), rep, fresco)
+        r["add_sibling"] = medir(lambda t: t.add_sibling_node("Nuevo hermano de prueba"), rep, fresco)
+        r["edit_label"] = medir(lambda t: t.update_current_label("Etiqueta editada"), rep, fresco)
+        r["insert_between"] = medir(
+            lambda t: t.insert_between_parent_and_child(padre, nodo, "Nodo intercalado"), rep,
+            lambda: fresco(padre),
+        )
+        r["delete_subtree"] = medir(lambda t: t.delete_node(nodo), rep, fresco)
+
+        tree = CausalTree(texto)
+        r["export_json"] = medir(lambda _: tree.export_to_5q_json(), rep)
+        r["generar_dot"] = medir(lambda _: tree.generate_dot(base_path=BASE_PATH), rep)
+        r["svg_nativo_frio"] = medir(lambda _: tree_layout.render_svg(tree, BASE_PATH), rep,
+                                     tree_layout.vaciar_cache)
+        r["svg_nativo"] = medir(lambda _: tree_layout.render_svg(tree, BASE_PATH), rep)
+
+        if n <= dot_max:
+            dot = tree.generate_dot(base_path=BASE_PATH)
+            try:
+                r["svg_dot"] = medir(lambda _: graphviz_service.render_svg(dot, timeout=dot_timeout), rep)
+            except ExecutableNotFound:
+                pass  # sin 'dot' local: meta["dot"] queda en null
+            except graphviz_service.RenderError as e:
+                self.stderr.write(f"  svg_dot {forma}/{n}: {e}")
+        return r
+
+    def _bench_vistas(self, forma, n, data, rep):
+        """ArbolIAView real (RequestFactory) sobre datos temporales; todo se revierte."""
+        from django.contrib.auth import get_user_model
+        from django.contrib.messages.storage.fallback import FallbackStorage
+        from django.test import RequestFactory
+
+        from accidentes.models import Accidentes, ArbolCausas
+        from accidentes.views_api.arbol import ArbolIAView
+
+        r = {}
+        try:
+            with transaction.atomic():
+                codigo = f"BENCH-{forma}-{n}"
+                usuario = get_user_model().objects.create(
+                    username=f"bench-{forma}-{n}", email=f"bench-{forma}-{n}@bench.invalid", rol="admin",
+                )
+                accidente = Accidentes.objects.create(codigo_accidente=codigo)
+                ArbolCausas.objects.create(
+                    accidente=accidente, version=1, is_current=True,
+                    arbol_json_5q=json.dumps(data, ensure_ascii=False),
+                )
+                factory = RequestFactory(HTTP_HX_REQUEST="true")
+                sesion = import_module(settings.SESSION_ENGINE).SessionStore()
+                vista = ArbolIAView.as_view()
+                nodo = _nodo_medio(data)
+
+                def preparar(req):
+                    req.user = usuario
+                    req.session = sesion
+                    req._messages = FallbackStorage(req)
+                    return req
+
+                def get(_):
+                    resp = vista(preparar(factory.get(f"/bench/{codigo}/")), codigo=codigo)
+                    assert resp.status_code == 200, resp.status_code
+
+                def post(_):
+                    req = factory.post(f"/bench/{codigo}/", {"action": "add_child", "new_label": "Causa de prueba"})
+                    resp = vista(preparar(req), codigo=codigo)
+                    assert resp.status_code == 200, resp.status_code
+
+                # cursor en un nodo intermedio (como un usuario navegando)
+                vista(preparar(factory.get(f"/bench/{codigo}/", {"action": "navigate_to", "node_id": nodo})), codigo=codigo)
+                r["vista_get"] = medir(get, rep)
+                r["vista_post_add_child"] = medir(post, rep)
+                raise _Revertir
+        except _Revertir:
+            pass
+        return r
+
+    # ----------------- comparación -----------------
+    def _comparar(self, filas, ruta, tolerancia):
+        try:
+            base = json.loads(Path(ruta).read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError) as e:
+            raise CommandError(f"No se pudo leer {ruta}: {e}")
+        previas = {(f["forma"], f["nodos"], f["metrica"]): f for f in base.get("resultados", [])}
+
+        regresiones = 0
+        self.stdout.write(f"\nComparación contra {ruta} (commit {base.get('meta', {}).get('commit')}):")
+        for f in filas:
+            p = previas.get((f["forma"], f["nodos"], f["metrica"]))
+            if not p or not p["mediana_ms"]:
+                continue
+            razon = f["mediana_ms"] / p["mediana_ms"]
+            # diferencias bajo 0.05 ms son ruido del reloj
+            regresion = razon > 1 + tolerancia and f["mediana_ms"] - p["mediana_ms"] > 0.05
+            regresiones += regresion
+            if regresion or razon < 1 / (1 + tolerancia):
+                marca = "REGRESIÓN" if regresion else "mejora"
+                self.stdout.write(
+                    f"  {marca:<10} {f['forma']:<10} {f['nodos']:>5} {f['metrica']:<20} "
+                    f"{p['mediana_ms']:>10.3f} -> {f['mediana_ms']:>10.3f} ms (x{razon:.2f})"
+                )
+        return regresiones
+
+    # ----------------- main -----------------
+    def handle(self, *args, **opts):
+        rep = max(1, opts["repeticiones"])
+        meta = {
+            "fecha": datetime.now().isoformat(timespec="seconds"),
+            "commit": _commit_git(),
+            "python": sys.version.split()[0],
+            "django": django.get_version(),
+            "plataforma": platform.platform(),
+            "dot": _version_dot(),
+            "motor_render": getattr(settings, "ARBOL_RENDER_ENGINE", "nativo"),
+            "semilla": opts["semilla"],
+            "repeticiones": rep,
+        }
+        self.stdout.write(f"bench_arbol: {json.dumps(meta, ensure_ascii=False)}")
+
+        filas = []
+        for forma in opts["formas"]:
+            for n in sorted(opts["tamanos"]):
+                data = arbol_sintetico(forma, max(2, n), opts["semilla"])
+                metricas = self._bench_arbol(forma, n, data, rep, opts["dot_max"], opts["dot_timeout"])
+                if opts["vistas"]:
+                    metricas.update(self._bench_vistas(forma, n, data, rep))
+                for metrica, tiempos in metricas.items():
+                    fila = {
+                        "forma": forma, "nodos": n, "metrica": metrica,
+                        "mediana_ms": round(statistics.median(tiempos), 4),
+                        "min_ms": round(min(tiempos), 4),
+                        "repeticiones": len(tiempos),
+                    }
+                    filas.append(fila)
+                    self.stdout.write(
+                        f"  {forma:<10} {n:>5} {metrica:<20} {fila['mediana_ms']:>10.3f} ms  (min {fila['min_ms']:.3f})"
+                    )
+
+        if opts["salida"]:
+            Path(opts["salida"]).write_text(
+                json.dumps({"meta": meta, "resultados": filas}, ensure_ascii=False, indent=2), encoding="utf-8"
+            )
+            self.stdout.write(self.style.SUCCESS(f"Resultados en {opts['salida']}"))
+
+        if opts["comparar"]:
+            regresiones = self._comparar(filas, opts["comparar"], opts["tolerancia"])
+            if regresiones and opts["estricto"]:
+                raise CommandError(f"{regresiones} regresiones sobre la tolerancia de {opts['tolerancia']:.0%}")
+            self.stdout.write(self.style.SUCCESS(f"{regresiones} regresiones sobre la tolerancia."))
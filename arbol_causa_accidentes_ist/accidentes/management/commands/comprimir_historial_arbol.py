@@ -0,0 +1,39 @@
+# accidentes/management/commands/comprimir_historial_arbol.py
+"""
+Pasa al historial comprimido las versiones no vigentes de ArbolCausas que
+siguen materializadas (datos anteriores al historial comprimido).
+
+Con django-tenants, por esquema:
+    python manage.py tenant_command comprimir_historial_arbol --schema=<schema>
+    python manage.py all_tenants_command comprimir_historial_arbol
+"""
+from django.core.management.base import BaseCommand
+from django.db.models import Sum
+from django.db.models.functions import Length
+
+from accidentes.models import ArbolCausas
+from accidentes.utils.arbol_historial import archivar_anteriores
+
+
+class Command(BaseCommand):
+    help = "Comprime las versiones no vigentes del árbol de causas (deltas zlib contra la versión siguiente)."
+
+    def handle(self, *args, **options):
+        pendientes = ArbolCausas.objects.filter(is_current=False, arbol_json_5q__isnull=False)
+        antes = pendientes.aggregate(
+            j=Sum(Length("arbol_json_5q")), d=Sum(Length("arbol_json_dot"))
+        )
+        casos = list(pendientes.values_list("accidente_id", flat=True).distinct())
+
+        total = 0
+        for accidente_id in casos:
+            total += archivar_anteriores(accidente_id)
+
+        comprimido = ArbolCausas.objects.filter(
+            accidente_id__in=casos, arbol_comprimido__isnull=False
+        ).aggregate(b=Sum(Length("arbol_comprimido")))["b"] or 0
+        texto = (antes["j"] or 0) + (antes["d"] or 0)
+        self.stdout.write(self.style.SUCCESS(
+            f"Versiones archivadas: {total} en {len(casos)} casos "
+            f"({texto} caracteres de JSON/DOT -> {comprimido} bytes comprimidos en esos casos)"
+        ))
@@ -0,0 +1,175 @@
+# accidentes/management/commands/ia_stub.py
+"""
+Servidor local compatible con la API de chat de OpenAI, para pruebas de las
+vistas IA sin llamar al modelo real (ni gastar tokens):
+
+    python manage.py ia_stub --puerto 8765 --demora 2
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 python manage.py runserver
+
+Reconoce el prompt por su instrucción (system) y responde un contenido fijo
+válido para cada vista; --respuestas permite reemplazarlos con un JSON
+{prompt_key: texto u objeto}. Soporta stream=True (SSE por fragmentos).
+'--demora' simula la latencia del modelo para medir concurrencia y
+'--fallos' hace que las primeras N solicitudes respondan 500 (reintentos).
+
+Los tests (accidentes/tests.py) levantan el mismo servidor con servidor().
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accidentes.utils.prompts_ia import registro as prompts
+
+RAIZ_5Q = "0.0.0.0.0.0.0.0.0"
+
+RESPUESTAS = {
+    "relato_inicial": "Relato inicial de prueba: el trabajador realizaba su tarea habitual cuando ocurrió el accidente.",
+    "frasear_preguntas": "Frase de prueba que resume la pregunta y su respuesta.",
+    "investiga1": "¿Qué estaba haciendo el trabajador justo antes del accidente?",
+    "investiga2": "¿Qué condiciones del lugar influyeron en el accidente?",
+    "investiga3": "¿Qué medidas de control existían al momento del accidente?",
+    "reporte_final": "Relato final de prueba, redactado a partir del relato inicial y las respuestas.",
+    "hechos": "1. El trabajador realizaba una tarea habitual.\n2. El piso estaba húmedo.\n3. El trabajador resbaló y cayó.",
+    "resumen": "Resumen de prueba del accidente.",
+    "explora": {
+        "accidentado": [{"id": "a1", "pregunta": "¿Qué tarea realizaba?", "objetivo": "Contexto"}],
+        "testigo": [{"id": "t1", "pregunta": "¿Qué observó?", "objetivo": "Secuencia"}],
+        "supervisor": [{"id": "s1", "pregunta": "¿Cómo se planificó la tarea?", "objetivo": "Gestión"}],
+        "documentos": [{"id": "d1", "documento": "Procedimiento de trabajo", "objetivo": "Verificar controles"}],
+    },
+    "arbol_causas": {
+        RAIZ_5Q: "Caída del trabajador al mismo nivel",
+        "1.0.0.0.0.0.0.0.0": "Piso húmedo",
+        "1.1.0.0.0.0.0.0.0": "Falta de limpieza programada",
+        "2.0.0.0.0.0.0.0.0": "Calzado inadecuado",
+        "2.1.0.0.0.0.0.0.0": "No se entregó calzado antideslizante",
+    },
+    "medidas": {
+        "medidas": [
+            {"tipo": "Ingeniería", "prioridad": "Alta", "descripcion": "Instalar piso antideslizante.",
+             "responsable": "jefe de mantención", "fecha": ""},
+            {"tipo": "Administrativa", "prioridad": "Media", "descripcion": "Programa de limpieza por turno.",
+             "responsable": "supervisor", "fecha": ""},
+        ]
+    },
+}
+
+
+def _texto(valor) -> str:
+    return valor if isinstance(valor, str) else json.dumps(valor, ensure_ascii=False)
+
+
+def servidor(host: str = "127.0.0.1", puerto: int = 0, demora: float = 0.0,
+             respuestas: Optional[dict] = None, fallos: int = 0, stdout=None) -> ThreadingHTTPServer:
+    """
+    Servidor stub listo para serve_forever() (puerto 0: uno libre, ver
+    server_address). 'pedidos' cuenta las solicitudes recibidas.
+    """
+    respuestas = {**RESPUESTAS, **(respuestas or {})}
+    por_instruccion = {cfg["instruction"]: key for key, cfg in prompts.todos().items()}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, fmt, *args):
+            if stdout is not None:
+                stdout.write("  " + fmt % args)
+
+        def _json(self, status: int, data: dict):
+            body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                return self._json(404, {"error": {"message": f"Ruta no soportada: {self.path}"}})
+            largo = int(self.headers.get("Content-Length") or 0)
+            try:
+                pedido = json.loads(self.rfile.read(largo) or b"{}")
+            except json.JSONDecodeError:
+                return self._json(400, {"error": {"message": "JSON inválido"}})
+            with lock:
+                srv.pedidos += 1
+                n = srv.pedidos
+            if n <= fallos:
+                return self._json(500, {"error": {"message": "Error de prueba del stub"}})
+
+            system = next((m.get("content") for m in pedido.get("messages", []) if m.get("role") == "system"), "")
+            prompt_key = por_instruccion.get(system, "")
+            contenido = _texto(respuestas.get(prompt_key, f"Respuesta de prueba ({prompt_key or 'sin prompt'})."))
+            if demora:
+                time.sleep(demora)
+
+            base = {
+                "id": f"stub-{n}",
+                "created": int(time.time()),
+                "model": pedido.get("model", "stub"),
+            }
+            if not pedido.get("stream"):
+                return self._json(200, {
+                    **base,
+                    "object": "chat.completion",
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": contenido}}],
+                    "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+                })
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            paso = 16
+            for i in range(0, len(contenido), paso):
+                chunk = {**base, "object": "chat.completion.chunk",
+                         "choices": [{"index": 0, "finish_reason": None,
+                                      "delta": {"content": contenido[i:i + paso]}}]}
+                self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.close_connection = True
+
+    srv = ThreadingHTTPServer((host, puerto), Handler)
+    srv.daemon_threads = True
+    srv.pedidos = 0
+    return srv
+
+
+class Command(BaseCommand):
+    help = "Servidor local compatible con OpenAI (chat.completions) con respuestas fijas, para pruebas."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--puerto", type=int, default=8765)
+        parser.add_argument("--demora", type=float, default=0.0,
+                            help="Segundos de espera antes de responder (simula la latencia del modelo).")
+        parser.add_argument("--fallos", type=int, default=0,
+                            help="Las primeras N solicitudes responden 500 (prueba los reintentos).")
+        parser.add_argument("--respuestas", help="JSON {prompt_key: respuesta} que reemplaza las respuestas fijas.")
+
+    def handle(self, *args, **opts):
+        respuestas = {}
+        if opts["respuestas"]:
+            try:
+                with open(opts["respuestas"], encoding="utf-8") as f:
+                    respuestas = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                raise CommandError(f"No se pudo leer {opts['respuestas']}: {e}")
+
+        srv = servidor(opts["host"], opts["puerto"], opts["demora"], respuestas, opts["fallos"], stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(
+            f"Stub IA en http://{opts['host']}:{opts['puerto']}/v1 (demora {opts['demora']}s). Ctrl+C para salir."
+        ))
+        try:
+            srv.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            srv.server_close()
@@ -0,0 +1,34 @@
+# accidentes/management/commands/indexar_arboles.py
+"""
+Regenera el índice de búsqueda de nodos (arbol_indice_nodos / _terminos) a
+partir de las versiones vigentes de ArbolCausas (journal incluido).
+
+Con django-tenants, por esquema:
+    python manage.py tenant_command indexar_arboles --schema=<schema>
+    python manage.py all_tenants_command indexar_arboles
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from accidentes.models import ArbolCausas, NodoArbolIndice
+from accidentes.utils.arbol_indice import indexar
+from accidentes.utils.arbol_journal import json_5q_vigente
+
+
+class Command(BaseCommand):
+    help = "Regenera el índice de búsqueda de las etiquetas del árbol de causas."
+
+    def handle(self, *args, **options):
+        t0 = time.monotonic()
+        # entradas de versiones que ya no son vigentes (o de casos sin árbol)
+        NodoArbolIndice.objects.exclude(arbol__is_current=True).delete()
+
+        casos = nodos = 0
+        for arbol in ArbolCausas.objects.filter(is_current=True, arbol_json_5q__isnull=False).iterator(chunk_size=200):
+            nodos += indexar(arbol, json_5q_vigente(arbol))
+            casos += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Índice regenerado: {nodos} nodos de {casos} casos en {time.monotonic() - t0:.1f}s"
+        ))
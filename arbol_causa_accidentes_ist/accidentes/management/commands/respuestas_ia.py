@@ -0,0 +1,41 @@
+# accidentes/management/commands/respuestas_ia.py
+"""
+Estado y mantenimiento del almacén de respuestas IA (RespuestaIA).
+
+    python manage.py respuestas_ia              # entradas, tamaño y aciertos por prompt
+    python manage.py respuestas_ia --podar      # aplica IA_RESPUESTAS_MAX_DIAS / _MAX / _MAX_MB
+    python manage.py respuestas_ia --vaciar     # borra todo (p.ej. tras cambiar de modelo)
+
+Con django-tenants, por esquema:
+    python manage.py tenant_command respuestas_ia --schema=<schema>
+    python manage.py all_tenants_command respuestas_ia --podar
+"""
+from django.core.management.base import BaseCommand
+
+from accidentes.models import RespuestaIA
+from accidentes.utils import respuestas_ia
+
+
+class Command(BaseCommand):
+    help = "Muestra, poda o vacía el almacén persistente de respuestas IA."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--podar", action="store_true", help="Aplica los límites de antigüedad y tamaño.")
+        parser.add_argument("--vaciar", action="store_true", help="Borra todas las respuestas guardadas.")
+
+    def handle(self, *args, **opts):
+        if opts["vaciar"]:
+            borradas, _ = RespuestaIA.objects.all().delete()
+            self.stdout.write(self.style.WARNING(f"{borradas} respuestas borradas"))
+        elif opts["podar"]:
+            borradas = respuestas_ia.podar()
+            self.stdout.write(self.style.SUCCESS(f"{borradas} respuestas podadas"))
+
+        st = respuestas_ia.estadisticas()
+        self.stdout.write(
+            f"{st['entradas']} respuestas, {st['bytes'] / 1024:.0f} KB, {st['aciertos']} aciertos "
+            f"(límites: {respuestas_ia.MAX_ENTRADAS} entradas, {respuestas_ia.MAX_BYTES // (1024 * 1024)} MB, "
+            f"{respuestas_ia.MAX_DIAS} días sin uso)"
+        )
+        for fila in st["por_prompt"]:
+            self.stdout.write(f"  {fila['prompt']:<24} {fila['entradas']:>6} respuestas {fila['aciertos'] or 0:>8} aciertos")
@@ -0,0 +1,168 @@
+# accidentes/management/commands/validar_arboles.py
+"""
+Valida (y opcionalmente repara) la estructura de los JSON 5Q guardados en
+ArbolCausas, en todos los esquemas de tenant.
+
+  python manage.py validar_arboles                     # todos los tenants, solo reporte
+  python manage.py validar_arboles --schema acme --reparar
+  python manage.py validar_arboles --procesos 8 --lote 500 --historial
+
+Las filas se leen con un iterador (cursor en servidor, de a --lote filas) y
+se validan en procesos de trabajo; en vuelo hay a lo más 2 lotes por proceso,
+así que la memoria no depende del tamaño del tenant. Las reparaciones se
+escriben desde el proceso principal (reaplicando el journal pendiente sobre el
+JSON reparado). Las versiones archivadas (--historial) solo se reportan.
+"""
+import multiprocessing
+import os
+import time
+from collections import Counter, deque
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from accidentes.models import ArbolCausas
+from accidentes.utils.arbol_historial import json_5q_version
+from accidentes.utils.arbol_journal import cargar_arbol, compactar
+from accidentes.utils.arbol_validacion import validar_lote
+
+
+class Command(BaseCommand):
+    help = "Valida y repara la estructura de los árboles de causas (JSON 5Q) de todos los tenants."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--schema", action="append", dest="schemas",
+                            help="Solo este esquema (se puede repetir). Por defecto: todos los tenants.")
+        parser.add_argument("--procesos", type=int, default=os.cpu_count() or 2,
+                            help="Procesos de trabajo (por defecto: CPUs).")
+        parser.add_argument("--lote", type=int, default=200, help="Filas por lote enviado a un proceso.")
+        parser.add_argument("--reparar", action="store_true",
+                            help="Escribe el JSON reparado en las versiones materializadas con problemas.")
+        parser.add_argument("--historial", action="store_true",
+                            help="Incluye versiones archivadas (comprimidas); solo reporte.")
+        parser.add_argument("--detalle", action="store_true", help="Una línea por árbol con problemas.")
+
+    # ----------------- esquemas -----------------
+    def _esquemas(self, pedidos):
+        """Lista de esquemas a recorrer; [None] sin django-tenants (p.ej. SQLite en desarrollo)."""
+        if "django_tenants" not in settings.INSTALLED_APPS or not hasattr(connection, "set_schema"):
+            if pedidos:
+                raise CommandError("--schema requiere django-tenants con PostgreSQL.")
+            return [None]
+        from django_tenants.utils import get_public_schema_name, get_tenant_model
+
+        qs = get_tenant_model().objects.exclude(schema_name=get_public_schema_name())
+        if pedidos:
+            qs = qs.filter(schema_name__in=pedidos)
+        return list(qs.order_by("schema_name").values_list("schema_name", flat=True))
+
+    # ----------------- lectura en streaming -----------------
+    def _lotes(self, lote: int, historial: bool):
+        """Genera lotes [(pk, texto)] de materializadas y, si se pide, de archivadas."""
+        filas = (
+            ArbolCausas.objects.filter(arbol_json_5q__isnull=False)
+            .order_by("pk").values_list("pk", "arbol_json_5q").iterator(chunk_size=lote)
+        )
+        buf = []
+        for fila in filas:
+            buf.append(fila)
+            if len(buf) >= lote:
+                yield buf, True
+                buf = []
+        if buf:
+            yield buf, True
+
+        if not historial:
+            return
+        buf = []
+        archivadas = (
+            ArbolCausas.objects.filter(arbol_json_5q__isnull=True, arbol_comprimido__isnull=False)
+            .order_by("pk").iterator(chunk_size=lote)
+        )
+        for arbol in archivadas:
+            try:
+                buf.append((arbol.pk, json_5q_version(arbol)))
+            except Exception:
+                buf.append((arbol.pk, None))  # cadena de deltas rota -> json_invalido
+            if len(buf) >= lote:
+                yield buf, False
+                buf = []
+        if buf:
+            yield buf, False
+
+    # ----------------- reparación -----------------
+    def _reparar(self, pk: int, reparado: str) -> None:
+        arbol = ArbolCausas.objects.select_related("accidente").get(pk=pk)
+        arbol.arbol_json_5q = reparado
+        # journal pendiente reaplicado sobre el snapshot reparado y materializado
+        tree = cargar_arbol(arbol)
+        compactar(arbol, tree, codigo=arbol.accidente.codigo_accidente)
+
+    # ----------------- main -----------------
+    def handle(self, *args, **opts):
+        procesos = max(1, opts["procesos"])
+        lote = max(1, opts["lote"])
+        reparar = opts["reparar"]
+        en_vuelo_max = procesos * 2
+
+        esquemas = self._esquemas(opts["schemas"])
+        totales = Counter()
+        t0 = time.monotonic()
+
+        # spawn: los procesos no heredan conexiones a la BD (la validación es pura)
+        ctx = multiprocessing.get_context("spawn")
+        with ctx.Pool(processes=procesos) as pool:
+            for esquema in esquemas:
+                if esquema is not None:
+                    connection.set_schema(esquema)
+                nombre = esquema or "default"
+                stats = Counter()
+                t_esq = time.monotonic()
+
+                def consumir(resultado, reparable):
+                    for pk, nbytes, problemas, reparado in resultado.get():
+                        stats["arboles"] += 1
+                        stats["bytes"] += nbytes
+                        if not problemas:
+                            continue
+                        stats["con_problemas"] += 1
+                        stats.update(f"p:{p['tipo']}" for p in problemas)
+                        if opts["detalle"]:
+                            tipos = ", ".join(sorted({p["tipo"] for p in problemas}))
+                            self.stdout.write(f"  [{nombre}] arbol_id={pk}: {tipos}")
+                        if reparable and reparado is not None:
+                            self._reparar(pk, reparado)
+                            stats["reparados"] += 1
+
+                pendientes = deque()
+                for filas, reparable in self._lotes(lote, opts["historial"]):
+                    pendientes.append((
+                        pool.apply_async(validar_lote, (filas, reparar and reparable)), reparable,
+                    ))
+                    if len(pendientes) >= en_vuelo_max:
+                        consumir(*pendientes.popleft())
+                while pendientes:
+                    consumir(*pendientes.popleft())
+
+                seg = max(time.monotonic() - t_esq, 1e-6)
+                self.stdout.write(
+                    f"[{nombre}] {stats['arboles']} árboles, {stats['con_problemas']} con problemas, "
+                    f"{stats['reparados']} reparados — {stats['arboles'] / seg:.0f} árboles/s, "
+                    f"{stats['bytes'] / seg / 1e6:.2f} MB/s"
+                )
+                totales.update(stats)
+
+        if esquemas and esquemas[0] is not None:
+            connection.set_schema_to_public()
+
+        seg = max(time.monotonic() - t0, 1e-6)
+        problemas = {k[2:]: v for k, v in totales.items() if k.startswith("p:")}
+        self.stdout.write(self.style.SUCCESS(
+            f"Total: {totales['arboles']} árboles en {len(esquemas)} esquemas, "
+            f"{totales['con_problemas']} con problemas, {totales['reparados']} reparados "
+            f"en {seg:.1f}s ({totales['arboles'] / seg:.0f} árboles/s, "
+            f"{totales['bytes'] / seg / 1e6:.2f} MB/s, {procesos} procesos)"
+        ))
+        for tipo, n in sorted(problemas.items(), key=lambda kv: -kv[1]):
+            self.stdout.write(f"  {tipo}: {n}")
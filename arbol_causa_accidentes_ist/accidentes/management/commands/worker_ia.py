@@ -0,0 +1,93 @@
+# accidentes/management/commands/worker_ia.py
+"""
+Worker de la cola de trabajos IA (TrabajoIA), en todos los esquemas de tenant.
+
+  python manage.py worker_ia                   # bucle; SIGTERM termina el trabajo en curso y sale
+  python manage.py worker_ia --una-vez         # vacía la cola y sale (cron / pruebas)
+  python manage.py worker_ia --schema acme --intervalo 1
+
+Se pueden levantar varios workers: cada trabajo se reclama con
+select_for_update(skip_locked=True), así que nadie toma el mismo dos veces.
+"""
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+
+from accidentes.utils import trabajos_ia
+
+
+class Command(BaseCommand):
+    help = "Ejecuta los trabajos IA en cola (relato, hechos, árbol, medidas, explora, informe)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--schema", action="append", dest="schemas",
+                            help="Solo este esquema (se puede repetir). Por defecto: todos los tenants.")
+        parser.add_argument("--una-vez", action="store_true", dest="una_vez",
+                            help="Procesa lo pendiente y termina.")
+        parser.add_argument("--intervalo", type=float, default=2.0,
+                            help="Segundos de espera cuando la cola está vacía.")
+
+    # ----------------- esquemas -----------------
+    def _esquemas(self, pedidos):
+        """Lista de esquemas a recorrer; [None] sin django-tenants (p.ej. SQLite en desarrollo)."""
+        if "django_tenants" not in settings.INSTALLED_APPS or not hasattr(connection, "set_schema"):
+            if pedidos:
+                raise CommandError("--schema requiere django-tenants con PostgreSQL.")
+            return [None]
+        from django_tenants.utils import get_public_schema_name, get_tenant_model
+
+        connection.set_schema_to_public()
+        qs = get_tenant_model().objects.exclude(schema_name=get_public_schema_name())
+        if pedidos:
+            qs = qs.filter(schema_name__in=pedidos)
+        return list(qs.order_by("schema_name").values_list("schema_name", flat=True))
+
+    # ----------------- bucle -----------------
+    def _vaciar(self, esquema) -> int:
+        """Ejecuta los pendientes de un esquema; devuelve cuántos tomó."""
+        if esquema is not None:
+            connection.set_schema(esquema)
+        nombre = esquema or "default"
+        vencidos = trabajos_ia.recuperar_vencidos()
+        if vencidos:
+            self.stdout.write(self.style.WARNING(f"[{nombre}] {vencidos} trabajos vencidos recuperados"))
+        n = 0
+        while not self._salir:
+            trabajo = trabajos_ia.tomar()
+            if trabajo is None:
+                break
+            n += 1
+            t0 = time.monotonic()
+            ok = trabajos_ia.ejecutar(trabajo)
+            estilo = self.style.SUCCESS if ok else self.style.ERROR
+            self.stdout.write(estilo(
+                f"[{nombre}] {trabajo.tipo} #{trabajo.pk} ({trabajo.accidente_id}) "
+                f"{'listo' if ok else 'error'} en {time.monotonic() - t0:.1f}s"
+            ))
+        return n
+
+    def handle(self, *args, **opts):
+        self._salir = False
+
+        def terminar(signum, frame):
+            self.stdout.write("Señal recibida: se termina al completar el trabajo en curso.")
+            self._salir = True
+
+        signal.signal(signal.SIGTERM, terminar)
+        signal.signal(signal.SIGINT, terminar)
+
+        self.stdout.write(self.style.SUCCESS("Worker IA iniciado."))
+        while not self._salir:
+            close_old_connections()
+            # se relee en cada vuelta: los tenants nuevos entran sin reiniciar
+            esquemas = self._esquemas(opts["schemas"])
+            tomados = sum(self._vaciar(esquema) for esquema in esquemas if not self._salir)
+            if esquemas and esquemas[0] is not None:
+                connection.set_schema_to_public()
+            if opts["una_vez"]:
+                break
+            if not tomados:
+                time.sleep(opts["intervalo"])
@@ -377,12 +377,192 @@ class ArbolCausas(models.Model):
     arbol_json_5q = models.TextField(null=True)
     fecha_registro = models.DateTimeField(auto_now_add=True)
     arbol_json_dot = models.TextField(null=True)
+    # Última operación del journal ya incorporada en arbol_json_5q / arbol_json_dot
+    snapshot_secuencia = models.PositiveIntegerField(default=0)
+    # Versiones no vigentes: JSON 5Q comprimido (zlib) y, si es delta, la versión
+    # usada como diccionario. arbol_json_5q / arbol_json_dot quedan en NULL.
+    arbol_comprimido = models.BinaryField(null=True, editable=False)
+    delta_de = models.SmallIntegerField(null=True, blank=True)
 
     class Meta:
         db_table = 'arbol_causas'
         unique_together = ('accidente', 'version')
 
 
+class ArbolOperacion(models.Model):
+    """
+    Journal append-only de ediciones sobre una versión de ArbolCausas.
+    El árbol vigente = snapshot (arbol_json_5q) + operaciones con
+    secuencia > snapshot_secuencia, reaplicadas en orden.
+    """
+    OPERACION_CHOICES = [
+        ('add_child', 'Agregar hijo'),
+        ('add_sibling', 'Agregar hermano'),
+        ('edit_label', 'Editar etiqueta'),
+        ('delete', 'Eliminar nodo'),
+        ('insert_between', 'Intercalar nodo'),
+    ]
+
+    operacion_id = models.BigAutoField(primary_key=True)
+    arbol = models.ForeignKey(ArbolCausas, on_delete=models.CASCADE, related_name='operaciones')
+    secuencia = models.PositiveIntegerField()
+    operacion = models.CharField(max_length=20, choices=OPERACION_CHOICES)
+    # claves 5Q completas: sin límite de profundidad pueden superar cualquier largo fijo
+    node_id = models.TextField()
+    target_id = models.TextField(null=True, blank=True)  # rama destino (insert_between)
+    label = models.TextField(null=True, blank=True)
+    usuario = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        null=True, blank=True,
+        on_delete=models.SET_NULL,
+        related_name='operaciones_arbol',
+    )
+    creado_en = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'arbol_operaciones'
+        unique_together = ('arbol', 'secuencia')
+        ordering = ['arbol', 'secuencia']
+
+    def __str__(self):
+        return f"{self.operacion} #{self.secuencia} (arbol {self.arbol_id})"
+
+
+class NodoArbolIndice(models.Model):
+    """
+    Nodo de la versión vigente del árbol de un caso, para búsquedas entre casos
+    (ver accidentes/utils/arbol_indice.py). Se regenera, no se edita.
+    """
+    accidente = models.ForeignKey(Accidentes, on_delete=models.CASCADE, related_name='nodos_indice')
+    arbol = models.ForeignKey(ArbolCausas, on_delete=models.CASCADE, related_name='nodos_indice')
+    node_id = models.TextField()  # clave 5Q (ver ArbolOperacion.node_id)
+    label = models.TextField()
+    ruta = models.TextField()  # etiquetas desde la raíz, separadas por " › "
+    nivel = models.PositiveSmallIntegerField()
+
+    class Meta:
+        db_table = 'arbol_indice_nodos'
+
+
+class TerminoArbolIndice(models.Model):
+    """Término normalizado -> nodo (lista invertida)."""
+    termino = models.CharField(max_length=64)
+    nodo = models.ForeignKey(NodoArbolIndice, on_delete=models.CASCADE, related_name='terminos')
+
+    class Meta:
+        db_table = 'arbol_indice_terminos'
+        indexes = [models.Index(fields=['termino', 'nodo'], name='arbol_indice_termino_idx')]
+
+
+class CausaCluster(models.Model):
+    """
+    Grupo de causas raíz parecidas entre casos, precalculado por
+    `manage.py agrupar_causas` (ver accidentes/utils/causa_clusters.py).
+    Un juego de filas por ámbito; se reemplaza completo en cada cálculo.
+    """
+    AMBITO_GLOBAL = 'global'
+    AMBITO_HOLDING = 'holding'
+    AMBITO_EMPRESA = 'empresa'
+    AMBITO_CHOICES = [
+        (AMBITO_GLOBAL, 'Todos los casos'),
+        (AMBITO_HOLDING, 'Holding'),
+        (AMBITO_EMPRESA, 'Empresa'),
+    ]
+
+    ambito = models.CharField(max_length=10, choices=AMBITO_CHOICES)
+    ambito_id = models.IntegerField(null=True, blank=True)  # holding_id / empresa_id
+    posicion = models.PositiveSmallIntegerField()
+    etiqueta = models.TextField()                           # causa más repetida del grupo
+    terminos = models.JSONField(default=list)               # términos de mayor peso TF-IDF
+    ejemplos = models.JSONField(default=list)               # etiquetas distintas más frecuentes
+    casos = models.JSONField(default=list)                  # códigos de accidente (muestra)
+    n_causas = models.PositiveIntegerField()
+    n_casos = models.PositiveIntegerField()
+    total_causas = models.PositiveIntegerField()            # causas del ámbito (todas)
+    total_casos = models.PositiveIntegerField()
+    calculado_en = models.DateTimeField()
+
+    class Meta:
+        db_table = 'causa_clusters'
+        ordering = ['ambito', 'ambito_id', 'posicion']
+        indexes = [models.Index(fields=['ambito', 'ambito_id'], name='causa_clusters_ambito_idx')]
+
+    def __str__(self):
+        return f"{self.etiqueta} ({self.n_casos} casos)"
+
+
+class TrabajoIA(models.Model):
+    """
+    Generación IA en cola (relato, hechos, árbol, medidas, explora, informe).
+    La vista encola y responde de inmediato; `manage.py worker_ia` lo ejecuta
+    fuera de la request (ver accidentes/utils/trabajos_ia.py).
+    """
+    PENDIENTE = 'pendiente'
+    EN_CURSO = 'en_curso'
+    LISTO = 'listo'
+    ERROR = 'error'
+    ESTADO_CHOICES = [
+        (PENDIENTE, 'Pendiente'),
+        (EN_CURSO, 'En curso'),
+        (LISTO, 'Listo'),
+        (ERROR, 'Error'),
+    ]
+    ACTIVOS = (PENDIENTE, EN_CURSO)
+
+    tipo = models.CharField(max_length=20)
+    accidente = models.ForeignKey(Accidentes, on_delete=models.CASCADE, related_name='trabajos_ia')
+    usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL,
+                                null=True, blank=True, related_name='+')
+    parametros = models.JSONField(default=dict, blank=True)
+    clave = models.CharField(max_length=64, db_index=True)   # sha256(tipo, accidente, parámetros): doble clic
+    estado = models.CharField(max_length=10, choices=ESTADO_CHOICES, default=PENDIENTE)
+    progreso = models.PositiveSmallIntegerField(default=0)   # 0..100
+    mensaje = models.CharField(max_length=200, blank=True, default='')
+    resultado = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True, default='')
+    intentos = models.PositiveSmallIntegerField(default=0)
+    creado_en = models.DateTimeField(auto_now_add=True)
+    iniciado_en = models.DateTimeField(null=True, blank=True)
+    terminado_en = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'trabajos_ia'
+        ordering = ['-creado_en']
+        indexes = [models.Index(fields=['estado', 'creado_en'], name='trabajos_ia_cola_idx')]
+
+    def __str__(self):
+        return f"{self.tipo} #{self.pk} ({self.estado})"
+
+    @property
+    def activo(self) -> bool:
+        return self.estado in self.ACTIVOS
+
+
+class RespuestaIA(models.Model):
+    """
+    Respuestas IA guardadas por contenido (una tabla por tenant): la misma
+    consulta —prompt, modelo, texto del prompt y payload— se responde sin
+    llamar al modelo. Se poda por antigüedad y tamaño (accidentes/utils/respuestas_ia.py).
+    """
+    clave = models.CharField(max_length=64, unique=True)      # sha256 de los campos de abajo
+    prompt = models.CharField(max_length=50)
+    modelo = models.CharField(max_length=50)
+    prompt_hash = models.CharField(max_length=64)              # sha256(instrucción, temperature, top_p)
+    payload_hash = models.CharField(max_length=64)             # sha256(payload minificado)
+    texto = models.TextField()
+    tamano = models.PositiveIntegerField(default=0)            # bytes UTF-8 de texto
+    aciertos = models.PositiveIntegerField(default=0)
+    creado_en = models.DateTimeField(auto_now_add=True)
+    usado_en = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'respuestas_ia'
+        indexes = [models.Index(fields=['usado_en'], name='respuestas_ia_usado_idx')]
+
+    def __str__(self):
+        return f"{self.prompt} {self.clave[:12]} ({self.aciertos} aciertos)"
+
+
 class Declaraciones(models.Model):
     TIPO_DECL_CHOICES = [
         ('accidentado', 'Accidentado'),
@@ -1,8 +1,11 @@
 import logging
+from django.db import transaction
 from django.db.models.signals import pre_save, post_save
 from django.dispatch import receiver
-from .models import Accidentes  # ajusta si tu clase se llama distinto
+from .models import Accidentes, ArbolCausas  # ajusta si tu clase se llama distinto
 from core.services.mailers import send_case_assigned_email
+from .utils.arbol_indice import indexar
+from .utils.arbol_journal import json_5q_vigente
 
 logger = logging.getLogger(__name__)
 
@@ -36,3 +39,20 @@ def _post_save_send_assignment_email(sender, instance, created, **kwargs):
         finally:
             if hasattr(instance, "_notify_first_assignment"):
                 delattr(instance, "_notify_first_assignment")
+
+
+# Índice de búsqueda de nodos: solo si cambió el JSON o la vigencia
+INDICE_CAMPOS = {"arbol_json_5q", "is_current"}
+
+@receiver(post_save, sender=ArbolCausas)
+def _post_save_indexar_arbol(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not INDICE_CAMPOS & set(update_fields):
+        return
+
+    def _indexar():
+        try:
+            indexar(instance, json_5q_vigente(instance) if instance.is_current else None)
+        except Exception:
+            logger.exception("Error indexando árbol de causas (arbol_id=%s)", instance.pk)
+
+    transaction.on_commit(_indexar)
@@ -0,0 +1,215 @@
+// accidentes/static/accidentes/js/arbol_layout.js
+// Dibujo del árbol de causas en el cliente a partir del layout JSON
+// (ArbolLayoutView). Tras cada acción el servidor responde solo el delta
+// (nodos agregados / cambiados / eliminados + cursor) respecto del 'rev' local.
+(function () {
+  const SVG_NS = "http://www.w3.org/2000/svg";
+  const ESTILO = {
+    fill: "#ffffff", stroke: "#b8b8b8", width: "1.5",
+    fillActual: "#eceaea", strokeActual: "#575757", widthActual: "3",
+    arista: "#606060", anchoArista: "0.8",
+    fuente: "Arial", tamFuente: 10, altoLinea: 12, radio: 8, flecha: 10, mediaFlecha: 3.5,
+  };
+
+  // Estado compartido entre swaps HTMX del partial (mismo caso => se reutiliza)
+  const estado = window.__arbolLayout || (window.__arbolLayout = {
+    url: null, rev: null, nodos: new Map(), actual: null, ancho: 0, alto: 0, ocupado: false,
+  });
+
+  function csrf() {
+    const el = document.querySelector("[name=csrfmiddlewaretoken]");
+    return el ? el.value : "";
+  }
+
+  function aplicar(data) {
+    if (!data || !data.tree) return;
+    if (data.full || data.base !== estado.rev) {
+      estado.nodos = new Map();
+      (data.nodes || []).forEach(n => estado.nodos.set(n.id, n));
+    } else {
+      (data.removed || []).forEach(id => estado.nodos.delete(id));
+      (data.added || []).forEach(n => estado.nodos.set(n.id, n));
+      (data.changed || []).forEach(n => estado.nodos.set(n.id, n));
+    }
+    estado.rev = data.rev;
+    estado.actual = data.current;
+    estado.ancho = data.width;
+    estado.alto = data.height;
+    dibujar();
+    actualizarFormulario(data);
+    mostrarMensajes(data.messages || []);
+  }
+
+  function el(tag, attrs, padre) {
+    const e = document.createElementNS(SVG_NS, tag);
+    Object.entries(attrs || {}).forEach(([k, v]) => e.setAttribute(k, v));
+    if (padre) padre.appendChild(e);
+    return e;
+  }
+
+  function rectRedondeado(n) {
+    const r = ESTILO.radio;
+    const x0 = n.x - n.w / 2, y0 = n.y - n.h / 2, x1 = x0 + n.w, y1 = y0 + n.h;
+    return `M${x0 + r},${y0} L${x1 - r},${y0} A${r},${r} 0 0 1 ${x1},${y0 + r} ` +
+      `L${x1},${y1 - r} A${r},${r} 0 0 1 ${x1 - r},${y1} ` +
+      `L${x0 + r},${y1} A${r},${r} 0 0 1 ${x0},${y1 - r} ` +
+      `L${x0},${y0 + r} A${r},${r} 0 0 1 ${x0 + r},${y0} Z`;
+  }
+
+  function dibujar() {
+    const cont = document.getElementById("svg-container");
+    if (!cont) return;
+    const svg = el("svg", {
+      width: `${Math.round(estado.ancho)}pt`, height: `${Math.round(estado.alto)}pt`,
+      viewBox: `0 0 ${estado.ancho} ${estado.alto}`,
+    });
+    const g = el("g", { class: "graph" }, svg);
+    el("rect", { x: 0, y: 0, width: estado.ancho, height: estado.alto, fill: "#ffffff" }, g);
+
+    // Aristas primero (quedan bajo los nodos); la flecha apunta al padre
+    estado.nodos.forEach(n => {
+      const p = n.parent && estado.nodos.get(n.parent);
+      if (!p) return;
+      const x0 = n.x, y0 = n.y - n.h / 2, x1 = p.x, y1 = p.y + p.h / 2;
+      const yb = y1 + ESTILO.flecha, cy = (y0 + yb) / 2;
+      const ga = el("g", { class: "edge" }, g);
+      el("path", {
+        fill: "none", stroke: ESTILO.arista, "stroke-width": ESTILO.anchoArista,
+        d: `M${x0},${y0} C${x0},${cy} ${x1},${cy} ${x1},${yb}`,
+      }, ga);
+      el("polygon", {
+        fill: ESTILO.arista, stroke: ESTILO.arista, "stroke-width": ESTILO.anchoArista,
+        points: `${x1},${y1} ${x1 - ESTILO.mediaFlecha},${yb} ${x1 + ESTILO.mediaFlecha},${yb}`,
+      }, ga);
+    });
+
+    estado.nodos.forEach(n => {
+      const actual = n.id === estado.actual;
+      const gn = el("g", { class: "node", "data-node-id": n.id, style: "cursor:pointer" }, g);
+      el("title", {}, gn).textContent = n.label;
+      el("path", {
+        fill: actual ? ESTILO.fillActual : ESTILO.fill,
+        stroke: actual ? ESTILO.strokeActual : ESTILO.stroke,
+        "stroke-width": actual ? ESTILO.widthActual : ESTILO.width,
+        d: rectRedondeado(n),
+      }, gn);
+      const base = n.y - n.lines.length * ESTILO.altoLinea / 2 + ESTILO.tamFuente * 0.9;
+      n.lines.forEach((linea, k) => {
+        el("text", {
+          "text-anchor": "middle", x: n.x, y: base + k * ESTILO.altoLinea,
+          "font-family": ESTILO.fuente, "font-size": ESTILO.tamFuente,
+        }, gn).textContent = linea;
+      });
+      gn.addEventListener("click", () => accion({ action: "navigate_to", node_id: n.id }));
+    });
+
+    cont.replaceChildren(svg);
+  }
+
+  function actualizarFormulario(data) {
+    const form = document.querySelector("form[data-layout-form]");
+    if (!form) return;
+    const nodeInput = form.querySelector("[name=node_id]");
+    const labelInput = form.querySelector("[name=new_label]");
+    if (nodeInput) nodeInput.value = data.current || "";
+    if (labelInput) labelInput.value = data.current_label || "";
+
+    const select = form.querySelector("select[name=attach_to]");
+    const wrapper = document.getElementById("attach-to-wrapper");
+    if (select) {
+      const primera = select.options[0];
+      select.replaceChildren(primera);
+      (data.child_targets || []).forEach(t => {
+        const opt = document.createElement("option");
+        opt.value = t.id;
+        const texto = t.label.length > 80 ? t.label.slice(0, 79) + "…" : t.label;
+        opt.textContent = `Adjuntar dentro de: ${texto}`;
+        select.appendChild(opt);
+      });
+      select.value = "";
+      if (wrapper) wrapper.classList.toggle("d-none", !(data.child_targets || []).length);
+    }
+  }
+
+  const TOAST = {
+    error: ["danger", "❌", "Error"], danger: ["danger", "❌", "Error"],
+    warning: ["warning", "⚠️", "Atención"], success: ["success", "✔️", "¡Éxito!"],
+    info: ["info", "ℹ️", "Información"],
+  };
+
+  function mostrarMensajes(mensajes) {
+    const area = document.getElementById("toast-area");
+    if (!area) return;
+    mensajes.forEach(m => {
+      const [bg, icono, titulo] = TOAST[m.level] || ["secondary", "ℹ️", "Aviso"];
+      const t = document.createElement("div");
+      t.className = `toast align-items-center text-bg-${bg} border-0 mb-2`;
+      t.setAttribute("role", "alert");
+      t.setAttribute("data-bs-delay", "4000");
+      t.setAttribute("data-bs-autohide", "true");
+      t.innerHTML =
+        `<div class="toast-header bg-${bg} text-white border-0">` +
+        `<span class="me-2">${icono}</span><strong class="me-auto">${titulo}</strong>` +
+        `<button type="button" class="btn-close btn-close-white ms-2" data-bs-dismiss="toast" aria-label="Cerrar"></button>` +
+        `</div><div class="toast-body"></div>`;
+      t.querySelector(".toast-body").textContent = m.text;
+      area.appendChild(t);
+      try { new bootstrap.Toast(t).show(); } catch (e) {}
+    });
+  }
+
+  function cargar() {
+    const params = new URLSearchParams();
+    if (estado.rev) params.set("rev", estado.rev);
+    return fetch(`${estado.url}?${params}`, { credentials: "same-origin" })
+      .then(r => r.json())
+      .then(aplicar)
+      .catch(() => {});
+  }
+
+  function accion(campos) {
+    if (estado.ocupado) return Promise.resolve();
+    estado.ocupado = true;
+    const body = campos instanceof FormData ? campos : new FormData();
+    if (!(campos instanceof FormData)) Object.entries(campos).forEach(([k, v]) => body.set(k, v));
+    if (estado.rev) body.set("rev", estado.rev);
+    return fetch(estado.url, {
+      method: "POST", body, credentials: "same-origin",
+      headers: { "X-CSRFToken": csrf() },
+    })
+      .then(r => r.json())
+      .then(aplicar)
+      .catch(() => {})
+      .finally(() => { estado.ocupado = false; });
+  }
+
+  function iniciar() {
+    const cont = document.getElementById("svg-container");
+    if (!cont || !cont.dataset.layoutUrl) return;
+    if (estado.url !== cont.dataset.layoutUrl) {
+      // otro caso: partir de cero
+      estado.url = cont.dataset.layoutUrl;
+      estado.rev = null;
+      estado.nodos = new Map();
+    }
+    const form = document.querySelector("form[data-layout-form]");
+    if (form && !form.dataset.bound) {
+      form.dataset.bound = "1";
+      form.addEventListener("submit", e => {
+        e.preventDefault();
+        const datos = new FormData(form);
+        if (e.submitter && e.submitter.name) datos.set(e.submitter.name, e.submitter.value);
+        accion(datos);
+      });
+    }
+    // Con rev local el servidor solo envía lo que cambió desde entonces
+    cargar();
+  }
+
+  if (document.readyState === "loading") {
+    document.addEventListener("DOMContentLoaded", iniciar);
+  } else {
+    iniciar();
+  }
+  document.body.addEventListener("htmx:afterSettle", iniciar);
+})();
@@ -0,0 +1,111 @@
+// accidentes/static/accidentes/js/arbol_stream.js
+// Generación del árbol en streaming (GenerarArbolIAStreamView): los formularios
+// "Generar árbol" con data-stream-url se envían por fetch y se lee el
+// text/event-stream, dibujando el árbol parcial a medida que llegan ramas.
+// Al terminar se recarga el partial normal (el árbol ya quedó guardado).
+(function () {
+  if (window.__arbolStream) return;
+  window.__arbolStream = true;
+
+  function csrf(form) {
+    const el = form.querySelector("[name=csrfmiddlewaretoken]") ||
+      document.querySelector("[name=csrfmiddlewaretoken]");
+    return el ? el.value : "";
+  }
+
+  function indicador(activo) {
+    const ind = document.getElementById("relato-indicator");
+    if (ind) ind.classList.toggle("htmx-request", activo);
+  }
+
+  function vistaPrevia() {
+    let prev = document.getElementById("arbol-stream-preview");
+    if (!prev) {
+      prev = document.createElement("div");
+      prev.id = "arbol-stream-preview";
+      prev.className = "p-2 mb-4";
+      prev.innerHTML =
+        '<div class="text-muted small mb-2" data-estado>Esperando respuesta de la IA…</div>' +
+        '<div class="svg-wrapper d-flex justify-content-center" style="overflow-x: auto;">' +
+        '<div class="svg-container" data-svg></div></div>';
+      const cont = document.getElementById("arbol-container");
+      if (cont) cont.prepend(prev);
+    }
+    return prev;
+  }
+
+  function recargar() {
+    const cont = document.getElementById("arbol-container");
+    const url = cont && cont.getAttribute("hx-get");
+    if (url && window.htmx) {
+      htmx.ajax("GET", url, { target: "#arbol-container", swap: "innerHTML" });
+    } else {
+      window.location.reload();
+    }
+  }
+
+  function manejar(evento, data, prev) {
+    const estado = prev.querySelector("[data-estado]");
+    if (evento === "parcial") {
+      prev.querySelector("[data-svg]").innerHTML = data.svg || "";
+      estado.textContent = `Generando árbol… ${data.nodos} nodos recibidos`;
+    } else if (evento === "fin") {
+      estado.textContent = `Árbol generado (${data.nodos} nodos).`;
+      recargar();
+    } else if (evento === "error") {
+      estado.className = "alert alert-danger";
+      estado.textContent = data.message || "No fue posible generar el árbol.";
+    }
+  }
+
+  async function generar(form) {
+    const boton = form.querySelector("[type=submit]");
+    if (boton) boton.disabled = true;
+    indicador(true);
+    const prev = vistaPrevia();
+    try {
+      const resp = await fetch(form.dataset.streamUrl, {
+        method: "POST", body: new FormData(form), credentials: "same-origin",
+        headers: { "X-CSRFToken": csrf(form), "Accept": "text/event-stream" },
+      });
+      if (!resp.ok || !resp.body) {
+        manejar("error", { message: (await resp.text()) || `Error ${resp.status}` }, prev);
+        return;
+      }
+      const lector = resp.body.getReader();
+      const dec = new TextDecoder();
+      let buf = "";
+      for (;;) {
+        const { value, done } = await lector.read();
+        if (done) break;
+        buf += dec.decode(value, { stream: true });
+        let corte;
+        while ((corte = buf.indexOf("\n\n")) !== -1) {
+          const bloque = buf.slice(0, corte);
+          buf = buf.slice(corte + 2);
+          let evento = "message", datos = "";
+          bloque.split("\n").forEach(linea => {
+            if (linea.startsWith("event:")) evento = linea.slice(6).trim();
+            else if (linea.startsWith("data:")) datos += linea.slice(5).trim();
+          });
+          try { manejar(evento, JSON.parse(datos || "{}"), prev); } catch (e) {}
+        }
+      }
+    } catch (e) {
+      manejar("error", { message: "Se perdió la conexión durante la generación." }, prev);
+    } finally {
+      indicador(false);
+      if (boton) boton.disabled = false;
+    }
+  }
+
+  // Fase de captura: se adelanta al manejador hx-post del formulario
+  document.addEventListener("submit", e => {
+    const form = e.target;
+    if (!(form instanceof HTMLFormElement) || !form.dataset.streamUrl) return;
+    if (!window.fetch || !window.ReadableStream) return;  // sin streams: sigue el hx-post normal
+    e.preventDefault();
+    e.stopPropagation();
+    generar(form);
+  }, true);
+})();
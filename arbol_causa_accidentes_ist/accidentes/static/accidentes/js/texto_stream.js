@@ -0,0 +1,117 @@
+// accidentes/static/accidentes/js/texto_stream.js
+// Relato y hechos en streaming (RelatoIAStreamView, HechosIAStreamView): las
+// requests HTMX de formularios con data-stream-url se cancelan y se envían por
+// fetch, mostrando el texto de la IA a medida que llega (sobre el formulario).
+// Al terminar se recarga el partial normal (lo generado ya quedó guardado).
+(function () {
+  if (window.__textoStream) return;
+  window.__textoStream = true;
+
+  function csrf(form) {
+    const el = form.querySelector("[name=csrfmiddlewaretoken]") ||
+      document.querySelector("[name=csrfmiddlewaretoken]");
+    return el ? el.value : "";
+  }
+
+  function indicador(form, activo) {
+    const sel = form.getAttribute("hx-indicator");
+    const ind = sel && document.querySelector(sel);
+    if (ind) ind.classList.toggle("htmx-request", activo);
+  }
+
+  function vistaPrevia(form) {
+    const prev = document.createElement("div");
+    prev.className = "card border-0 shadow-sm mb-3 w-100";
+    prev.innerHTML =
+      '<div class="card-body">' +
+      '<div class="text-muted small mb-2" data-estado>Esperando respuesta de la IA…</div>' +
+      '<div data-texto style="white-space: pre-wrap;"></div></div>';
+    form.insertAdjacentElement("beforebegin", prev);
+    return prev;
+  }
+
+  function recargar(form) {
+    const target = form.getAttribute("hx-target");
+    const url = form.getAttribute("hx-post");
+    if (target && url && window.htmx) {
+      htmx.ajax("GET", url, { target: target, swap: "innerHTML" });
+    } else {
+      window.location.reload();
+    }
+  }
+
+  // Mismos parámetros que habría enviado htmx (incluye hx-include)
+  function cuerpo(form, config) {
+    if (!config || !config.parameters) return new FormData(form);
+    const datos = new FormData();
+    Object.entries(config.parameters).forEach(([k, v]) => {
+      [].concat(v).forEach(x => datos.append(k, x));
+    });
+    return datos;
+  }
+
+  function manejar(evento, data, prev, form) {
+    const estado = prev.querySelector("[data-estado]");
+    if (evento === "parcial") {
+      prev.querySelector("[data-texto]").textContent += data.texto || "";
+      estado.textContent = "Generando con IA…";
+    } else if (evento === "fin") {
+      estado.textContent = data.mensaje || "Listo.";
+      recargar(form);
+    } else if (evento === "error") {
+      estado.className = "alert alert-danger mb-2";
+      estado.textContent = data.message || "No fue posible completar la generación.";
+    }
+  }
+
+  async function generar(form, config) {
+    const boton = form.querySelector("[type=submit]");
+    if (boton) boton.disabled = true;
+    indicador(form, true);
+    const prev = vistaPrevia(form);
+    try {
+      const resp = await fetch(form.dataset.streamUrl, {
+        method: "POST", body: cuerpo(form, config), credentials: "same-origin",
+        headers: { "X-CSRFToken": csrf(form), "Accept": "text/event-stream" },
+      });
+      if (!resp.ok || !resp.body) {
+        manejar("error", { message: (await resp.text()) || `Error ${resp.status}` }, prev, form);
+        return;
+      }
+      const lector = resp.body.getReader();
+      const dec = new TextDecoder();
+      let buf = "";
+      for (;;) {
+        const { value, done } = await lector.read();
+        if (done) break;
+        buf += dec.decode(value, { stream: true });
+        let corte;
+        while ((corte = buf.indexOf("\n\n")) !== -1) {
+          const bloque = buf.slice(0, corte);
+          buf = buf.slice(corte + 2);
+          let evento = "message", datos = "";
+          bloque.split("\n").forEach(linea => {
+            if (linea.startsWith("event:")) evento = linea.slice(6).trim();
+            else if (linea.startsWith("data:")) datos += linea.slice(5).trim();
+          });
+          try { manejar(evento, JSON.parse(datos || "{}"), prev, form); } catch (e) {}
+        }
+      }
+    } catch (e) {
+      manejar("error", { message: "Se perdió la conexión durante la generación." }, prev, form);
+    } finally {
+      indicador(form, false);
+      if (boton) boton.disabled = false;
+    }
+  }
+
+  // htmx:beforeRequest cubre el submit y los pasos automáticos (hx-trigger="load");
+  // sin streams en el navegador sigue el hx-post normal
+  document.body.addEventListener("htmx:beforeRequest", e => {
+    const form = e.detail && e.detail.elt;
+    if (!(form instanceof HTMLFormElement) || !form.dataset.streamUrl) return;
+    if (!window.fetch || !window.ReadableStream) return;
+    e.preventDefault();
+    generar(form, e.detail.requestConfig);
+  });
+})();
@@ -1,3 +1,221 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import threading
+import weakref
+from datetime import date
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import AsyncClient, SimpleTestCase, TestCase
+from django.urls import reverse
+
+from accidentes.management.commands import ia_stub
+from accidentes.models import Accidentes, Empresas, Relato, Trabajadores
+from accidentes.utils import single_flight, trabajos_ia
+from accidentes.utils.causal_tree import CausalTree
+from accidentes.views_api import prompt_utils
+from accidentes.views_api.arbol import ArbolLoteView
+
+# con django-tenants (PostgreSQL) las tablas de accidentes viven en el esquema del tenant
+if settings.DATABASES["default"]["ENGINE"].startswith("django_tenants"):
+    from django_tenants.test.cases import TenantTestCase as BDTestCase
+else:
+    BDTestCase = TestCase
+
+RAIZ = "0.0.0.0.0.0.0.0.0"
+HIJO = "1.0.0.0.0.0.0.0.0"
+NIETO = "1.1.0.0.0.0.0.0.0"
+
+
+class ArbolLoteReferenciasTests(SimpleTestCase):
+    def _arbol(self):
+        return CausalTree(json.dumps({RAIZ: "Accidente", HIJO: "Causa", NIETO: "Subcausa"}))
+
+    def test_ref_sigue_al_nodo_movido_por_insert_between(self):
+        tree = self._arbol()
+        ok, resultados, journal = ArbolLoteView()._aplicar_lote(tree, [
+            {"op": "edit_label", "node_id": HIJO, "label": "Causa editada"},
+            {"op": "insert_between", "node_id": RAIZ, "target_id": HIJO, "label": "MID"},
+            {"op": "edit_label", "node_id": "$0", "label": "Causa final"},
+        ])
+
+        self.assertTrue(ok, resultados)
+        self.assertEqual(tree.nodes[HIJO]["label"], "MID")
+        self.assertEqual(tree.nodes[NIETO]["label"], "Causa final")
+        # los resultados informan la clave final de cada nodo
+        self.assertEqual(resultados[0]["node_id"], NIETO)
+        self.assertEqual(resultados[2]["node_id"], NIETO)
+
+        # el journal reaplicado sobre el snapshot da el mismo árbol
+        replay = self._arbol()
+        for op in journal:
+            replay.apply_operation(*op)
+        self.assertEqual(
+            {k: v["label"] for k, v in replay.nodes.items()},
+            {k: v["label"] for k, v in tree.nodes.items()},
+        )
+
+    def test_ref_a_nodo_eliminado_falla(self):
+        ok, resultados, _ = ArbolLoteView()._aplicar_lote(self._arbol(), [
+            {"op": "add_child", "node_id": HIJO, "label": "Nueva"},
+            {"op": "delete", "node_id": HIJO},
+            {"op": "edit_label", "node_id": "$0", "label": "x"},
+        ])
+        self.assertFalse(ok)
+        self.assertEqual(resultados[2]["error"], "Referencia inválida: $0")
+
+    def test_label_o_node_id_no_texto_falla_en_la_operacion(self):
+        for op, error in (
+            ({"op": "add_child", "node_id": RAIZ, "label": 5}, "label debe ser texto"),
+            ({"op": "edit_label", "node_id": 5, "label": "x"}, "Referencia inválida: 5"),
+        ):
+            with self.subTest(op=op):
+                ok, resultados, journal = ArbolLoteView()._aplicar_lote(self._arbol(), [op])
+                self.assertFalse(ok)
+                self.assertEqual(resultados[0]["error"], error)
+                self.assertEqual(journal, [])
+
+
+class SingleFlightAsyncTests(BDTestCase):
+    async def test_vuelos_concurrentes_llaman_una_vez_al_modelo(self):
+        llamadas = []
+
+        async def modelo(**kwargs):
+            llamadas.append(kwargs["user"])
+            await asyncio.sleep(0.3)
+            return "Respuesta única"
+
+        await cache.aclear()
+        with mock.patch.object(prompt_utils, "_acall_openai_text", modelo):
+            textos = await asyncio.gather(*(
+                prompt_utils.acall_ia_text("consulta concurrente", "relato_inicial") for _ in range(5)
+            ))
+
+        self.assertEqual(textos, ["Respuesta única"] * 5)
+        self.assertEqual(len(llamadas), 1)
+
+
+class VueloPostgresCerrarTests(SimpleTestCase):
+    def test_cerrar_no_lanza_si_falla_la_conexion(self):
+        vuelo = single_flight._VueloPostgres("ab" * 32)
+        vuelo._conn = mock.Mock()
+        vuelo._conn.cursor.side_effect = RuntimeError("conexión caída")
+        vuelo._conn.close.side_effect = RuntimeError("conexión caída")
+        vuelo.lider = True
+
+        with self.assertLogs(single_flight.logger, "ERROR"):
+            vuelo.cerrar()
+        self.assertIsNone(vuelo._conn)
+
+
+class StubIAMixin:
+    """Levanta el servidor de `manage.py ia_stub` en un hilo y apunta a él el cliente OpenAI."""
+
+    def _stub(self, **opciones):
+        srv = ia_stub.servidor(**opciones)
+        threading.Thread(target=srv.serve_forever, daemon=True).start()
+        self.addCleanup(srv.server_close)
+        self.addCleanup(srv.shutdown)
+        host, puerto = srv.server_address
+        for parche in (
+            mock.patch.dict(os.environ, {"OPENAI_BASE_URL": f"http://{host}:{puerto}/v1", "OPENAI_API_KEY": "stub"}),
+            # un cliente async por event loop: los de otro test apuntan a otro stub
+            mock.patch.object(prompt_utils, "_async_clients", weakref.WeakKeyDictionary()),
+            mock.patch.object(prompt_utils, "_backoff_s", lambda attempt: 0),
+        ):
+            parche.start()
+            self.addCleanup(parche.stop)
+        cache.clear()
+        return srv
+
+
+class PromptUtilsAsyncTests(StubIAMixin, BDTestCase):
+    RELATO = ia_stub.RESPUESTAS["relato_inicial"]
+
+    async def test_acall_reintenta_errores_transitorios(self):
+        srv = self._stub(fallos=1)
+        texto = await prompt_utils.acall_ia_text("accidente con reintento", "relato_inicial")
+        self.assertEqual(texto, self.RELATO)
+        self.assertEqual(srv.pedidos, 2)
+
+    async def test_acall_idempotencia_no_repite_la_llamada(self):
+        srv = self._stub()
+        primero = await prompt_utils.acall_ia_text("accidente idempotente", "relato_inicial")
+        segundo = await prompt_utils.acall_ia_text("accidente idempotente", "relato_inicial")
+        self.assertEqual(primero, segundo)
+        self.assertEqual(srv.pedidos, 1)
+
+    async def test_acall_contenido_vacio_es_error(self):
+        srv = self._stub(respuestas={"relato_inicial": ""})
+        with self.assertRaisesMessage(RuntimeError, "contenido vacío"):
+            await prompt_utils.acall_ia_text("accidente sin respuesta", "relato_inicial")
+        # no es transitorio: no se reintenta
+        self.assertEqual(srv.pedidos, 1)
+
+    async def _astream(self, entrada):
+        return [parte async for parte in prompt_utils.astream_ia_text(entrada, "relato_inicial")]
+
+    async def test_astream_sin_reintentos_y_sin_cachear_el_error(self):
+        srv = self._stub(fallos=1)
+        with self.assertRaises(Exception):
+            await self._astream("accidente en streaming con error")
+        self.assertEqual(srv.pedidos, 1)
+        self.assertEqual("".join(await self._astream("accidente en streaming con error")), self.RELATO)
+        self.assertEqual(srv.pedidos, 2)
+
+    async def test_astream_idempotencia_en_un_fragmento(self):
+        srv = self._stub()
+        partes = await self._astream("accidente en streaming")
+        self.assertGreater(len(partes), 1)
+        self.assertEqual(await self._astream("accidente en streaming"), [self.RELATO])
+        self.assertEqual(srv.pedidos, 1)
+
+    async def test_astream_contenido_vacio_es_error(self):
+        self._stub(respuestas={"relato_inicial": ""})
+        with self.assertRaisesMessage(RuntimeError, "contenido vacío"):
+            await self._astream("accidente en streaming sin respuesta")
+
+
+class RelatoIAViewAsyncTests(StubIAMixin, BDTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = get_user_model().objects.create_user(
+            username="admin_ia", password="x", email="admin_ia@example.com", rol="admin",
+        )
+        empresa = Empresas.objects.create(rut_empresa="76000000-0", empresa_sel="Empresa de prueba")
+        trabajador = Trabajadores.objects.create(rut_trabajador="11111111-1", empresa=empresa)
+        cls.accidente = Accidentes.objects.create(
+            codigo_accidente="ACC-IA", empresa=empresa, trabajador=trabajador,
+            fecha_accidente=date(2025, 1, 15), usuario_asignado=cls.usuario,
+        )
+        cls.url = reverse("accidentes:ia_relato", args=["ACC-IA"])
+
+    def _cliente(self):
+        dominio = getattr(self, "domain", None)  # TenantTestCase
+        return AsyncClient(headers={"host": dominio.domain} if dominio else None)
+
+    async def test_post_genera_el_relato_en_la_request(self):
+        srv = self._stub()
+        cliente = self._cliente()
+        await cliente.aforce_login(self.usuario)
+        with mock.patch.object(trabajos_ia, "EN_COLA", False):
+            resp = await cliente.post(self.url, {"action": "generar_relato"}, headers={"hx-request": "true"})
+
+        self.assertEqual(resp.status_code, 200)
+        relato = await Relato.objects.filter(accidente=self.accidente, is_current=True).afirst()
+        self.assertEqual(relato.relato_inicial, ia_stub.RESPUESTAS["relato_inicial"])
+        self.assertEqual(srv.pedidos, 1)
+
+    async def test_sin_sesion_redirige_al_login(self):
+        resp = await self._cliente().post(self.url, {"action": "generar_relato"})
+        self.assertEqual(resp.status_code, 302)
+        self.assertTrue(resp["Location"].startswith("/accounts/login/"))
+
+    async def test_metodo_no_permitido(self):
+        cliente = self._cliente()
+        await cliente.aforce_login(self.usuario)
+        resp = await cliente.put(self.url)
+        self.assertEqual(resp.status_code, 405)
@@ -18,12 +18,20 @@ from .views import (
 from .views_ia import (
     DeclaracionesIAView,
     RelatoIAView,
+    RelatoIAStreamView,
     HechosIAView,
+    HechosIAStreamView,
     ArbolIAView,
+    ArbolLayoutView,
+    ArbolLoteView,
+    ArbolDiffView,
+    ArbolBuscarView,
     FotosDocumentosView,
     MedidasCorrectivasView,
     GenerarArbolIACreateView,
+    GenerarArbolIAStreamView,
     GenerarInformeIAView,
+    TrabajoIAView,
 )
 
 app_name = "accidentes"
@@ -40,11 +48,19 @@ urlpatterns = [
 
     path("asistente/declaraciones/<str:codigo>/", DeclaracionesIAView.as_view(), name="ia_declaraciones"),
     path("asistente/relato/<str:codigo>/",        RelatoIAView.as_view(),        name="ia_relato"),
+    path("asistente/relato/<str:codigo>/stream/", RelatoIAStreamView.as_view(),  name="ia_relato_stream"),
     path("asistente/hechos/<str:codigo>/",        HechosIAView.as_view(),        name="ia_hechos"),
+    path("asistente/hechos/<str:codigo>/stream/", HechosIAStreamView.as_view(),  name="ia_hechos_stream"),
+    path("asistente/arbol/buscar/",               ArbolBuscarView.as_view(),     name="ia_arbol_buscar"),
     path("asistente/arbol/<str:codigo>/",         ArbolIAView.as_view(),         name="ia_arbol"),
+    path("asistente/arbol/<str:codigo>/layout/",  ArbolLayoutView.as_view(),     name="ia_arbol_layout"),
+    path("asistente/arbol/<str:codigo>/lote/",    ArbolLoteView.as_view(),       name="ia_arbol_lote"),
+    path("asistente/arbol/<str:codigo>/diff/",    ArbolDiffView.as_view(),       name="ia_arbol_diff"),
     path("asistente/documentos/<str:codigo>/",    FotosDocumentosView.as_view(), name="ia_fotos"),
     path("asistente/medidas/<str:codigo>/",       MedidasCorrectivasView.as_view(), name="ia_medidas"),
     path("asistente/arbol/generar/<str:codigo>/", GenerarArbolIACreateView.as_view(), name="generar_arbol"),
+    path("asistente/arbol/generar/<str:codigo>/stream/", GenerarArbolIAStreamView.as_view(), name="generar_arbol_stream"),
+    path("asistente/trabajos/<int:pk>/",          TrabajoIAView.as_view(),       name="ia_trabajo"),
 
     # Probablemente es necesario elimminar estos endpoint ajax
     path("ajax/cargar-comunas/", views.cargar_comunas, name="cargar_comunas"),
@@ -0,0 +1,147 @@
+# accidentes/utils/arbol_historial.py
+# -*- coding: utf-8 -*-
+"""
+Historial comprimido de ArbolCausas.
+
+Solo la versión vigente queda materializada (arbol_json_5q + arbol_json_dot).
+Al quedar obsoleta, una versión se archiva:
+
+  - arbol_json_5q / arbol_json_dot -> NULL (el DOT se regenera si hace falta)
+  - arbol_comprimido = zlib del JSON 5Q (journal pendiente incluido)
+  - delta_de         = versión cuyo JSON se usó como diccionario zlib (zdict)
+
+La versión archivada más reciente se comprime sola (la vigente sigue
+editándose y no sirve de base). Cuando llega otra versión archivada encima,
+la anterior se recomprime usando a la siguiente como diccionario: versiones
+consecutivas comparten casi todo el texto y el delta queda en pocos bytes.
+Una versión nunca depende de una versión editable.
+"""
+from __future__ import annotations
+
+import logging
+import zlib
+from typing import Dict, Optional
+
+from django.db import transaction
+from django.db.models import Max
+
+from accidentes.models import ArbolCausas
+from accidentes.utils.arbol_journal import json_5q_vigente
+
+logger = logging.getLogger(__name__)
+
+NIVEL_ZLIB = 9
+
+
+def _comprimir(texto: str, base: Optional[str] = None) -> bytes:
+    if base:
+        c = zlib.compressobj(NIVEL_ZLIB, zdict=base.encode("utf-8"))
+    else:
+        c = zlib.compressobj(NIVEL_ZLIB)
+    return c.compress(texto.encode("utf-8")) + c.flush()
+
+
+def _descomprimir(blob: bytes, base: Optional[str] = None) -> str:
+    d = zlib.decompressobj(zdict=base.encode("utf-8")) if base else zlib.decompressobj()
+    return (d.decompress(bytes(blob)) + d.flush()).decode("utf-8")
+
+
+def archivada(arbol: ArbolCausas) -> bool:
+    return arbol.arbol_json_5q is None and arbol.arbol_comprimido is not None
+
+
+def json_5q_version(arbol: ArbolCausas) -> str:
+    """
+    JSON 5Q de cualquier versión: la materializada tal cual (con journal) y las
+    archivadas descomprimiendo la cadena de deltas hasta una versión autónoma.
+    """
+    if not archivada(arbol):
+        return json_5q_vigente(arbol)
+
+    # Una sola consulta para toda la cadena (las bases siempre son versiones posteriores)
+    filas: Dict[int, ArbolCausas] = {
+        a.version: a
+        for a in ArbolCausas.objects.filter(accidente_id=arbol.accidente_id, version__gte=arbol.version)
+        .only("version", "delta_de", "arbol_comprimido", "arbol_json_5q")
+    }
+    filas[arbol.version] = arbol
+    cadena = [arbol]
+    while cadena[-1].delta_de is not None:
+        base = filas.get(cadena[-1].delta_de)
+        if base is None or not archivada(base):
+            raise ValueError(
+                f"Historial de árbol roto: v{cadena[-1].version} depende de v{cadena[-1].delta_de}"
+            )
+        cadena.append(base)
+
+    texto = None
+    for fila in reversed(cadena):
+        texto = _descomprimir(fila.arbol_comprimido, texto)
+    return texto
+
+
+@transaction.atomic
+def archivar(arbol: ArbolCausas) -> None:
+    """
+    Comprime una versión no vigente y recomprime la versión anterior (si era
+    autónoma) como delta contra esta. Idempotente.
+    """
+    if arbol.is_current or archivada(arbol):
+        return
+    texto = json_5q_vigente(arbol)
+    arbol.arbol_comprimido = _comprimir(texto)
+    arbol.delta_de = None
+    arbol.arbol_json_5q = None
+    arbol.arbol_json_dot = None
+    # El journal quedó incorporado en el blob
+    arbol.snapshot_secuencia = arbol.operaciones.aggregate(m=Max("secuencia"))["m"] or 0
+    arbol.save(update_fields=["arbol_comprimido", "delta_de", "arbol_json_5q", "arbol_json_dot",
+                              "snapshot_secuencia"])
+
+    previa = (
+        ArbolCausas.objects.select_for_update()
+        .filter(accidente_id=arbol.accidente_id, version__lt=arbol.version,
+                arbol_json_5q__isnull=True, arbol_comprimido__isnull=False, delta_de__isnull=True)
+        .order_by("-version").first()
+    )
+    if previa is not None:
+        previo = _descomprimir(previa.arbol_comprimido)
+        previa.arbol_comprimido = _comprimir(previo, texto)
+        previa.delta_de = arbol.version
+        previa.save(update_fields=["arbol_comprimido", "delta_de"])
+
+
+@transaction.atomic
+def desarchivar(arbol: ArbolCausas) -> None:
+    """
+    Vuelve a materializar una versión archivada (p.ej. antes de sobrescribirla).
+    Las versiones que la usaban como base pasan a ser autónomas.
+    """
+    if not archivada(arbol):
+        return
+    texto = json_5q_version(arbol)
+    for dep in ArbolCausas.objects.select_for_update().filter(
+        accidente_id=arbol.accidente_id, delta_de=arbol.version
+    ):
+        dep_texto = _descomprimir(dep.arbol_comprimido, texto)
+        dep.arbol_comprimido = _comprimir(dep_texto)
+        dep.delta_de = None
+        dep.save(update_fields=["arbol_comprimido", "delta_de"])
+    arbol.arbol_json_5q = texto
+    arbol.arbol_comprimido = None
+    arbol.delta_de = None
+    arbol.save(update_fields=["arbol_json_5q", "arbol_comprimido", "delta_de"])
+
+
+def archivar_anteriores(accidente_id: int) -> int:
+    """
+    Archiva, de la más antigua a la más nueva, las versiones no vigentes aún
+    materializadas del caso. Devuelve cuántas se archivaron.
+    """
+    n = 0
+    for arbol in ArbolCausas.objects.filter(
+        accidente_id=accidente_id, is_current=False, arbol_json_5q__isnull=False
+    ).order_by("version"):
+        archivar(arbol)
+        n += 1
+    return n
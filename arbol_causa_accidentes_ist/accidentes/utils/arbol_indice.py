@@ -0,0 +1,190 @@
+# accidentes/utils/arbol_indice.py
+# -*- coding: utf-8 -*-
+"""
+Índice invertido de las etiquetas del árbol de causas (por tenant: las tablas
+viven en el esquema del tenant, como ArbolCausas).
+
+  arbol_indice_nodos    : un registro por nodo de la versión vigente de cada
+                          caso (clave 5Q, etiqueta, ruta desde la raíz)
+  arbol_indice_terminos : (término, nodo); el término es la palabra
+                          normalizada (minúsculas, sin tildes, sin plural simple)
+
+Una búsqueda no abre ningún JSON: resuelve los términos por el índice de
+`termino` y se queda con los nodos que los contienen todos. Solo se indexa la
+versión vigente; el resto del historial no aparece en las búsquedas.
+
+El índice se actualiza al guardar ArbolCausas (signals.py) y al registrar
+operaciones del journal (arbol_journal.registrar_operaciones, con el árbol ya
+editado en memoria). indexar() compara con lo indexado y solo reescribe los
+nodos cuya clave, etiqueta o ruta cambió: una edición toca su nodo y, si movió
+o renombró una rama, los de esa rama. Para poblarlo con datos existentes:
+`python manage.py indexar_arboles`.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import re
+import unicodedata
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+
+from accidentes.models import ArbolCausas, NodoArbolIndice, TerminoArbolIndice
+from accidentes.utils import clave_5q
+
+logger = logging.getLogger(__name__)
+
+MAX_RESULTADOS = getattr(settings, "ARBOL_INDICE_MAX_RESULTADOS", 200)
+SEPARADOR_RUTA = " › "
+
+_PALABRA_RE = re.compile(r"[a-z0-9ñ]+")
+# Palabras vacías: no aportan a la búsqueda y son las más repetidas
+STOPWORDS = frozenset("""
+a al ante con de del desde el en entre la las lo los o para por segun sin
+sobre su sus u un una unas unos y e que se no es
+""".split())
+
+
+def _sin_tildes(texto: str) -> str:
+    # la ñ se conserva (NFD la separaría en n + ~)
+    texto = texto.lower().replace("ñ", "\0")
+    texto = "".join(c for c in unicodedata.normalize("NFD", texto) if not unicodedata.combining(c))
+    return texto.replace("\0", "ñ")
+
+
+def _raiz(palabra: str) -> str:
+    """Plural simple: 'caídas' y 'caída' comparten término."""
+    if len(palabra) > 4 and palabra.endswith("es") and palabra[-3] not in "aeiou":
+        return palabra[:-2]
+    if len(palabra) > 3 and palabra.endswith("s"):
+        return palabra[:-1]
+    return palabra
+
+
+def terminos(texto: str) -> List[str]:
+    """Términos normalizados (sin repetir, en orden de aparición)."""
+    vistos: Dict[str, None] = {}
+    for palabra in _PALABRA_RE.findall(_sin_tildes(texto or "")):
+        if palabra in STOPWORDS:
+            continue
+        vistos.setdefault(_raiz(palabra)[:64], None)
+    return list(vistos)
+
+
+# ----------------- escritura -----------------
+def _nodos(texto: str) -> List[Dict]:
+    """[{node_id, label, ruta, nivel}] de un JSON 5Q; nodos sin padre cuelgan de la raíz."""
+    try:
+        data = json.loads(texto or "{}")
+    except json.JSONDecodeError:
+        return []
+    if not isinstance(data, dict):
+        return []
+
+    etiquetas: Dict[int, str] = {}
+    for clave, label in data.items():
+        try:
+            etiquetas[clave_5q.codificar(clave)] = str(label)
+        except (ValueError, AttributeError):
+            continue
+
+    rutas: Dict[int, str] = {}
+
+    def ruta(code: int) -> str:
+        if code not in rutas:
+            p = clave_5q.padre(code)
+            while p is not None and p not in etiquetas:
+                p = clave_5q.padre(p)
+            previa = ruta(p) if p is not None else ""
+            rutas[code] = f"{previa}{SEPARADOR_RUTA}{etiquetas[code]}" if previa else etiquetas[code]
+        return rutas[code]
+
+    # por nivel: la ruta del padre ya está calculada (sin recursión profunda)
+    orden = sorted(etiquetas, key=lambda c: (clave_5q.nivel(c), c))
+    return [
+        {"node_id": clave_5q.decodificar(c), "label": etiquetas[c], "ruta": ruta(c), "nivel": clave_5q.nivel(c)}
+        for c in orden
+    ]
+
+
+@transaction.atomic
+def indexar(arbol: ArbolCausas, texto: Optional[str] = None) -> int:
+    """
+    Deja las entradas del caso iguales a los nodos de 'texto' (JSON 5Q vigente,
+    journal incluido), reescribiendo solo los nodos que cambiaron. Si la versión
+    no es la vigente, solo quita sus entradas. Devuelve la cantidad de nodos
+    indexados.
+    """
+    if not arbol.is_current:
+        NodoArbolIndice.objects.filter(arbol_id=arbol.pk).delete()
+        return 0
+
+    nodos = _nodos(texto if texto is not None else arbol.arbol_json_5q)
+
+    # una sola versión vigente por caso: lo que sea de otra versión sobra
+    actuales: Dict[str, Dict] = {}
+    sobran: List[int] = []
+    for fila in NodoArbolIndice.objects.filter(accidente_id=arbol.accidente_id).values(
+        "pk", "arbol_id", "node_id", "label", "ruta", "nivel"
+    ):
+        if fila["arbol_id"] != arbol.pk or fila["node_id"] in actuales:
+            sobran.append(fila["pk"])
+        else:
+            actuales[fila["node_id"]] = fila
+
+    nuevos = []
+    for n in nodos:
+        fila = actuales.pop(n["node_id"], None)
+        if fila and all(fila[k] == n[k] for k in ("label", "ruta", "nivel")):
+            continue
+        if fila:
+            sobran.append(fila["pk"])
+        nuevos.append(n)
+    sobran.extend(fila["pk"] for fila in actuales.values())
+
+    if sobran:
+        NodoArbolIndice.objects.filter(pk__in=sobran).delete()
+    if not nuevos:
+        return len(nodos)
+
+    creados = NodoArbolIndice.objects.bulk_create([
+        NodoArbolIndice(accidente_id=arbol.accidente_id, arbol_id=arbol.pk, **n) for n in nuevos
+    ])
+    TerminoArbolIndice.objects.bulk_create([
+        TerminoArbolIndice(termino=t, nodo=nodo)
+        for nodo in creados
+        for t in terminos(nodo.label)
+    ], batch_size=1000)
+    return len(nodos)
+
+
+# ----------------- búsqueda -----------------
+def buscar(consulta: str, accidentes=None, limite: int = MAX_RESULTADOS) -> List[NodoArbolIndice]:
+    """
+    Nodos cuya etiqueta contiene todos los términos de la consulta. Alternativas
+    separadas por coma o '|' ("falta de EPP, superficie resbaladiza") se
+    combinan con O. 'accidentes' (queryset) acota los casos visibles.
+    """
+    grupos = [terminos(parte) for parte in re.split(r"[,|]", consulta or "")]
+    grupos = [g for g in grupos if g]
+    if not grupos:
+        return []
+
+    ids = set()
+    for grupo in grupos:
+        qs = TerminoArbolIndice.objects.filter(termino__in=grupo)
+        if accidentes is not None:
+            qs = qs.filter(nodo__accidente__in=accidentes)
+        ids.update(
+            qs.values("nodo_id").annotate(n=Count("termino", distinct=True))
+            .filter(n=len(grupo)).values_list("nodo_id", flat=True)[:limite]
+        )
+
+    return list(
+        NodoArbolIndice.objects.filter(pk__in=ids)
+        .select_related("accidente")
+        .order_by("accidente_id", "nivel", "node_id")[:limite]
+    )
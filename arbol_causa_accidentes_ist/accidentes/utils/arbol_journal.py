@@ -0,0 +1,147 @@
+# accidentes/utils/arbol_journal.py
+# -*- coding: utf-8 -*-
+"""
+Journal de operaciones del árbol de causas.
+
+Cada edición se guarda como una fila pequeña en `arbol_operaciones` en vez de
+reescribir `arbol_json_5q` + `arbol_json_dot` completos. Cada
+ARBOL_JOURNAL_COMPACTAR_CADA operaciones se compacta: se materializa el árbol
+en el snapshot y se avanza `snapshot_secuencia`. Las operaciones NO se borran
+(quedan como historial de edición).
+"""
+from __future__ import annotations
+
+import logging
+from typing import Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.urls import reverse
+
+from accidentes.models import ArbolCausas, ArbolOperacion
+from accidentes.utils.arbol_indice import indexar
+from accidentes.utils.causal_tree import CausalTree
+
+logger = logging.getLogger(__name__)
+
+COMPACTAR_CADA = getattr(settings, "ARBOL_JOURNAL_COMPACTAR_CADA", 50)
+
+
+def dot_neutro(tree: CausalTree, base_path: Optional[str]) -> str:
+    """
+    DOT sin resaltar el nodo actual (sin 'puntero'), tal como se guarda en BD.
+    """
+    _cur = tree.current
+    try:
+        tree.current = None
+        return tree.generate_dot(base_path=base_path)
+    finally:
+        tree.current = _cur
+
+
+def operaciones_pendientes(arbol: ArbolCausas):
+    return arbol.operaciones.filter(secuencia__gt=arbol.snapshot_secuencia).order_by("secuencia")
+
+
+def cargar_arbol(arbol: ArbolCausas) -> CausalTree:
+    """
+    Construye el árbol vigente: snapshot + operaciones pendientes.
+    Lanza ValueError / JSONDecodeError si el snapshot está roto (igual que CausalTree).
+    """
+    tree = CausalTree(arbol.arbol_json_5q)
+    for op in operaciones_pendientes(arbol).only("operacion", "node_id", "target_id", "label"):
+        if not tree.apply_operation(op.operacion, op.node_id, op.label or "", op.target_id):
+            logger.warning(
+                "Journal árbol: operación sin efecto al reaplicar (arbol=%s op=%s #%s node=%s)",
+                arbol.pk, op.operacion, op.pk, op.node_id,
+            )
+    tree.navigate_to_root()
+    return tree
+
+
+def json_5q_vigente(arbol: ArbolCausas) -> str:
+    """JSON 5Q materializado (sin reaplicar nada si no hay operaciones pendientes)."""
+    if not operaciones_pendientes(arbol).exists():
+        return arbol.arbol_json_5q or ""
+    return cargar_arbol(arbol).export_to_5q_json()
+
+
+def _base_path(arbol: ArbolCausas, codigo: Optional[str]) -> str:
+    codigo = codigo or arbol.accidente.codigo_accidente
+    return reverse("accidentes:ia_arbol", args=[codigo])
+
+
+def compactar(arbol: ArbolCausas, tree: CausalTree, *, codigo: Optional[str] = None,
+              hasta: Optional[int] = None) -> None:
+    """
+    Materializa 'tree' (que debe reflejar hasta la operación 'hasta') en el snapshot.
+    """
+    if hasta is None:
+        hasta = arbol.operaciones.aggregate(m=Max("secuencia"))["m"] or 0
+    arbol.arbol_json_5q = tree.export_to_5q_json()
+    arbol.arbol_json_dot = dot_neutro(tree, base_path=_base_path(arbol, codigo))
+    arbol.snapshot_secuencia = hasta
+    arbol.save(update_fields=["arbol_json_5q", "arbol_json_dot", "snapshot_secuencia"])
+    logger.info("Journal árbol: compactado arbol=%s hasta secuencia=%s", arbol.pk, hasta)
+
+
+def registrar_operacion(arbol: ArbolCausas, operacion: str, node_id: str,
+                        *, label: str = "", target_id: Optional[str] = None,
+                        usuario=None, codigo: Optional[str] = None,
+                        tree: Optional[CausalTree] = None) -> ArbolOperacion:
+    """
+    Agrega una operación (ya aplicada en memoria por la vista) al journal y
+    compacta si se acumularon COMPACTAR_CADA operaciones desde el último snapshot.
+    """
+    return registrar_operaciones(
+        arbol, [(operacion, node_id, label, target_id)], usuario=usuario, codigo=codigo, tree=tree,
+    )[0]
+
+
+def _indexar(arbol: ArbolCausas, texto: Optional[str]) -> None:
+    try:
+        indexar(arbol, texto if texto is not None else json_5q_vigente(arbol))
+    except Exception:
+        logger.exception("Error indexando árbol de causas (arbol_id=%s)", arbol.pk)
+
+
+def registrar_operaciones(arbol: ArbolCausas, operaciones: Iterable[Tuple[str, str, str, Optional[str]]],
+                          *, usuario=None, codigo: Optional[str] = None,
+                          tree: Optional[CausalTree] = None) -> List[ArbolOperacion]:
+    """
+    Agrega un lote de operaciones (op, node_id, label, target_id), en orden, con
+    secuencias consecutivas y en una sola transacción. Compacta a lo más una vez.
+
+    'tree' es el árbol con las operaciones ya aplicadas (el de la vista): el
+    índice de búsqueda se actualiza desde él, sin reaplicar el journal.
+    """
+    with transaction.atomic():
+        # Serializa escritores concurrentes sobre la misma versión
+        locked = ArbolCausas.objects.select_for_update().get(pk=arbol.pk)
+        ultima = locked.operaciones.aggregate(m=Max("secuencia"))["m"] or 0
+        usuario = usuario if getattr(usuario, "is_authenticated", False) else None
+        ops = ArbolOperacion.objects.bulk_create([
+            ArbolOperacion(
+                arbol=locked,
+                secuencia=ultima + i,
+                operacion=operacion,
+                node_id=node_id,
+                target_id=target_id or None,
+                label=label or None,
+                usuario=usuario,
+            )
+            for i, (operacion, node_id, label, target_id) in enumerate(operaciones, start=1)
+        ])
+        if ops and ops[-1].secuencia - locked.snapshot_secuencia >= COMPACTAR_CADA:
+            # Se reconstruye desde BD: incluye operaciones concurrentes de otros usuarios
+            compactar(locked, cargar_arbol(locked), codigo=codigo, hasta=ops[-1].secuencia)
+        elif ops and locked.is_current:
+            # Sin compactar no hay save(): el índice de búsqueda se actualiza aquí
+            # (indexar solo reescribe los nodos que cambiaron)
+            texto = tree.export_to_5q_json() if tree is not None else None
+            transaction.on_commit(lambda: _indexar(locked, texto))
+        arbol.snapshot_secuencia = locked.snapshot_secuencia
+        arbol.arbol_json_5q = locked.arbol_json_5q
+        arbol.arbol_json_dot = locked.arbol_json_dot
+    return ops
@@ -0,0 +1,148 @@
+# accidentes/utils/arbol_validacion.py
+# -*- coding: utf-8 -*-
+"""
+Validación estructural (y reparación) de un JSON 5Q guardado.
+
+CausalTree._build_tree es tolerante: ignora claves inválidas y deja los
+huérfanos sueltos. Aquí se detecta explícitamente:
+
+  - json_invalido     : el texto no es JSON o no es un objeto
+  - sin_raiz          : falta "0.0.0.0.0.0.0.0.0"
+  - clave_invalida    : la clave no es 5Q (no numérica, fuera de rango, con
+                        dígitos después de un cero: "1.0.2...")
+  - clave_duplicada   : la misma clave (o dos textos con el mismo código, p.ej.
+                        "1.0" y "1.0.0.0.0.0.0.0.0") aparece más de una vez
+  - etiqueta_invalida : etiqueta no-string o vacía
+  - huerfano          : el padre derivado de la clave no existe
+
+Los ciclos no pueden existir en 5Q (el padre se deriva de la clave); el único
+modo de "ciclo" es el alias de claves, que se reporta como clave_duplicada.
+
+Funciones puras (sin ORM): se ejecutan en procesos de trabajo.
+"""
+from __future__ import annotations
+
+import json
+from typing import Dict, List, Optional, Tuple
+
+from accidentes.utils import clave_5q
+
+ETIQUETA_RAIZ = "Accidente"
+
+
+class _Pares(list):
+    """Objeto JSON como lista de pares (conserva claves repetidas)."""
+
+
+def _clave_canonica(clave: str) -> Optional[int]:
+    """Código de una clave 5Q bien formada (dígitos no-cero contiguos), o None."""
+    try:
+        partes = [int(p) for p in clave.split(".")]
+    except (ValueError, AttributeError):
+        return None
+    if any(not 0 <= d <= clave_5q.MASCARA for d in partes):
+        return None
+    visto_cero = False
+    for d in partes:
+        if d == 0:
+            visto_cero = True
+        elif visto_cero:
+            return None
+    return clave_5q.codificar(clave)
+
+
+def validar(texto: Optional[str], reparar: bool = False) -> Tuple[List[Dict], Optional[str]]:
+    """
+    Devuelve (problemas, json_reparado). json_reparado es None si no se pidió
+    reparar, si no hubo problemas o si el texto no es reparable (JSON roto).
+    """
+    problemas: List[Dict] = []
+
+    try:
+        # pares en orden, sin colapsar claves repetidas (json.loads se queda con la última)
+        pares = json.loads(texto or "", object_pairs_hook=_Pares)
+    except (json.JSONDecodeError, TypeError):
+        return [{"tipo": "json_invalido"}], None
+    if not isinstance(pares, _Pares):
+        return [{"tipo": "json_invalido"}], None
+
+    etiquetas: Dict[int, str] = {}
+    for clave, valor in pares:
+        code = _clave_canonica(clave)
+        if code is None:
+            problemas.append({"tipo": "clave_invalida", "clave": clave})
+            continue
+        if code in etiquetas:
+            # se conserva la primera aparición
+            problemas.append({"tipo": "clave_duplicada", "clave": clave})
+            continue
+        if not isinstance(valor, str) or not valor.strip():
+            problemas.append({"tipo": "etiqueta_invalida", "clave": clave})
+            valor = str(valor).strip() if isinstance(valor, (int, float)) else ""
+        etiquetas[code] = valor or "Sin etiqueta"
+
+    if clave_5q.RAIZ not in etiquetas:
+        problemas.append({"tipo": "sin_raiz"})
+
+    for code in etiquetas:
+        p = clave_5q.padre(code)
+        if p is not None and p not in etiquetas:
+            problemas.append({"tipo": "huerfano", "clave": clave_5q.decodificar(code)})
+
+    if not reparar or not problemas:
+        return problemas, None
+    return problemas, json.dumps(_reparar(etiquetas), ensure_ascii=False)
+
+
+def _reparar(etiquetas: Dict[int, str]) -> Dict[str, str]:
+    """
+    Reconstruye un árbol válido: raíz garantizada y cada huérfano (con su rama)
+    colgado del ancestro existente más cercano, en el siguiente índice libre.
+    """
+    etiquetas = dict(etiquetas)
+    etiquetas.setdefault(clave_5q.RAIZ, ETIQUETA_RAIZ)
+
+    nuevo: Dict[int, int] = {}         # código original -> código reparado
+    siguiente: Dict[int, int] = {}     # código reparado -> próximo índice de hijo
+    ocupados = set()
+
+    def hijo_libre(padre: int) -> int:
+        nivel = clave_5q.nivel(padre)
+        i = siguiente.get(padre, 1)
+        while clave_5q.con_digito(padre, nivel, i) in ocupados:
+            i += 1
+        siguiente[padre] = i + 1
+        return clave_5q.con_digito(padre, nivel, i)
+
+    # por nivel: el padre siempre se resuelve antes que sus hijos; primero los
+    # nodos que conservan su clave, para no quitarles el índice
+    for code in sorted(etiquetas, key=lambda c: (clave_5q.nivel(c), c)):
+        if code == clave_5q.RAIZ:
+            nuevo[code] = code
+            ocupados.add(code)
+            continue
+        p = clave_5q.padre(code)
+        if p in nuevo and nuevo[p] == p:
+            nuevo[code] = code
+            ocupados.add(code)
+    for code in sorted(etiquetas, key=lambda c: (clave_5q.nivel(c), c)):
+        if code in nuevo:
+            continue
+        ancestro = clave_5q.padre(code)
+        while ancestro not in nuevo:
+            ancestro = clave_5q.padre(ancestro)
+        destino = hijo_libre(nuevo[ancestro])
+        nuevo[code] = destino
+        ocupados.add(destino)
+
+    orden = sorted(nuevo, key=lambda c: (clave_5q.nivel(nuevo[c]), nuevo[c]))
+    return {clave_5q.decodificar(nuevo[c]): etiquetas[c] for c in orden}
+
+
+def validar_lote(filas: List[Tuple[int, Optional[str]]], reparar: bool = False) -> List[Tuple[int, int, List[Dict], Optional[str]]]:
+    """Para procesos de trabajo: [(pk, texto)] -> [(pk, bytes, problemas, reparado)]."""
+    out = []
+    for pk, texto in filas:
+        problemas, reparado = validar(texto, reparar=reparar)
+        out.append((pk, len((texto or "").encode("utf-8")), problemas, reparado))
+    return out
@@ -0,0 +1,248 @@
+# accidentes/utils/causa_clusters.py
+# -*- coding: utf-8 -*-
+"""
+Agrupación de causas recurrentes entre casos (proceso offline).
+
+Para un ámbito (todos los casos, un holding o una empresa; el alcance se
+resuelve con scope_accidentes_q, igual que en el resto de la app):
+
+  1. se toman las hojas del árbol vigente de cada caso (causas raíz);
+  2. se vectorizan con TF-IDF (términos de arbol_indice.terminos) en una
+     matriz dispersa, normalizada L2 -> producto punto = coseno;
+  3. S = X·Xᵀ con similitud >= umbral define el grafo de causas parecidas;
+  4. agrupación "estrella": la causa con más vecinos (aún sin grupo) es el
+     centro y se lleva a sus vecinos; se repite. Sin encadenamiento: todo
+     miembro se parece al centro.
+
+Los resúmenes se guardan en CausaCluster; los tableros solo leen esa tabla.
+"""
+from __future__ import annotations
+
+import json
+import logging
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from types import SimpleNamespace
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from accidentes.access import scope_accidentes_q
+from accidentes.models import Accidentes, ArbolCausas, CausaCluster
+from accidentes.utils import clave_5q
+from accidentes.utils.arbol_indice import terminos
+from accidentes.utils.arbol_journal import json_5q_vigente
+
+logger = logging.getLogger(__name__)
+
+UMBRAL = getattr(settings, "ARBOL_CLUSTER_UMBRAL", 0.5)
+MAX_CLUSTERS = getattr(settings, "ARBOL_CLUSTER_MAX", 50)
+MAX_EJEMPLOS = 5
+MAX_CASOS = 20
+BLOQUE = 1000  # filas por bloque al calcular similitudes
+
+# rol "equivalente" de cada ámbito para scope_accidentes_q
+_ROL_AMBITO = {
+    CausaCluster.AMBITO_GLOBAL: "admin_ist",
+    CausaCluster.AMBITO_HOLDING: "admin_holding",
+    CausaCluster.AMBITO_EMPRESA: "admin_empresa",
+}
+
+
+@dataclass
+class Causa:
+    label: str
+    accidente_id: int
+    codigo: str
+
+
+def ambito_de(user) -> Optional[Tuple[str, Optional[int]]]:
+    """(ámbito, id) precalculado que corresponde al alcance del usuario, o None."""
+    rol = getattr(user, "rol", None)
+    if rol in {"admin", "admin_ist"}:
+        return CausaCluster.AMBITO_GLOBAL, None
+    if rol == "admin_holding" and getattr(user, "holding_id", None):
+        return CausaCluster.AMBITO_HOLDING, user.holding_id
+    if rol == "admin_empresa" and getattr(user, "empresa_id", None):
+        return CausaCluster.AMBITO_EMPRESA, user.empresa_id
+    return None
+
+
+def _scope(ambito: str, ambito_id: Optional[int]):
+    usuario = SimpleNamespace(
+        rol=_ROL_AMBITO[ambito],
+        holding_id=ambito_id if ambito == CausaCluster.AMBITO_HOLDING else None,
+        empresa_id=ambito_id if ambito == CausaCluster.AMBITO_EMPRESA else None,
+    )
+    return scope_accidentes_q(usuario)
+
+
+# ----------------- extracción -----------------
+def hojas(texto: str) -> List[str]:
+    """Etiquetas de los nodos sin hijos de un JSON 5Q (la raíz sola no cuenta)."""
+    try:
+        data = json.loads(texto or "{}")
+    except json.JSONDecodeError:
+        return []
+    if not isinstance(data, dict):
+        return []
+    codes = {}
+    for clave, label in data.items():
+        try:
+            codes[clave_5q.codificar(clave)] = str(label).strip()
+        except (ValueError, AttributeError):
+            continue
+    padres = {clave_5q.padre(c) for c in codes}
+    return [label for c, label in codes.items() if c not in padres and c != clave_5q.RAIZ and label]
+
+
+def causas_de(ambito: str, ambito_id: Optional[int]) -> List[Causa]:
+    accidentes = Accidentes.objects.filter(_scope(ambito, ambito_id))
+    causas = []
+    arboles = (
+        ArbolCausas.objects.filter(is_current=True, accidente__in=accidentes)
+        .select_related("accidente").iterator(chunk_size=200)
+    )
+    for arbol in arboles:
+        try:
+            texto = json_5q_vigente(arbol)
+        except (ValueError, json.JSONDecodeError):
+            continue
+        causas.extend(Causa(label, arbol.accidente_id, arbol.accidente.codigo_accidente) for label in hojas(texto))
+    return causas
+
+
+# ----------------- TF-IDF + agrupación -----------------
+def tfidf(documentos: List[List[str]]) -> Tuple[sparse.csr_matrix, Dict[str, int]]:
+    """Matriz documentos x términos, idf suavizado, filas normalizadas L2."""
+    vocab: Dict[str, int] = {}
+    indices, indptr = [], [0]
+    for doc in documentos:
+        indices.extend(vocab.setdefault(t, len(vocab)) for t in doc)
+        indptr.append(len(indices))
+    datos = np.ones(len(indices), dtype=np.float64)
+    X = sparse.csr_matrix((datos, indices, indptr), shape=(len(documentos), max(len(vocab), 1)))
+    X.sum_duplicates()
+
+    n = X.shape[0]
+    df = np.bincount(X.indices, minlength=X.shape[1])
+    idf = np.log((1 + n) / (1 + df)) + 1.0
+    X = X @ sparse.diags(idf)
+
+    normas = np.sqrt(np.asarray(X.multiply(X).sum(axis=1)).ravel())
+    normas[normas == 0] = 1.0
+    return sparse.csr_matrix(sparse.diags(1.0 / normas) @ X), vocab
+
+
+def agrupar(X: sparse.csr_matrix, umbral: float = UMBRAL, pesos: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Etiqueta de grupo por fila (agrupación estrella sobre coseno >= umbral).
+    'pesos': repeticiones de cada fila (las causas idénticas se agrupan antes).
+    """
+    n = X.shape[0]
+    # X·Xᵀ por bloques de filas: el producto completo puede ser casi denso
+    # (palabras frecuentes como "falta"); solo se guarda lo que supera el umbral
+    Xt = X.T.tocsc()
+    bloques = []
+    for i in range(0, n, BLOQUE):
+        B = (X[i:i + BLOQUE] @ Xt).tocsr()
+        B.data[B.data < umbral - 1e-9] = 0
+        B.eliminate_zeros()
+        bloques.append(B)
+    S = sparse.vstack(bloques, format="csr") if bloques else sparse.csr_matrix((0, 0))
+
+    grupo = np.full(n, -1, dtype=np.int64)
+    grados = S @ (pesos if pesos is not None else np.ones(n))
+    siguiente = 0
+    # centros por grado descendente; un vecino ya asignado no se reasigna
+    for centro in np.argsort(-grados, kind="stable"):
+        if grupo[centro] != -1:
+            continue
+        vecinos = S.indices[S.indptr[centro]:S.indptr[centro + 1]]
+        libres = vecinos[grupo[vecinos] == -1]
+        grupo[libres] = siguiente
+        grupo[centro] = siguiente
+        siguiente += 1
+    return grupo
+
+
+def resumir(causas: List[Causa], X: sparse.csr_matrix, vocab: Dict[str, int],
+            grupo: np.ndarray, max_clusters: int = MAX_CLUSTERS) -> List[Dict]:
+    """Resúmenes de los grupos con causas de al menos dos casos, los más grandes primero."""
+    inverso = np.empty(len(vocab), dtype=object)
+    for t, j in vocab.items():
+        inverso[j] = t
+
+    miembros: Dict[int, List[int]] = defaultdict(list)
+    for i, g in enumerate(grupo):
+        miembros[int(g)].append(i)
+
+    resumenes = []
+    for filas in miembros.values():
+        casos = {causas[i].accidente_id: causas[i].codigo for i in filas}
+        if len(casos) < 2:
+            continue
+        centroide = np.asarray(X[filas].mean(axis=0)).ravel()
+        top = [inverso[j] for j in np.argsort(-centroide)[:5] if centroide[j] > 0]
+        etiquetas = Counter(causas[i].label for i in filas)
+        resumenes.append({
+            "etiqueta": etiquetas.most_common(1)[0][0],
+            "terminos": top,
+            "ejemplos": [e for e, _ in etiquetas.most_common(MAX_EJEMPLOS)],
+            "casos": sorted(casos.values())[:MAX_CASOS],
+            "n_causas": len(filas),
+            "n_casos": len(casos),
+        })
+    resumenes.sort(key=lambda r: (-r["n_casos"], -r["n_causas"], r["etiqueta"]))
+    return resumenes[:max_clusters]
+
+
+# ----------------- job -----------------
+def calcular(ambito: str, ambito_id: Optional[int] = None, *, umbral: float = UMBRAL,
+             max_clusters: int = MAX_CLUSTERS) -> int:
+    """Recalcula y reemplaza los grupos guardados de un ámbito. Devuelve cuántos quedaron."""
+    causas = causas_de(ambito, ambito_id)
+    total_casos = len({c.accidente_id for c in causas})
+    total_causas = len(causas)
+    # sin términos (solo palabras vacías) no hay con qué comparar
+    docs = [terminos(c.label) for c in causas]
+    causas = [c for c, d in zip(causas, docs) if d]
+    docs = [d for d in docs if d]
+
+    resumenes: List[Dict] = []
+    if causas:
+        X, vocab = tfidf(docs)
+        # causas con los mismos términos son la misma fila de S (matriz más chica)
+        unicas: Dict[Tuple[str, ...], int] = {}
+        fila = np.array([unicas.setdefault(tuple(sorted(d)), len(unicas)) for d in docs])
+        primera = np.unique(fila, return_index=True)[1]
+        grupo = agrupar(X[primera], umbral, pesos=np.bincount(fila).astype(np.float64))[fila]
+        resumenes = resumir(causas, X, vocab, grupo, max_clusters)
+
+    ahora = timezone.now()
+    with transaction.atomic():
+        CausaCluster.objects.filter(ambito=ambito, ambito_id=ambito_id).delete()
+        CausaCluster.objects.bulk_create([
+            CausaCluster(
+                ambito=ambito, ambito_id=ambito_id, posicion=i,
+                total_causas=total_causas, total_casos=total_casos, calculado_en=ahora, **r
+            )
+            for i, r in enumerate(resumenes, start=1)
+        ])
+    logger.info("Causas recurrentes: ambito=%s id=%s causas=%s grupos=%s",
+                ambito, ambito_id, len(causas), len(resumenes))
+    return len(resumenes)
+
+
+def ambitos() -> Iterable[Tuple[str, Optional[int]]]:
+    """Todos los ámbitos con casos: global, cada holding y cada empresa."""
+    yield CausaCluster.AMBITO_GLOBAL, None
+    con_arbol = Accidentes.objects.filter(arbolcausas__is_current=True)
+    for hid in con_arbol.exclude(holding_id=None).values_list("holding_id", flat=True).distinct().order_by("holding_id"):
+        yield CausaCluster.AMBITO_HOLDING, hid
+    for eid in con_arbol.exclude(empresa_id=None).values_list("empresa_id", flat=True).distinct().order_by("empresa_id"):
+        yield CausaCluster.AMBITO_EMPRESA, eid
@@ -1,32 +1,264 @@
 import json
 import html
+from collections.abc import Mapping
 from graphviz import Digraph
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from accidentes.utils import clave_5q
+
+
+NIL = -1    # "puntero nulo" en los arreglos paralelos
+LIBRE = -1  # código de un slot liberado (los códigos 5Q válidos son >= 0)
+
+
+class _NodesView(Mapping):
+    """
+    Vista de solo lectura compatible con el antiguo `tree.nodes`:
+    { node_id: {'label': str, 'parent': Optional[str], 'children': [str, ...]} }
+
+    Los dicts se construyen al vuelo desde los arreglos de CausalTree;
+    modificarlos NO altera el árbol (usar los métodos públicos).
+    """
+
+    def __init__(self, tree: "CausalTree"):
+        self._tree = tree
+
+    def __getitem__(self, key: str) -> Dict:
+        h = self._tree._handle(key)
+        if h == NIL:
+            raise KeyError(key)
+        return self._tree._node_dict(h)
+
+    def __contains__(self, key) -> bool:
+        return isinstance(key, str) and self._tree._handle(key) != NIL
+
+    def __iter__(self) -> Iterator[str]:
+        for h in self._tree._alive():
+            yield self._tree._key(h)
+
+    def __len__(self) -> int:
+        self._tree._fresh()
+        return len(self._tree._index)
 
 
 class CausalTree:
+    """
+    Árbol de causas 5Q.
+
+    Representación compacta: cada nodo se interna como un entero (handle) y la
+    estructura vive en arreglos paralelos (parent / first_child / last_child /
+    next_sibling / prev_sibling). Así enlazar, desenlazar y mover nodos es O(1)
+    y eliminar una rama cuesta O(tamaño de la rama).
+
+    El handle es el id ESTABLE del nodo; la clave 5Q es solo su posición. Cada
+    nodo guarda su índice entre los hijos del padre (`_slot`) y la ruta 5Q
+    (empaquetada como entero, ver clave_5q) se deriva de ellos. Mover una rama
+    (insert_between) solo la marca como pendiente: sus rutas se recalculan al
+    pedir una clave o exportar (JSON 5Q, DOT). No hay límite de profundidad.
+
+    `nodes` y `edges` se derivan bajo demanda para mantener la API pública.
+    """
     ROOT_KEY = "0.0.0.0.0.0.0.0.0"
 
-    
-
     def __init__(self, arbol_json_5q: str):
         self.arbol_json_5q = arbol_json_5q
-        self.nodes: Dict[str, Dict] = {}
-        self.edges: List[Dict[str, str]] = []
-        self.current: Optional[str] = None
+
+        # --- arreglos paralelos indexados por handle ---
+        self._codes: List[int] = []              # ruta 5Q derivada; LIBRE => slot liberado
+        self._slot: List[int] = []               # índice entre los hijos del padre
+        self._labels: List[str] = []
+        self._parent: List[int] = []
+        self._first_child: List[int] = []
+        self._last_child: List[int] = []
+        self._next_sibling: List[int] = []
+        self._prev_sibling: List[int] = []
+
+        # código 5Q -> handle (válido para todo nodo fuera de ramas pendientes)
+        self._index: Dict[int, int] = {}
+        # raíces de ramas movidas cuyas rutas aún no se recalculan
+        self._stale: List[int] = []
+        self._cur: int = NIL
+
         self._build_tree()
 
+    # ====================== almacenamiento compacto ======================
+
+    def _alloc(self, code: int, label: str, parent: int = NIL, slot: Optional[int] = None) -> int:
+        h = len(self._codes)
+        self._codes.append(code)
+        if slot is None:
+            slot = clave_5q.digito(code, clave_5q.nivel(code) - 1) if code != clave_5q.RAIZ else 0
+        self._slot.append(slot)
+        self._labels.append(label)
+        self._parent.append(NIL)
+        self._first_child.append(NIL)
+        self._last_child.append(NIL)
+        self._next_sibling.append(NIL)
+        self._prev_sibling.append(NIL)
+        self._index[code] = h
+        if parent != NIL:
+            self._link_last(parent, h)
+        return h
+
+    def _link_last(self, parent: int, h: int) -> None:
+        """Cuelga 'h' como último hijo de 'parent' (O(1))."""
+        self._parent[h] = parent
+        self._next_sibling[h] = NIL
+        last = self._last_child[parent]
+        self._prev_sibling[h] = last
+        if last == NIL:
+            self._first_child[parent] = h
+        else:
+            self._next_sibling[last] = h
+        self._last_child[parent] = h
+
+    def _unlink(self, h: int) -> None:
+        """Desengancha 'h' de su padre y hermanos (O(1)); conserva su subárbol."""
+        parent = self._parent[h]
+        prev, nxt = self._prev_sibling[h], self._next_sibling[h]
+        if prev != NIL:
+            self._next_sibling[prev] = nxt
+        elif parent != NIL:
+            self._first_child[parent] = nxt
+        if nxt != NIL:
+            self._prev_sibling[nxt] = prev
+        elif parent != NIL:
+            self._last_child[parent] = prev
+        self._parent[h] = NIL
+        self._prev_sibling[h] = NIL
+        self._next_sibling[h] = NIL
+
+    def _replace(self, old: int, new: int) -> None:
+        """'new' ocupa la posición de 'old' entre sus hermanos (O(1)); 'old' queda suelto."""
+        parent = self._parent[old]
+        prev, nxt = self._prev_sibling[old], self._next_sibling[old]
+        self._parent[new] = parent
+        self._prev_sibling[new] = prev
+        self._next_sibling[new] = nxt
+        if prev != NIL:
+            self._next_sibling[prev] = new
+        elif parent != NIL:
+            self._first_child[parent] = new
+        if nxt != NIL:
+            self._prev_sibling[nxt] = new
+        elif parent != NIL:
+            self._last_child[parent] = new
+        self._parent[old] = NIL
+        self._prev_sibling[old] = NIL
+        self._next_sibling[old] = NIL
+
+    def _children(self, h: int) -> Iterator[int]:
+        c = self._first_child[h]
+        while c != NIL:
+            yield c
+            c = self._next_sibling[c]
+
+    def _subtree(self, h: int) -> List[int]:
+        """Handles del subárbol de 'h' en preorden (iterativo, sin recursión)."""
+        out, stack = [], [h]
+        while stack:
+            n = stack.pop()
+            out.append(n)
+            c = self._last_child[n]
+            while c != NIL:
+                stack.append(c)
+                c = self._prev_sibling[c]
+        return out
+
+    def _alive(self) -> Iterator[int]:
+        for h, code in enumerate(self._codes):
+            if code != LIBRE:
+                yield h
+
+    def _fresh(self) -> None:
+        """Recalcula las rutas 5Q de las ramas movidas (O(tamaño de esas ramas))."""
+        if not self._stale:
+            return
+        stale, self._stale = self._stale, []
+        nodos: List[int] = []
+        for r in stale:
+            if self._codes[r] != LIBRE:
+                nodos.extend(self._subtree(r))
+        for h in nodos:
+            if self._index.get(self._codes[h]) == h:
+                del self._index[self._codes[h]]
+        # preorden: el padre siempre se recalcula antes que sus hijos
+        for h in nodos:
+            p = self._parent[h]
+            if p != NIL:
+                pcode = self._codes[p]
+                self._codes[h] = clave_5q.con_digito(pcode, clave_5q.nivel(pcode), self._slot[h])
+        for h in nodos:
+            self._index[self._codes[h]] = h
+
+    def _handle(self, key: Optional[str]) -> int:
+        if not key:
+            return NIL
+        self._fresh()
+        try:
+            return self._index.get(clave_5q.codificar(key), NIL)
+        except (ValueError, AttributeError):
+            return NIL
+
+    def _key(self, h: int) -> Optional[str]:
+        if h == NIL:
+            return None
+        self._fresh()
+        return clave_5q.decodificar(self._codes[h])
+
+    def _raiz(self) -> int:
+        return self._index.get(clave_5q.RAIZ, NIL)
+
+    def _node_dict(self, h: int) -> Dict:
+        return {
+            'label': self._labels[h],
+            'parent': self._key(self._parent[h]),
+            'children': [self._key(c) for c in self._children(h)],
+        }
+
+    # ====================== vistas compatibles ======================
+
+    @property
+    def nodes(self) -> Mapping:
+        return _NodesView(self)
+
+    @property
+    def edges(self) -> List[Dict[str, str]]:
+        key, parent = self._key, self._parent
+        return [
+            {'from': key(parent[h]), 'to': key(h)}
+            for h in self._alive()
+            if parent[h] != NIL
+        ]
+
+    def get_uid(self, node_id: str) -> Optional[int]:
+        """Id estable del nodo (no cambia aunque se mueva su rama)."""
+        h = self._handle(node_id)
+        return h if h != NIL else None
+
+    def get_node_id(self, uid: int) -> Optional[str]:
+        """Clave 5Q actual del nodo con id estable 'uid' (None si ya no existe)."""
+        if not 0 <= uid < len(self._codes) or self._codes[uid] == LIBRE:
+            return None
+        return self._key(uid)
+
+    @property
+    def current(self) -> Optional[str]:
+        return self._key(self._cur)
+
+    @current.setter
+    def current(self, node_id: Optional[str]) -> None:
+        self._cur = self._handle(node_id)
+
+    # ====================== claves 5Q ======================
+
     def _get_parent_key(self, key_str: str) -> Optional[str]:
-        parts = list(map(int, key_str.split('.')))
-        for i in reversed(range(len(parts))):
-            if parts[i] != 0:
-                parent_parts = parts.copy()
-                parent_parts[i] = 0
-                return '.'.join(map(str, parent_parts))
-        return None
+        parent = clave_5q.padre(clave_5q.codificar(key_str))
+        return clave_5q.decodificar(parent) if parent is not None else None
 
     def _get_level(self, key: str) -> int:
-        return sum(1 for part in key.split('.') if part != '0')
+        return clave_5q.nivel(clave_5q.codificar(key))
+
     def suggest_child_targets(self) -> List[Dict[str, str]]:
         """
         Devuelve las ramas (hijos directos del nodo actual) a las que
@@ -35,183 +267,68 @@ class CausalTree:
         Estructura: [{"id": <child_id>, "label": <texto>}, ...]
         Si no hay hijos actuales, devuelve [].
         """
-        if not self.current:
+        if self._cur == NIL:
             return []
-        curr_children = self.nodes.get(self.current, {}).get('children', [])
-        return [{"id": cid, "label": self.nodes[cid]['label']} for cid in curr_children]
-    
+        return [{"id": self._key(c), "label": self._labels[c]} for c in self._children(self._cur)]
+
     def insert_between_parent_and_child(self, parent_id: str, target_child_id: str, new_label: str) -> bool:
         """
         Inserta un nuevo nodo ENTRE 'parent_id' y su hijo directo 'target_child_id'.
         El nuevo nodo toma la clave del hijo (ocupa su lugar) y el hijo (con TODO
-        su subárbol) pasa a colgar de este nuevo nodo, reenumerando las claves 5Q
-        para mantener una sola rama (lineal) bajo el nodo interpuesto.
+        su subárbol) pasa a ser su primer hijo.
+
+        O(1): solo se reenganchan punteros; las claves 5Q de la rama movida se
+        derivan de nuevo la próxima vez que se consultan.
         """
-        # --- validaciones básicas ---
-        if parent_id not in self.nodes or target_child_id not in self.nodes:
+        parent = self._handle(parent_id)
+        child = self._handle(target_child_id)
+        if parent == NIL or child == NIL or self._parent[child] != parent:
             return False
-        if self.nodes[target_child_id]['parent'] != parent_id:
-            return False
-
-        interposed_id = target_child_id  # el nuevo nodo usará esta misma clave
-
-        # --- 1) tomar un snapshot del subárbol original (por children reales) ---
-        subtree_ids = []
-        stack = [target_child_id]
-        seen = set()
-        while stack:
-            nid = stack.pop()
-            if nid in seen:
-                continue
-            seen.add(nid)
-            subtree_ids.append(nid)
-            for cid in self.nodes[nid].get('children', []):
-                stack.append(cid)
-
-        old_snapshot = {
-            nid: {
-                'label': self.nodes[nid]['label'],
-                'parent': self.nodes[nid]['parent'],
-                'children': list(self.nodes[nid]['children'])
-            }
-            for nid in subtree_ids
-        }
-
-        # --- 2) eliminar físicamente el subárbol antiguo de self.nodes ---
-        for oid in subtree_ids:
-            self.nodes.pop(oid, None)
-
-        # Asegurar que el padre mantiene como hijo la clave 'interposed_id'
-        parent_children = self.nodes[parent_id]['children']
-        if interposed_id not in parent_children:
-            parent_children.append(interposed_id)
-
-        # --- 3) crear el nodo interpuesto (usa la clave antigua del hijo) ---
-        self.nodes[interposed_id] = {
-            'label': new_label,
-            'parent': parent_id,
-            'children': []
-        }
 
-        # --- 4) crear el "nuevo" nodo raíz del subárbol movido, colgando del interpuesto ---
-        moved_root_new_id = self._generate_child_key(interposed_id)  # típicamente ...1
-        root_old = old_snapshot[interposed_id]
-        self.nodes[moved_root_new_id] = {
-            'label': root_old['label'],
-            'parent': interposed_id,
-            'children': []
-        }
-        self.nodes[interposed_id]['children'].append(moved_root_new_id)
-
-        # Mapeo old->new de ids dentro del subárbol (el antiguo root ahora es moved_root_new_id)
-        id_map = {interposed_id: moved_root_new_id}
-
-        # --- 5) recorrer el subárbol antiguo y reconstruir bajo el nuevo root, reenumerando ---
-        queue = list(root_old['children'])  # hijos directos del antiguo root
-        while queue:
-            old_id = queue.pop(0)
-            old_parent = old_snapshot[old_id]['parent']
-            new_parent = id_map.get(old_parent)
-            if not new_parent:
-                # no debería ocurrir; seguridad
-                continue
-
-            # asignar nueva clave 5Q secuencial para este hijo bajo su nuevo padre
-            new_id = self._generate_child_key(new_parent)
-
-            # crear el nodo en la nueva estructura
-            self.nodes[new_id] = {
-                'label': old_snapshot[old_id]['label'],
-                'parent': new_parent,
-                'children': []
-            }
-            # enlazar desde el nuevo padre
-            self.nodes[new_parent]['children'].append(new_id)
-
-            # registrar en el mapeo y encolar sus hijos
-            id_map[old_id] = new_id
-            for gc in old_snapshot[old_id]['children']:
-                queue.append(gc)
-
-        # --- 6) reconstruir edges a partir de la nueva relación padre-hijo ---
-        self.edges = []
-        for nid, nd in self.nodes.items():
-            for cid in nd.get('children', []):
-                if cid in self.nodes:
-                    # forzar consistencia de parent
-                    if self.nodes[cid]['parent'] != nid:
-                        self.nodes[cid]['parent'] = nid
-                    self.edges.append({'from': nid, 'to': cid})
+        # el interpuesto ocupa la posición (y la clave) del hijo
+        interposed = self._alloc(self._codes[child], new_label, slot=self._slot[child])
+        self._replace(child, interposed)
+        self._link_last(interposed, child)
+        self._slot[child] = 1
+        self._stale.append(child)
 
         # seleccionar el nodo interpuesto como "actual"
-        self.current = interposed_id
+        self._cur = interposed
         return True
+
     def _build_tree(self):
         data = json.loads(self.arbol_json_5q)
         root_key = self.ROOT_KEY
         if root_key not in data:
             raise ValueError(f"Falta nodo raíz ({root_key}).")
 
-        sorted_keys = sorted(data.keys(), key=self._get_level)
-        for key in sorted_keys:
-            pkey = self._get_parent_key(key)
-            self.nodes[key] = {
-                'label': data[key],
-                'parent': pkey,
-                'children': []
-            }
-            if pkey and pkey in self.nodes:
-                self.nodes[pkey]['children'].append(key)
-                self.edges.append({'from': pkey, 'to': key})
+        labels = clave_5q.codificar_arbol(data)
+        # por nivel: todo padre se crea antes que sus hijos
+        for code in sorted(labels, key=clave_5q.nivel):
+            pcode = clave_5q.padre(code)
+            self._alloc(code, labels[code], self._index.get(pcode, NIL) if pcode is not None else NIL)
 
-        self.current = root_key
+        self._cur = self._raiz()
 
     def _generate_child_key(self, parent_id: str) -> str:
-        if parent_id not in self.nodes:
+        parent = self._handle(parent_id)
+        if parent == NIL:
             raise ValueError(f"Padre inválido: {parent_id}")
+        return clave_5q.decodificar(self._child_code(parent)[0])
 
-        parts = list(map(int, parent_id.split('.')))
-        # profundidad del padre = número de segmentos no-cero
-        depth = self._get_level(parent_id)  # 0 para raíz, 1 para primer nivel, etc.
-
-        if depth >= len(parts):
-            raise ValueError("Profundidad máxima alcanzada")
-
-        # El hijo debe ocupar el PRIMER cero a la derecha del nivel del padre
-        # (que normalmente es justo en 'depth')
-        slot = None
-        if parts[depth] == 0:
-            slot = depth
-        else:
-            # si por algún motivo no es cero, buscamos el primer cero a la derecha
-            for i in range(depth, len(parts)):
-                if parts[i] == 0:
-                    slot = i
-                    break
-        if slot is None:
-            raise ValueError("No hay slot disponible para hijo")
-
-        # siguiente índice: 1 + índice máximo actual de los hijos en ese slot
-        children = self.nodes[parent_id].get('children', [])
-        if children:
-            # el índice del hijo en 5Q es el dígito en 'slot' de cada hijo
-            try:
-                max_idx = max(int(ch.split('.')[slot]) for ch in children)
-            except Exception:
-                max_idx = len(children)
-            next_idx = max_idx + 1
-        else:
-            next_idx = 1
-
-        new_parts = parts.copy()
-        new_parts[slot] = next_idx
-        # todo lo que esté a la derecha del slot se deja en cero
-        for j in range(slot + 1, len(new_parts)):
-            new_parts[j] = 0
-
-        return '.'.join(map(str, new_parts))
-
-    def wrap_text(self, text: str, max_width: int = 25) -> List[str]:
+    def _child_code(self, parent: int) -> Tuple[int, int]:
+        """
+        (código, slot) del siguiente hijo de 'parent': el dígito va en la posición
+        = nivel del padre y vale 1 + el máximo índice actual de sus hijos.
+        """
+        self._fresh()
+        code = self._codes[parent]
+        slots = [self._slot[c] for c in self._children(parent)]
+        next_idx = max(slots) + 1 if slots else 1
+        return clave_5q.con_digito(code, clave_5q.nivel(code), next_idx), next_idx
+
+    @staticmethod
+    def wrap_text(text: str, max_width: int = 25) -> List[str]:
         words, lines, curr = text.split(), [], []
         for w in words:
             if len(' '.join(curr + [w])) <= max_width:
@@ -235,12 +352,13 @@ class CausalTree:
                  margin='0.1,0.1', dir='back')
         dot.attr('edge', color='#606060', penwidth='0.8')
 
-        for nid, data in self.nodes.items():
-            lines = self.wrap_text(data['label'])
+        for h in self._alive():
+            nid = self._key(h)
+            lines = self.wrap_text(self._labels[h])
             escaped = [f"<FONT>{html.escape(ln)}</FONT>" for ln in lines]
             label = f"<{ '<BR/>'.join(escaped) }>"
             attrs = {}
-            if nid == self.current:
+            if h == self._cur:
                 attrs.update({
                     'fillcolor': "#ECEAEA",
                     'color': "#575757",
@@ -258,79 +376,128 @@ class CausalTree:
         return dot.source
 
     def get_breadcrumbs(self) -> str:
-        curr = self.current
+        h = self._cur
         path = []
-        while curr:
-            path.append(self.nodes[curr]['label'])
-            curr = self.nodes[curr]['parent']
+        while h != NIL:
+            path.append(self._labels[h])
+            h = self._parent[h]
         return " > ".join(reversed(path))
 
     def get_current_label(self) -> str:
-        return self.nodes[self.current]['label'] if self.current else ""
+        return self._labels[self._cur] if self._cur != NIL else ""
 
     def export_to_5q_json(self) -> str:
-        return json.dumps({nid: data['label'] for nid, data in self.nodes.items()}, ensure_ascii=False)
+        return json.dumps({self._key(h): self._labels[h] for h in self._alive()}, ensure_ascii=False)
+
+    # ====================== ventana visible ======================
+
+    def ventana(self, niveles: Optional[int] = None, colapsados: Iterable[str] = ()) -> "CausalTree":
+        """
+        Árbol reducido a lo visible alrededor del nodo actual (mismas claves 5Q),
+        para dibujar árboles muy grandes:
+
+          - 'niveles' hacia arriba y hacia abajo del actual (None = sin límite);
+            sobre la ventana solo se muestra el camino hasta la raíz;
+          - las ramas en 'colapsados' no muestran sus hijos, salvo que el
+            nodo actual esté dentro de ellas.
+
+        Un nodo con hijos ocultos lleva " [+k]" en la etiqueta (k = hijos ocultos).
+        El costo depende de los nodos visibles (y de los hijos directos de los
+        nodos en el borde), no del tamaño total del árbol.
+        """
+        self._fresh()
+        cur = self._cur if self._cur != NIL else self._raiz()
+        camino: List[int] = []
+        h = cur
+        while h != NIL:
+            camino.append(h)
+            h = self._parent[h]
+        camino.reverse()  # raíz ... actual
+
+        ancestros = set(camino[:-1])
+        plegados = {self._handle(k) for k in colapsados} - ancestros - {NIL}
+        prof_actual = len(camino) - 1
+        if niveles is None:
+            tope, prof_max = 0, None
+        else:
+            tope, prof_max = max(0, prof_actual - niveles), prof_actual + niveles
+
+        def etiqueta(n: int, ocultos: int) -> str:
+            return f"{self._labels[n]} [+{ocultos}]" if ocultos else self._labels[n]
+
+        data: Dict[str, str] = {}
+        # camino raíz -> tope, sin los hermanos
+        for i in range(tope):
+            n = camino[i]
+            data[self._key(n)] = etiqueta(n, sum(1 for _ in self._children(n)) - 1)
+        # subárbol del tope, hasta prof_max
+        pila = [(camino[tope], tope)]
+        while pila:
+            n, prof = pila.pop()
+            hijos = list(self._children(n))
+            if hijos and (n in plegados or (prof_max is not None and prof >= prof_max)):
+                data[self._key(n)] = etiqueta(n, len(hijos))
+                continue
+            data[self._key(n)] = self._labels[n]
+            pila.extend((c, prof + 1) for c in reversed(hijos))  # preorden, hermanos en orden
+
+        vista = CausalTree(json.dumps(data, ensure_ascii=False))
+        vista._cur = vista._handle(self._key(cur))
+        return vista
 
     def set_current(self, node_id: str):
-        if node_id in self.nodes:
-            self.current = node_id
+        h = self._handle(node_id)
+        if h != NIL:
+            self._cur = h
 
     def navigate_to_parent(self):
-        if self.current:
-            parent = self.nodes[self.current]['parent']
-            if parent:
-                self.current = parent
+        if self._cur != NIL:
+            parent = self._parent[self._cur]
+            if parent != NIL:
+                self._cur = parent
 
     def navigate_to_root(self):
-        self.current = self.ROOT_KEY
+        self._cur = self._raiz()
 
     def navigate_to_first_child(self):
-        if self.current and self.nodes[self.current]['children']:
-            self.current = self.nodes[self.current]['children'][0]
+        if self._cur != NIL and self._first_child[self._cur] != NIL:
+            self._cur = self._first_child[self._cur]
 
     def navigate_previous_cousin(self):
-        if self.current:
-            parent = self.nodes[self.current]['parent']
-            if parent:
-                siblings = self.nodes[parent]['children']
-                idx = siblings.index(self.current)
-                if idx > 0:
-                    self.current = siblings[idx - 1]
-    
+        if self._cur != NIL and self._parent[self._cur] != NIL:
+            prev = self._prev_sibling[self._cur]
+            if prev != NIL:
+                self._cur = prev
+
     def navigate_next_cousin(self) -> bool:
         """
         Mueve al siguiente hermano (cousin) si existe.
         Si estamos en el nodo raíz, desciende al primer hijo.
         """
-        if not self.current:
+        if self._cur == NIL:
             return False
 
         # Caso especial: si estamos en el nodo raíz
-        if self.current == self.ROOT_KEY:
-            hijos = self.nodes[self.current]['children']
-            if hijos:
-                self.current = hijos[0]
+        if self._codes[self._cur] == clave_5q.RAIZ:
+            first = self._first_child[self._cur]
+            if first != NIL:
+                self._cur = first
                 return True
             return False
 
-        parent_id = self.nodes[self.current]['parent']
-        if not parent_id:
+        if self._parent[self._cur] == NIL:
             return False
 
-        hermanos = self.nodes[parent_id]['children']
-        if self.current not in hermanos:
-            return False
-
-        idx = hermanos.index(self.current)
-        if idx + 1 < len(hermanos):
-            self.current = hermanos[idx + 1]
+        nxt = self._next_sibling[self._cur]
+        if nxt != NIL:
+            self._cur = nxt
             return True
 
         return False  # No hay más hermanos a la derecha
 
     def update_current_label(self, new_label: str) -> bool:
-        if self.current and new_label:
-            self.nodes[self.current]['label'] = new_label
+        if self._cur != NIL and new_label:
+            self._labels[self._cur] = new_label
             return True
         return False
 
@@ -341,106 +508,97 @@ class CausalTree:
         - Si attach_to es el ID de un hijo *existente* del nodo actual, INTERCALA el nuevo nodo
         ENTRE el actual (padre) y esa rama seleccionada (no lo deja debajo).
         """
-        if not self.current:
+        if self._cur == NIL:
             return
 
         # Caso 2: intercalar entre el padre (self.current) y un hijo ya existente (attach_to)
-        if attach_to and attach_to in self.nodes:
-            parent_of_attach = self.nodes[attach_to]['parent']
-            if parent_of_attach == self.current:
-                # Inserta "entre medio"
-                self.insert_between_parent_and_child(self.current, attach_to, label)
-                return
-            # Si attach_to no es hijo directo del actual, caemos al caso por defecto.
+        attach = self._handle(attach_to)
+        if attach != NIL and self._parent[attach] == self._cur:
+            # Inserta "entre medio"
+            self.insert_between_parent_and_child(self.current, attach_to, label)
+            return
+        # Si attach_to no es hijo directo del actual, caemos al caso por defecto.
 
         # Caso 1 (por defecto): crear una **nueva rama** bajo el nodo actual
-        new_id = self._generate_child_key(self.current)
-        self.nodes[new_id] = {
-            'label': label,
-            'parent': self.current,
-            'children': []
-        }
-        self.nodes[self.current]['children'].append(new_id)
-        self.edges.append({'from': self.current, 'to': new_id})
+        code, slot = self._child_code(self._cur)
+        self._alloc(code, label, self._cur, slot=slot)
 
     def add_sibling_node(self, label: str) -> bool:
-        if not self.current:
+        if self._cur == NIL:
             return False
 
-        current_id = self.current
-        parent_id = self.nodes[current_id]['parent']
-        if not parent_id:
+        parent = self._parent[self._cur]
+        if parent == NIL:
             # No se puede crear hermano del nodo raíz
             return False
-
-        # La posición (slot) del hermano corresponde al nivel del padre
-        # (es decir, el índice donde el hijo coloca su dígito)
-        slot = self._get_level(parent_id)  # 0-based
-        siblings = self.nodes[parent_id].get('children', [])
-
-        if siblings:
-            try:
-                max_idx = max(int(s.split('.')[slot]) for s in siblings)
-            except Exception:
-                max_idx = len(siblings)
-            next_idx = max_idx + 1
-        else:
-            next_idx = 1
-
-        # La nueva clave del hermano se construye desde el padre colocando 'next_idx' en 'slot'
-        parts = list(map(int, parent_id.split('.')))
-        parts[slot] = next_idx
-        for i in range(slot + 1, len(parts)):
-            parts[i] = 0
-        new_id = '.'.join(map(str, parts))
-
-        self.nodes[new_id] = {
-            'label': label,
-            'parent': parent_id,
-            'children': []
-        }
-        self.nodes[parent_id]['children'].append(new_id)
-        self.edges.append({'from': parent_id, 'to': new_id})
-        self.current = new_id
+        # El hermano es el siguiente hijo del padre (slot = nivel del padre)
+        code, slot = self._child_code(parent)
+        self._cur = self._alloc(code, label, parent, slot=slot)
         return True
 
-    # ====================== ELIMINACIÓN (corregida) ======================
+    # ====================== OPERACIONES (journal) ======================
+
+    OPERACIONES = ("add_child", "add_sibling", "edit_label", "delete", "insert_between")
+
+    def apply_operation(self, op: str, node_id: str, label: str = "", target_id: Optional[str] = None) -> bool:
+        """
+        Aplica una operación de edición sobre 'node_id' (que pasa a ser el actual).
+        Es determinista: reaplicar las mismas operaciones sobre el mismo snapshot
+        produce exactamente las mismas claves 5Q. Devuelve True si el árbol cambió.
+        """
+        if op not in self.OPERACIONES:
+            raise ValueError(f"Operación desconocida: {op}")
+        if self._handle(node_id) == NIL:
+            return False
+        self.set_current(node_id)
+
+        if op == "add_child":
+            if not label:
+                return False
+            self.add_child_node(label)
+            return True
+        if op == "add_sibling":
+            return bool(label) and self.add_sibling_node(label)
+        if op == "edit_label":
+            return self.update_current_label(label)
+        if op == "delete":
+            return self.delete_current_node()
+        # insert_between
+        return bool(label) and self.insert_between_parent_and_child(node_id, target_id or "", label)
+
+    # ====================== ELIMINACIÓN ======================
 
     def _delete_subtree(self, node_id: str):
         """
         Elimina node_id y todos sus descendientes (nodos y aristas),
         y lo quita de la lista de hijos del padre si corresponde.
+        Costo O(tamaño del subárbol): las aristas se derivan de los arreglos.
         """
-        if node_id not in self.nodes:
+        h = self._handle(node_id)
+        if h == NIL:
             return
 
-        # 1) Borrar recursivamente todos los descendientes
-        for child in list(self.nodes[node_id]['children']):
-            self._delete_subtree(child)
-
-        # 2) Quitar referencia del padre (si existe)
-        parent = self.nodes[node_id]['parent']
-        if parent and node_id in self.nodes.get(parent, {}).get('children', []):
-            self.nodes[parent]['children'].remove(node_id)
-
-        # 3) Limpiar aristas relacionadas a este nodo
-        self.edges = [e for e in self.edges if e['from'] != node_id and e['to'] != node_id]
-
-        # 4) Eliminar el propio nodo
-        self.nodes.pop(node_id, None)
+        self._fresh()
+        self._unlink(h)
+        for n in self._subtree(h):
+            self._index.pop(self._codes[n], None)
+            self._codes[n] = LIBRE
+            self._first_child[n] = self._last_child[n] = NIL
+            if n == self._cur:
+                self._cur = NIL
 
     def delete_current_node(self) -> bool:
         """
         Elimina el nodo actual (y su subárbol) y mueve el puntero al padre.
         No elimina el nodo raíz.
         """
-        if not self.current or self.current == self.ROOT_KEY:
+        if self._cur == NIL or self._codes[self._cur] == clave_5q.RAIZ:
             return False
 
-        parent = self.nodes[self.current]['parent']
-        self._delete_subtree(self.current)
+        parent = self._parent[self._cur]
+        self._delete_subtree(self._key(self._cur))
         # Reposicionar puntero
-        self.current = parent if parent in self.nodes else self.ROOT_KEY
+        self._cur = parent if parent != NIL else self._raiz()
         return True
 
     def delete_node(self, node_id: str) -> bool:
@@ -448,15 +606,17 @@ class CausalTree:
         Elimina un node_id específico (y su subárbol).
         No permite eliminar la raíz.
         """
-        if not node_id or node_id == self.ROOT_KEY or node_id not in self.nodes:
+        h = self._handle(node_id)
+        if h == NIL or self._codes[h] == clave_5q.RAIZ:
             return False
 
-        was_current = (self.current == node_id)
-        parent = self.nodes[node_id]['parent']
+        was_current = (self._cur == h)
+        parent = self._parent[h]
 
         self._delete_subtree(node_id)
 
-        if was_current:
-            self.current = parent if parent in self.nodes else self.ROOT_KEY
+        # si el puntero estaba en la rama eliminada, sube al padre
+        if was_current or self._cur == NIL:
+            self._cur = parent if parent != NIL else self._raiz()
 
         return True
@@ -0,0 +1,70 @@
+# accidentes/utils/clave_5q.py
+# -*- coding: utf-8 -*-
+"""
+Códec de claves 5Q ("1.2.0.0.0.0.0.0.0") <-> entero.
+
+Cada nivel se empaqueta en un campo de 16 bits, el nivel 0 en los bits
+menos significativos. El formato muestra al menos nueve niveles; un árbol más
+profundo simplemente agrega campos (enteros de Python sin límite de tamaño).
+Para claves bien formadas (dígitos no-cero contiguos desde la izquierda):
+
+  - nivel(c)            = índice del campo no-cero más alto + 1 (bit_length)
+  - padre(c)            = c sin su campo más alto
+  - hijo en el slot s   = padre | (k << 16*s)
+
+El texto solo se usa en los bordes (JSON 5Q, DOT, URLs).
+"""
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import Dict, Mapping, Optional
+
+NIVELES = 9  # niveles mínimos del texto 5Q ("0.0.0.0.0.0.0.0.0")
+BITS = 16
+MASCARA = (1 << BITS) - 1
+RAIZ = 0
+
+
+def codificar(clave: str) -> int:
+    """'1.2.0.0.0.0.0.0.0' -> entero. ValueError si la clave no es 5Q válida."""
+    code = 0
+    for i, parte in enumerate(clave.split(".")):
+        d = int(parte)
+        if not 0 <= d <= MASCARA:
+            raise ValueError(f"Índice fuera de rango en clave 5Q: {clave}")
+        code |= d << (BITS * i)
+    return code
+
+
+@lru_cache(maxsize=65536)
+def decodificar(code: int) -> str:
+    """Entero -> '1.2.0.0.0.0.0.0.0' (al menos nueve niveles)."""
+    return ".".join(str((code >> (BITS * i)) & MASCARA) for i in range(max(NIVELES, nivel(code))))
+
+
+def nivel(code: int) -> int:
+    """0 para la raíz, 1 para el primer nivel, etc."""
+    return (code.bit_length() + BITS - 1) // BITS
+
+
+def padre(code: int) -> Optional[int]:
+    """Código del padre (None para la raíz)."""
+    if code == RAIZ:
+        return None
+    return code & ((1 << (BITS * (nivel(code) - 1))) - 1)
+
+
+def digito(code: int, slot: int) -> int:
+    return (code >> (BITS * slot)) & MASCARA
+
+
+def con_digito(code: int, slot: int, valor: int) -> int:
+    """'code' con 'valor' en 'slot' y todo lo que está a la derecha en cero."""
+    if not 0 <= valor <= MASCARA:
+        raise ValueError("Índice de hijo fuera de rango")
+    return (code & ((1 << (BITS * slot)) - 1)) | (valor << (BITS * slot))
+
+
+def codificar_arbol(data: Mapping[str, str]) -> Dict[int, str]:
+    """JSON 5Q ya cargado -> {código: etiqueta} (útil para análisis masivo)."""
+    return {codificar(k): v for k, v in data.items()}
@@ -466,19 +466,16 @@ class InformeDocxBuilder:
         if not arbol:
             return None
 
+        from accidentes.utils.arbol_journal import cargar_arbol, dot_neutro, operaciones_pendientes
+
         dot_src = None
-        if getattr(arbol, "arbol_json_dot", None):
+        pendientes = operaciones_pendientes(arbol).exists()
+        if getattr(arbol, "arbol_json_dot", None) and not pendientes:
             dot_src = arbol.arbol_json_dot
         elif getattr(arbol, "arbol_json_5q", None):
+            # Snapshot sin DOT o con ediciones en el journal -> materializar
             try:
-                from accidentes.utils.causal_tree import CausalTree
-                tree = CausalTree(arbol_json_5q=arbol.arbol_json_5q)
-                if hasattr(tree, "to_dot"):
-                    dot_src = tree.to_dot()
-                elif hasattr(tree, "export_dot"):
-                    dot_src = tree.export_dot()
-                else:
-                    dot_src = str(tree)
+                dot_src = dot_neutro(cargar_arbol(arbol), base_path=None)
             except Exception as e:
                 log.warning("No fue posible generar DOT desde 5Q: %s", e)
                 dot_src = None
@@ -490,10 +487,8 @@ class InformeDocxBuilder:
         base_dir.mkdir(parents=True, exist_ok=True)
         png_path_stem = base_dir / "arbol_causas"
         try:
-            from graphviz import Source
-            s = Source(dot_src)
-            out = s.render(filename=png_path_stem.as_posix(), format="png", cleanup=True)
-            return out
+            from accidentes.utils.graphviz_service import render_to_file
+            return render_to_file(dot_src, png_path_stem.with_suffix(".png"), fmt="png")
         except Exception as e:
             log.warning("Fallo renderizando DOT->PNG con Graphviz: %s", e)
             try:
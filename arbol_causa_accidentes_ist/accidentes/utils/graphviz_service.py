@@ -0,0 +1,113 @@
+# accidentes/utils/graphviz_service.py
+# -*- coding: utf-8 -*-
+"""
+Servicio de render Graphviz (DOT -> SVG/PNG) acotado.
+
+- Cada render es un proceso 'dot' con timeout propio (se mata si se pasa).
+- Concurrencia limitada por proceso gunicorn (semáforo = "pool" de dot);
+  las peticiones extra esperan en cola hasta ARBOL_RENDER_COLA_TIMEOUT y
+  luego fallan con RenderOcupado en vez de bloquear hilos indefinidamente.
+- Se loguea la espera en cola y la duración del render (latencia medible).
+
+Si el binario no existe se lanza graphviz.ExecutableNotFound, igual que la
+librería graphviz, para que los llamadores mantengan su fallback actual.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import subprocess
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from django.conf import settings
+from graphviz import ExecutableNotFound
+
+logger = logging.getLogger(__name__)
+
+DOT_BIN = getattr(settings, "ARBOL_DOT_BIN", "dot")
+MAX_CONCURRENCIA = getattr(settings, "ARBOL_RENDER_MAX_CONCURRENCIA", 2)
+COLA_TIMEOUT = getattr(settings, "ARBOL_RENDER_COLA_TIMEOUT", 5.0)     # seg. esperando un cupo
+RENDER_TIMEOUT = getattr(settings, "ARBOL_RENDER_TIMEOUT", 15.0)      # seg. máximos por render
+
+FORMATOS = ("svg", "png")
+
+_cupos = threading.BoundedSemaphore(MAX_CONCURRENCIA)
+
+
+class RenderError(RuntimeError):
+    """Fallo de render (dot terminó con error)."""
+
+
+class RenderTimeout(RenderError):
+    """dot superó RENDER_TIMEOUT y fue terminado."""
+
+
+class RenderOcupado(RenderError):
+    """No hubo cupo en el pool dentro de COLA_TIMEOUT."""
+
+
+def render(dot_source: str, fmt: str = "svg", *, timeout: Optional[float] = None) -> bytes:
+    """
+    Ejecuta 'dot -T<fmt>' sobre dot_source y devuelve la salida en bytes.
+    """
+    if fmt not in FORMATOS:
+        raise ValueError(f"Formato no soportado: {fmt}")
+    timeout = RENDER_TIMEOUT if timeout is None else timeout
+
+    t0 = time.monotonic()
+    if not _cupos.acquire(timeout=COLA_TIMEOUT):
+        logger.warning("[Graphviz] sin cupo tras %.1fs en cola (fmt=%s)", COLA_TIMEOUT, fmt)
+        raise RenderOcupado("Servicio de render ocupado, intenta nuevamente.")
+    espera = time.monotonic() - t0
+
+    try:
+        t1 = time.monotonic()
+        try:
+            proc = subprocess.run(
+                [DOT_BIN, f"-T{fmt}"],
+                input=dot_source.encode("utf-8"),
+                capture_output=True,
+                timeout=timeout,
+                check=False,
+            )
+        except FileNotFoundError as e:
+            raise ExecutableNotFound([DOT_BIN]) from e
+        except subprocess.TimeoutExpired as e:
+            # subprocess.run ya mató el proceso hijo
+            logger.warning("[Graphviz] timeout %.1fs (fmt=%s dot_chars=%s)", timeout, fmt, len(dot_source))
+            raise RenderTimeout(f"El render superó {timeout:g}s") from e
+        duracion = time.monotonic() - t1
+    finally:
+        _cupos.release()
+
+    if proc.returncode != 0:
+        err = proc.stderr.decode("utf-8", errors="replace").strip()
+        raise RenderError(f"dot terminó con código {proc.returncode}: {err[:500]}")
+
+    logger.info(
+        "[Graphviz] fmt=%s dot_chars=%s bytes=%s espera_ms=%.1f render_ms=%.1f",
+        fmt, len(dot_source), len(proc.stdout), espera * 1000, duracion * 1000,
+    )
+    return proc.stdout
+
+
+def render_svg(dot_source: str, **kwargs) -> str:
+    return render(dot_source, "svg", **kwargs).decode("utf-8")
+
+
+def render_to_file(dot_source: str, path: Path, fmt: str = "png", **kwargs) -> str:
+    """
+    Renderiza a 'path' (escritura atómica) y devuelve la ruta como str.
+    """
+    data = render(dot_source, fmt, **kwargs)
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+    return path.as_posix()
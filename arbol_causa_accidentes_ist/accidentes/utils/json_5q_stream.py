@@ -0,0 +1,118 @@
+# accidentes/utils/json_5q_stream.py
+# -*- coding: utf-8 -*-
+"""
+Lectura incremental del JSON 5Q que devuelve la IA en streaming.
+
+El prompt "arbol_causas" responde un objeto plano {"<clave 5Q>": "<etiqueta>", ...},
+a veces dentro de un bloque ```json. Parser5Q recibe los fragmentos tal como
+llegan y entrega cada par (clave, etiqueta) apenas se cierra su string, sin
+esperar el final del documento. Al terminar, `resultado()` valida el documento
+completo con json.loads (la fuente de verdad es siempre el texto íntegro).
+"""
+from __future__ import annotations
+
+import json
+from typing import Dict, List, Optional, Tuple
+
+from accidentes.utils import clave_5q
+
+# estados
+_INICIO, _CLAVE, _DOS_PUNTOS, _VALOR, _SEPARADOR, _FIN = range(6)
+
+
+class Parser5Q:
+    def __init__(self) -> None:
+        self.texto: List[str] = []
+        self.pares: Dict[str, str] = {}
+        self._estado = _INICIO
+        self._buf: List[str] = []      # string en curso (con comillas y escapes crudos)
+        self._en_string = False
+        self._escape = False
+        self._clave: Optional[str] = None
+
+    def feed(self, fragmento: str) -> List[Tuple[str, str]]:
+        """Procesa un fragmento; devuelve los pares completados en él."""
+        self.texto.append(fragmento)
+        nuevos: List[Tuple[str, str]] = []
+        for ch in fragmento:
+            if self._en_string:
+                self._buf.append(ch)
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._en_string = False
+                    crudo = "".join(self._buf)
+                    try:
+                        valor = json.loads(crudo)
+                    except json.JSONDecodeError:
+                        valor = crudo[1:-1]  # escape inválido: resultado() decidirá
+                    self._buf = []
+                    if self._estado == _CLAVE:
+                        self._clave = valor
+                        self._estado = _DOS_PUNTOS
+                    else:
+                        if isinstance(self._clave, str):
+                            self.pares[self._clave] = valor
+                            nuevos.append((self._clave, valor))
+                        self._clave = None
+                        self._estado = _SEPARADOR
+                continue
+
+            if self._estado == _INICIO:
+                # se ignora todo lo previo a '{' (p.ej. la cerca ```json)
+                if ch == "{":
+                    self._estado = _CLAVE
+            elif self._estado in (_CLAVE, _VALOR) and ch == '"':
+                self._en_string = True
+                self._buf = [ch]
+            elif self._estado == _CLAVE and ch == "}":
+                self._estado = _FIN
+            elif self._estado == _DOS_PUNTOS and ch == ":":
+                self._estado = _VALOR
+            elif self._estado == _SEPARADOR:
+                if ch == ",":
+                    self._estado = _CLAVE
+                elif ch == "}":
+                    self._estado = _FIN
+            # espacios y cualquier otro carácter fuera de strings se ignoran;
+            # el documento completo se valida en resultado()
+        return nuevos
+
+    @property
+    def completo(self) -> bool:
+        return self._estado == _FIN
+
+    def parcial(self) -> Dict[str, str]:
+        """
+        Pares recibidos cuya cadena de ancestros ya llegó (árbol dibujable).
+        Vacío mientras no llegue la raíz.
+        """
+        codigos: Dict[int, str] = {}
+        for k, v in self.pares.items():
+            try:
+                codigos[clave_5q.codificar(k)] = k
+            except (ValueError, AttributeError):
+                continue
+        if clave_5q.RAIZ not in codigos:
+            return {}
+        visibles: Dict[int, bool] = {clave_5q.RAIZ: True}
+        for code in sorted(codigos, key=clave_5q.nivel):
+            p = clave_5q.padre(code)
+            if p is not None:
+                visibles[code] = visibles.get(p, False)
+        return {codigos[c]: self.pares[codigos[c]] for c, ok in visibles.items() if ok}
+
+    def resultado(self) -> dict:
+        """Documento completo (sin cercas ```); ValueError si no es JSON válido."""
+        content = "".join(self.texto).strip()
+        if content.startswith("```"):
+            lines = content.splitlines()[1:]
+            if lines and lines[-1].strip().startswith("```"):
+                lines = lines[:-1]
+            content = "\n".join(lines).strip()
+        try:
+            return json.loads(content)
+        except json.JSONDecodeError:
+            raise ValueError(f"IA response is not valid JSON:\n{content}")
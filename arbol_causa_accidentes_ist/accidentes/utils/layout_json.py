@@ -0,0 +1,84 @@
+# accidentes/utils/layout_json.py
+# -*- coding: utf-8 -*-
+"""
+Layout del árbol de causas como JSON (para dibujarlo en el cliente) y deltas.
+
+Cada nodo lleva una huella (hash de etiqueta, geometría y padre); el 'rev' de
+un layout es el hash de todas las huellas. Las huellas de cada rev emitido se
+guardan en la caché de Django (direccionadas por rev), así el servidor puede
+responder solo lo agregado / cambiado / eliminado respecto del rev que ya
+tiene el cliente. Si ese rev no está en caché se responde el layout completo.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from accidentes.utils.causal_tree import CausalTree
+from accidentes.utils.tree_layout import calcular_layout
+
+REV_TTL = getattr(settings, "ARBOL_LAYOUT_REV_TTL", 60 * 60)  # 1 h
+CACHE_PREFIX = "arbol_layout_rev:"
+
+
+def _hash(texto: str, largo: int = 16) -> str:
+    return hashlib.sha1(texto.encode("utf-8")).hexdigest()[:largo]
+
+
+def nodos_layout(tree: CausalTree) -> Tuple[List[Dict], float, float]:
+    """Nodos con geometría absoluta (pt) en orden de dibujo; 'parent' = clave 5Q o None."""
+    lay = calcular_layout(tree)
+    nodos = []
+    for h, n in lay.nodos.items():
+        nodo = {
+            "id": n.key,
+            "label": n.label,
+            "lines": list(n.lineas),
+            "x": round(n.x, 2),
+            "y": round(n.y, 2),
+            "w": round(n.w, 2),
+            "h": round(n.h, 2),
+            "parent": tree._key(tree._parent[h]),
+        }
+        nodo["fp"] = _hash(json.dumps(nodo, ensure_ascii=False, sort_keys=True), 12)
+        nodos.append(nodo)
+    return nodos, round(lay.ancho, 2), round(lay.alto, 2)
+
+
+def _rev(nodos: List[Dict]) -> str:
+    return _hash("|".join(sorted(f"{n['id']}:{n['fp']}" for n in nodos)))
+
+
+def layout_payload(tree: CausalTree, base_rev: Optional[str] = None) -> Dict:
+    """
+    Layout completo, o delta respecto de 'base_rev' si el servidor aún lo recuerda.
+    Incluye siempre el cursor ('current').
+    """
+    nodos, ancho, alto = nodos_layout(tree)
+    rev = _rev(nodos)
+    huellas = {n["id"]: n["fp"] for n in nodos}
+    cache.set(CACHE_PREFIX + rev, huellas, REV_TTL)
+
+    payload = {"rev": rev, "width": ancho, "height": alto, "current": tree.current}
+
+    previas = cache.get(CACHE_PREFIX + base_rev) if base_rev else None
+    if previas is None:
+        payload.update({
+            "full": True,
+            "nodes": nodos,
+            "edges": [[n["parent"], n["id"]] for n in nodos if n["parent"]],
+        })
+        return payload
+
+    payload.update({
+        "full": False,
+        "base": base_rev,
+        "added": [n for n in nodos if n["id"] not in previas],
+        "changed": [n for n in nodos if n["id"] in previas and previas[n["id"]] != n["fp"]],
+        "removed": [k for k in previas if k not in huellas],
+    })
+    return payload
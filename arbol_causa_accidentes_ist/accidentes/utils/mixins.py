@@ -1,5 +1,9 @@
 # accidentes/utils/mixins.py
-from django.http import HttpResponseRedirect
+import inspect
+import json
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponseRedirect, StreamingHttpResponse
 from django.urls import reverse
 import logging
 logger = logging.getLogger(__name__)
@@ -71,3 +75,39 @@ class AccidenteScopedByCodigoMixin:
 
 class AccidenteAccessMixin(AccidenteScopedByCodigoMixin):
     pass
+
+
+class AsyncIAViewMixin:
+    """
+    Vistas IA async (ASGI): mientras se espera al modelo no se ocupa un hilo.
+
+    Va primero en las bases. El dispatch síncrono de los demás mixins (login,
+    alcance del accidente) corre en un hilo vía sync_to_async; el handler
+    (async def get/post) se espera en el event loop y envuelve su propio
+    acceso a BD/plantillas en sync_to_async.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        respuesta = await sync_to_async(super().dispatch)(request, *args, **kwargs)
+        if inspect.isawaitable(respuesta):
+            respuesta = await respuesta
+        return respuesta
+
+
+class EventStreamMixin:
+    """
+    Generación IA en streaming (text/event-stream): eventos "nombre + JSON" que
+    leen los scripts accidentes/js/*_stream.js. Bajo ASGI el generador es async
+    y la conexión abierta no ocupa un hilo.
+    """
+
+    @staticmethod
+    def _evento(nombre: str, data: dict) -> str:
+        return f"event: {nombre}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    @staticmethod
+    def _event_stream(eventos) -> StreamingHttpResponse:
+        response = StreamingHttpResponse(eventos, content_type="text/event-stream")
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"  # nginx: no acumular el stream
+        return response
@@ -0,0 +1,274 @@
+# accidentes/utils/payload_ia.py
+# -*- coding: utf-8 -*-
+"""
+Empaquetado del payload de los prompts IA por presupuesto de tokens.
+
+Reemplaza el recorte por caracteres (que cortaba el JSON en cualquier punto):
+el payload se mide en tokens y, si no cabe, se reduce campo por campo según
+su prioridad, siempre como JSON válido.
+
+Prioridad (de lo que más se conserva a lo primero que se reduce):
+  hechos > relato > declaraciones > metadata
+
+Cada campo del primer nivel (o del único objeto que envuelve el payload, p.ej.
+"preinitial_data") cae en una categoría por su nombre (CATEGORIAS; los demás
+son metadata). Un prompt puede fijar el orden con "prioridad" en prompt.json
+(lista de campos, el más importante primero) y su presupuesto con
+"max_payload_tokens".
+
+Reducción (en cada paso, del campo menos importante al más importante, y
+solo hasta caber):
+  1. se quitan valores vacíos ("", [], {}, null) en todo el payload
+  2. se abrevian los textos de cada campo a LARGO_ABREVIADO caracteres
+  3. se quitan campos enteros; nunca los de la categoría "hechos" ni el más
+     importante presente
+  4. los textos restantes se abrevian a la mitad (hasta LARGO_MINIMO), y
+     luego todas las listas se acortan en la misma proporción, buscada por
+     bisección (unas pocas mediciones, no una por elemento)
+
+Conteo de tokens: tiktoken (offline una vez descargada la codificación; ver
+TIKTOKEN_CACHE_DIR) con la codificación del modelo, o o200k_base si no la
+conoce. Sin tiktoken se usa una estimación por palabras.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import math
+import re
+from functools import lru_cache
+from typing import Callable, List, Optional
+
+from django.conf import settings
+
+try:
+    import tiktoken
+except ImportError:  # opcional: sin él, estimación por palabras
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+# Presupuesto por defecto del payload (un prompt puede fijar "max_payload_tokens")
+MAX_TOKENS = getattr(settings, "IA_MAX_PAYLOAD_TOKENS", 12_000)
+# Largo de los textos abreviados en el paso 2
+LARGO_ABREVIADO = 400
+# Por debajo de esto un texto ya no se sigue abreviando en el paso 4
+LARGO_MINIMO = 40
+MARCA = " […]"
+
+# Nombre de campo -> categoría (sin normalizar mayúsculas: son las claves que arman las vistas)
+CATEGORIAS = {
+    "hechos": "hechos",
+    "arbol_de_causa": "hechos",
+    "relato": "relato",
+    "relato_inicial": "relato",
+    "relato_final": "relato",
+    "qap": "relato",
+    "qap1": "relato",
+    "qap2": "relato",
+    "qap3": "relato",
+    "pregunta": "relato",
+    "respuesta": "relato",
+    "contexto": "relato",
+    "declaraciones": "declaraciones",
+}
+ORDEN = ("hechos", "relato", "declaraciones", "metadata")
+
+_PALABRA = re.compile(r"\w+|[^\w\s]")
+
+
+# ----------------- conteo de tokens -----------------
+@lru_cache(maxsize=8)
+def _codificacion(modelo: str):
+    if tiktoken is None:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(modelo)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        # sin la codificación en caché ni red para descargarla
+        logger.warning("Payload IA: tiktoken no disponible (%s), se estiman los tokens", e)
+        return None
+
+
+def contar_tokens(texto: str, modelo: str = "") -> int:
+    """Tokens de 'texto' para 'modelo' (estimados si no hay tiktoken)."""
+    enc = _codificacion(modelo or "")
+    if enc is not None:
+        return len(enc.encode(texto, disallowed_special=()))
+    # BPE: ~4 caracteres por token en palabras largas, 1 por signo
+    return sum(max(1, math.ceil(len(p) / 4)) for p in _PALABRA.findall(texto))
+
+
+# ----------------- transformaciones (siempre JSON válido) -----------------
+def _minificar(obj) -> str:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+def _sin_vacios(valor):
+    if isinstance(valor, dict):
+        limpio = {k: _sin_vacios(v) for k, v in valor.items()}
+        return {k: v for k, v in limpio.items() if v not in ("", [], {}, None)}
+    if isinstance(valor, list):
+        limpio = [_sin_vacios(v) for v in valor]
+        return [v for v in limpio if v not in ("", [], {}, None)]
+    if isinstance(valor, str):
+        return valor.strip()
+    return valor
+
+
+def _abreviar_texto(texto: str, largo: int) -> str:
+    if len(texto) <= largo:
+        return texto
+    corte = texto[:largo].rsplit(" ", 1)[0] or texto[:largo]
+    return corte.rstrip(" ,;.:") + MARCA
+
+
+def _abreviar(valor, largo: int):
+    """Abrevia todos los textos de 'valor' (las claves de los objetos no se tocan)."""
+    if isinstance(valor, dict):
+        return {k: _abreviar(v, largo) for k, v in valor.items()}
+    if isinstance(valor, list):
+        return [_abreviar(v, largo) for v in valor]
+    if isinstance(valor, str):
+        return _abreviar_texto(valor, largo)
+    return valor
+
+
+def _recortar_listas(valor, fraccion: float):
+    """Copia de 'valor' con cada lista reducida a sus primeros max(1, len*fraccion) elementos."""
+    if isinstance(valor, dict):
+        return {k: _recortar_listas(v, fraccion) for k, v in valor.items()}
+    if isinstance(valor, list):
+        return [_recortar_listas(v, fraccion) for v in valor[:max(1, int(len(valor) * fraccion))]]
+    return valor
+
+
+def _max_lista(valor) -> int:
+    if isinstance(valor, dict):
+        return max((_max_lista(v) for v in valor.values()), default=0)
+    if isinstance(valor, list):
+        return max([len(valor)] + [_max_lista(v) for v in valor])
+    return 0
+
+
+def _acortar_listas(raiz, cabe: Callable[[object], bool]):
+    """
+    La mayor fracción de elementos de las listas con la que 'raiz' cabe
+    (bisección: O(log n) mediciones). Si ni con un elemento por lista cabe,
+    devuelve ese mínimo.
+    """
+    minimo = _recortar_listas(raiz, 0)
+    if not cabe(minimo):
+        return minimo
+    mejor, bajo, alto = minimo, 0.0, 1.0
+    # basta resolver hasta un elemento de la lista más larga
+    paso = 1 / max(_max_lista(raiz), 1)
+    while alto - bajo > paso:
+        medio = (bajo + alto) / 2
+        candidato = _recortar_listas(raiz, medio)
+        if cabe(candidato):
+            mejor, bajo = candidato, medio
+        else:
+            alto = medio
+    return mejor
+
+
+# ----------------- empaquetado -----------------
+def _campos(datos: dict, prioridad: Optional[List[str]]) -> List[str]:
+    """Campos de 'datos' del menos al más importante."""
+    def rango(campo):
+        if prioridad and campo in prioridad:
+            return (0, prioridad.index(campo))
+        return (1, ORDEN.index(CATEGORIAS.get(campo, "metadata")))
+
+    # a igual rango, el que aparece después se reduce antes
+    campos = list(datos)
+    return sorted(campos, key=lambda c: (rango(c), campos.index(c)), reverse=True)
+
+
+def _texto_plano(texto: str, presupuesto: int, medir: Callable[[str], int]) -> str:
+    texto = " ".join(texto.split())
+    largo = len(texto)
+    while medir(texto) > presupuesto and largo > LARGO_MINIMO:
+        largo = int(largo * 0.8)
+        texto = _abreviar_texto(texto, largo)
+    return texto
+
+
+def empaquetar(entrada: str, modelo: str = "", max_tokens: Optional[int] = None,
+               prioridad: Optional[List[str]] = None, etiqueta: str = "") -> str:
+    """
+    Payload minificado que cabe en 'max_tokens' (MAX_TOKENS por defecto).
+    JSON: se reduce por prioridad y sigue siendo JSON válido. Texto: se
+    colapsan espacios y, si no cabe, se abrevia al final con marca.
+    """
+    s = (entrada or "").strip()
+    if not s:
+        return ""
+    presupuesto = max_tokens or MAX_TOKENS
+
+    def medir(t: str) -> int:
+        return contar_tokens(t, modelo)
+
+    try:
+        obj = json.loads(s)
+    except ValueError:
+        obj = None
+    if not isinstance(obj, (dict, list)):
+        texto = " ".join(s.split()) if obj is None else _minificar(obj)
+        if medir(texto) <= presupuesto:
+            return texto
+        if isinstance(obj, str):
+            # texto JSON entre comillas: se abrevia el contenido, no el literal
+            salida = _minificar(_texto_plano(obj, presupuesto, medir))
+        else:
+            salida = _texto_plano(texto, presupuesto, medir)
+        logger.warning("Payload IA %s: texto abreviado a %s caracteres (%s tokens máx.)",
+                       etiqueta, len(salida), presupuesto)
+        return salida
+
+    s = _minificar(obj)
+    inicial = medir(s)
+    if inicial <= presupuesto:
+        return s
+
+    obj = _sin_vacios(obj)
+    # sobre con un solo objeto (p.ej. {"preinitial_data": {...}}): se trabaja adentro
+    raiz, datos = obj, obj
+    while isinstance(datos, dict) and len(datos) == 1 and isinstance(next(iter(datos.values())), dict):
+        datos = next(iter(datos.values()))
+
+    def cabe(valor=None) -> bool:
+        return medir(_minificar(raiz if valor is None else valor)) <= presupuesto
+
+    pasos = []
+    if isinstance(datos, dict) and datos:
+        campos = _campos(datos, prioridad)
+        for campo in campos:
+            if cabe():
+                break
+            datos[campo] = _abreviar(datos[campo], LARGO_ABREVIADO)
+            pasos.append(f"{campo}~")
+        for campo in campos[:-1]:
+            if cabe():
+                break
+            if campo in datos and CATEGORIAS.get(campo) != "hechos":
+                del datos[campo]
+                pasos.append(f"-{campo}")
+
+    largo = LARGO_ABREVIADO
+    while not cabe() and largo > LARGO_MINIMO:
+        largo //= 2
+        raiz = _abreviar(raiz, largo)
+        pasos.append(f"textos~{largo}")
+    if not cabe():
+        raiz = _acortar_listas(raiz, cabe)
+        pasos.append("listas")
+
+    salida = _minificar(raiz)
+    logger.warning("Payload IA %s: %s -> %s tokens (máx. %s) [%s]",
+                   etiqueta, inicial, medir(salida), presupuesto, ", ".join(pasos) or "vacíos")
+    return salida
@@ -0,0 +1,143 @@
+# accidentes/utils/prompts_ia.py
+# -*- coding: utf-8 -*-
+"""
+Registro de prompts IA (accidentes/setting/prompt/prompt.json).
+
+- Carga diferida: el archivo se lee en la primera consulta, no al importar
+  prompt_utils (arranque de workers y comandos de gestión).
+- Validación completa al cargar: si un prompt no cumple el esquema se
+  informan todos los errores juntos (PromptInvalido).
+- Recarga en caliente: cada consulta compara mtime/tamaño del archivo (un
+  stat); si cambió se vuelve a leer. Si la versión nueva es inválida se
+  registra el error y se siguen usando los prompts anteriores.
+- Cada prompt lleva "version" (sha256 de su configuración), que prompt_utils
+  incluye en la clave de idempotencia: editar un prompt nunca sirve
+  respuestas cacheadas con el texto viejo.
+
+Esquema de cada prompt:
+  model          str, obligatorio
+  instruction    str, obligatorio (mensaje system)
+  user_template  str, opcional; debe contener {payload} (mensaje user)
+  temperature    número 0..2, opcional
+  top_p          número 0..1, opcional
+  max_tokens     entero > 0, opcional
+  max_payload_tokens  entero > 0, opcional (presupuesto del payload, ver payload_ia)
+  prioridad      lista de campos del payload, el más importante primero, opcional
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+PROMPT_FILE = Path(getattr(
+    settings, "IA_PROMPT_FILE", Path(settings.BASE_DIR) / "accidentes" / "setting" / "prompt" / "prompt.json"
+))
+
+
+class PromptInvalido(ValueError):
+    """prompt.json no se pudo leer o algún prompt no cumple el esquema."""
+
+
+def _numero(valor, minimo: float, maximo: float) -> bool:
+    return isinstance(valor, (int, float)) and not isinstance(valor, bool) and minimo <= valor <= maximo
+
+
+def validar(prompts) -> list[str]:
+    """Errores de esquema (vacío si todo está bien)."""
+    if not isinstance(prompts, dict) or not prompts:
+        return ['"prompts" debe ser un objeto no vacío']
+    errores = []
+    for key, cfg in prompts.items():
+        if not isinstance(cfg, dict):
+            errores.append(f"{key}: debe ser un objeto")
+            continue
+        for campo in ("model", "instruction"):
+            if not isinstance(cfg.get(campo), str) or not cfg[campo].strip():
+                errores.append(f"{key}: falta '{campo}'")
+        plantilla = cfg.get("user_template")
+        if plantilla is not None and (not isinstance(plantilla, str) or "{payload}" not in plantilla):
+            errores.append(f"{key}: 'user_template' debe ser texto con {{payload}}")
+        if "temperature" in cfg and not _numero(cfg["temperature"], 0, 2):
+            errores.append(f"{key}: 'temperature' fuera de 0..2")
+        if "top_p" in cfg and not _numero(cfg["top_p"], 0, 1):
+            errores.append(f"{key}: 'top_p' fuera de 0..1")
+        if "max_tokens" in cfg and not (isinstance(cfg["max_tokens"], int) and cfg["max_tokens"] > 0):
+            errores.append(f"{key}: 'max_tokens' debe ser un entero positivo")
+        if "max_payload_tokens" in cfg and not (
+            isinstance(cfg["max_payload_tokens"], int) and cfg["max_payload_tokens"] > 0
+        ):
+            errores.append(f"{key}: 'max_payload_tokens' debe ser un entero positivo")
+        prioridad = cfg.get("prioridad")
+        if prioridad is not None and not (
+            isinstance(prioridad, list) and prioridad and all(isinstance(c, str) for c in prioridad)
+        ):
+            errores.append(f"{key}: 'prioridad' debe ser una lista de campos")
+    return errores
+
+
+def _version(cfg: dict) -> str:
+    canonico = json.dumps(cfg, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonico.encode("utf-8")).hexdigest()
+
+
+class RegistroPrompts:
+    def __init__(self, ruta: Path):
+        self.ruta = Path(ruta)
+        self._prompts: Optional[Dict[str, dict]] = None
+        self._firma: Optional[Tuple[int, int]] = None
+        self._lock = threading.Lock()
+
+    def _leer(self) -> Dict[str, dict]:
+        try:
+            with open(self.ruta, encoding="utf-8") as f:
+                prompts = json.load(f).get("prompts")
+        except (OSError, ValueError, AttributeError) as e:
+            raise PromptInvalido(f"No se pudo leer {self.ruta}: {e}") from e
+        errores = validar(prompts)
+        if errores:
+            raise PromptInvalido(f"{self.ruta}: " + "; ".join(errores))
+        return {key: {**cfg, "version": _version(cfg)} for key, cfg in prompts.items()}
+
+    def _vigentes(self) -> Dict[str, dict]:
+        try:
+            st = os.stat(self.ruta)
+            firma = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            firma = None
+        if self._prompts is not None and firma == self._firma:
+            return self._prompts
+
+        with self._lock:
+            if self._prompts is not None and firma == self._firma:
+                return self._prompts
+            try:
+                prompts = self._leer()
+            except PromptInvalido as e:
+                if self._prompts is None:
+                    raise
+                # edición a medio guardar o con errores: se mantiene lo anterior
+                logger.error("Prompts IA: recarga fallida, se mantienen los anteriores (%s)", e)
+                self._firma = firma
+                return self._prompts
+            if self._prompts is not None:
+                logger.info("Prompts IA: %s recargado (%s prompts)", self.ruta.name, len(prompts))
+            self._prompts, self._firma = prompts, firma
+            return prompts
+
+    def get(self, key: str) -> Optional[dict]:
+        return self._vigentes().get(key)
+
+    def todos(self) -> Dict[str, dict]:
+        return dict(self._vigentes())
+
+
+registro = RegistroPrompts(PROMPT_FILE)
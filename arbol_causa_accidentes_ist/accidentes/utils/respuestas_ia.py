@@ -0,0 +1,167 @@
+# accidentes/utils/respuestas_ia.py
+# -*- coding: utf-8 -*-
+"""
+Almacén persistente de respuestas IA por contenido (RespuestaIA, por tenant).
+
+La caché de Django (IA_IDEM_TTL_S, minutos y por proceso) evita repetir la
+llamada dentro de una misma sesión; este almacén la extiende a días: la misma
+consulta —nombre del prompt, modelo, hash del texto del prompt y hash del
+payload minificado— se responde desde la BD, y el acierto vuelve a la caché
+en memoria (los siguientes se sirven sin tocar la BD).
+
+Cambiar un prompt en prompt.json cambia prompt_hash (su "version" en el
+registro de prompts): sus respuestas viejas ya no se usan y salen con la poda.
+
+Límites (poda automática cada PODA_CADA escrituras, o `manage.py respuestas_ia --podar`):
+  MAX_DIAS      sin uso por más días -> se borra
+  MAX_ENTRADAS  / MAX_BYTES  se borran las menos usadas recientemente (LRU)
+
+'regenerar' en prompt_utils salta la lectura (caché y almacén) y reemplaza
+la respuesta guardada con la nueva.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+from datetime import timedelta
+from typing import Optional
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from accidentes.models import RespuestaIA
+
+logger = logging.getLogger(__name__)
+
+HABILITADO = getattr(settings, "IA_RESPUESTAS", True)
+MAX_DIAS = getattr(settings, "IA_RESPUESTAS_MAX_DIAS", 30)
+MAX_ENTRADAS = getattr(settings, "IA_RESPUESTAS_MAX", 5000)
+MAX_BYTES = getattr(settings, "IA_RESPUESTAS_MAX_MB", 50) * 1024 * 1024
+# La poda automática corre cada tantas escrituras (por proceso)
+PODA_CADA = 50
+
+# Contadores del proceso (el acumulado durable está en RespuestaIA.aciertos)
+CONTADORES = {"aciertos": 0, "fallos": 0, "guardadas": 0}
+
+
+def _sha(texto: str) -> str:
+    return hashlib.sha256(texto.encode("utf-8")).hexdigest()
+
+
+def claves(prompt_key: str, cfg: dict, payload: str) -> dict:
+    """Campos que identifican la consulta; 'clave' es el sha256 de todos."""
+    prompt_hash = cfg.get("version") or _sha(
+        f"{cfg.get('instruction', '')}|{cfg.get('temperature', 0.7)}|{cfg.get('top_p', 1.0)}"
+    )
+    payload_hash = _sha(payload)
+    modelo = cfg["model"]
+    return {
+        "clave": _sha(f"{prompt_key}|{modelo}|{prompt_hash}|{payload_hash}"),
+        "prompt": prompt_key,
+        "modelo": modelo,
+        "prompt_hash": prompt_hash,
+        "payload_hash": payload_hash,
+    }
+
+
+def _disponible() -> bool:
+    """Solo dentro de un tenant: en el esquema public no existe la tabla."""
+    if not HABILITADO:
+        return False
+    esquema = getattr(connection, "schema_name", None)
+    if esquema is None:
+        return True
+    from django_tenants.utils import get_public_schema_name
+    return esquema != get_public_schema_name()
+
+
+# ----------------- lectura / escritura -----------------
+def buscar(prompt_key: str, cfg: dict, payload: str, *, contar_fallo: bool = True) -> Optional[str]:
+    """
+    Texto guardado para la consulta, o None. Un error de BD cuenta como fallo (no rompe la llamada).
+    contar_fallo=False: re-consulta de la misma llamada, cuyo fallo ya se contó.
+    """
+    if not _disponible():
+        return None
+    c = claves(prompt_key, cfg, payload)
+    try:
+        with transaction.atomic():
+            texto = RespuestaIA.objects.filter(clave=c["clave"]).values_list("texto", flat=True).first()
+            if texto is not None:
+                RespuestaIA.objects.filter(clave=c["clave"]).update(
+                    aciertos=F("aciertos") + 1, usado_en=timezone.now()
+                )
+    except DatabaseError as e:
+        logger.warning("Respuestas IA: no se pudo leer (%s)", e)
+        texto = None
+
+    if texto is None:
+        if contar_fallo:
+            CONTADORES["fallos"] += 1
+        return None
+    CONTADORES["aciertos"] += 1
+    logger.info("Respuestas IA: HIT prompt=%s", prompt_key)
+    return texto
+
+
+def guardar(prompt_key: str, cfg: dict, payload: str, texto: str) -> None:
+    """Guarda (o reemplaza, si se regeneró) la respuesta de la consulta."""
+    if not _disponible() or not texto:
+        return
+    c = claves(prompt_key, cfg, payload)
+    try:
+        with transaction.atomic():
+            RespuestaIA.objects.update_or_create(
+                clave=c.pop("clave"),
+                defaults={**c, "texto": texto, "tamano": len(texto.encode("utf-8")),
+                          "aciertos": 0, "usado_en": timezone.now()},
+            )
+    except DatabaseError as e:
+        logger.warning("Respuestas IA: no se pudo guardar (%s)", e)
+        return
+
+    CONTADORES["guardadas"] += 1
+    if CONTADORES["guardadas"] % PODA_CADA == 0:
+        try:
+            podar()
+        except DatabaseError as e:
+            logger.warning("Respuestas IA: no se pudo podar (%s)", e)
+
+
+# ----------------- poda / estadísticas -----------------
+def podar() -> int:
+    """Aplica MAX_DIAS, MAX_ENTRADAS y MAX_BYTES; devuelve cuántas respuestas borró."""
+    borradas, _ = RespuestaIA.objects.filter(usado_en__lt=timezone.now() - timedelta(days=MAX_DIAS)).delete()
+
+    # LRU: se conservan las más recientes mientras quepan en ambos límites
+    conservar, total = [], 0
+    for pk, tamano in RespuestaIA.objects.order_by("-usado_en", "-pk").values_list("pk", "tamano"):
+        total += tamano
+        if len(conservar) >= MAX_ENTRADAS or total > MAX_BYTES:
+            extra, _ = RespuestaIA.objects.exclude(pk__in=conservar).delete()
+            borradas += extra
+            break
+        conservar.append(pk)
+
+    if borradas:
+        logger.info("Respuestas IA: %s respuestas podadas", borradas)
+    return borradas
+
+
+def estadisticas() -> dict:
+    """Entradas, bytes y aciertos acumulados (BD) más los contadores de este proceso."""
+    agg = RespuestaIA.objects.aggregate(entradas=Count("pk"), bytes=Sum("tamano"), aciertos=Sum("aciertos"))
+    por_prompt = list(
+        RespuestaIA.objects.values("prompt")
+        .annotate(entradas=Count("pk"), aciertos=Sum("aciertos"))
+        .order_by("prompt")
+    )
+    return {
+        "entradas": agg["entradas"] or 0,
+        "bytes": agg["bytes"] or 0,
+        "aciertos": agg["aciertos"] or 0,
+        "por_prompt": por_prompt,
+        "proceso": dict(CONTADORES),
+    }
@@ -0,0 +1,326 @@
+# accidentes/utils/single_flight.py
+# -*- coding: utf-8 -*-
+"""
+Single-flight entre procesos para las llamadas IA, por la clave sha256 de
+idempotencia (prompt_utils._idem_key).
+
+Entre todos los procesos (workers de gunicorn, worker_ia, comandos) solo uno
+—el líder— llama al modelo para una misma clave; los demás esperan bloqueados,
+sin sondeo, y reciben el mismo texto:
+
+  PostgreSQL  pg_try_advisory_lock(clave) elige al líder. El resultado se
+              publica con NOTIFY en el canal de la clave (en trozos, en una
+              sola transacción) y los que esperan lo reciben con LISTEN +
+              select() sobre el socket. Si el líder falla avisa "x" y el
+              siguiente toma el lock; si el proceso muere, Postgres suelta el
+              lock y el que espera lo toma al vencer su espera.
+  otros       (SQLite en desarrollo) flock exclusivo sobre un archivo por
+              clave en IA_SINGLE_FLIGHT_DIR; el líder deja el resultado en un
+              archivo vecino y el kernel despierta al que espera al soltarlo.
+
+Uso (ver call_ia_text):
+
+    vuelo = entrar(idem_key, espera_s)
+    try:
+        if vuelo.resultado is not None:
+            return vuelo.resultado           # lo resolvió otro proceso
+        # líder: otro pudo terminar entre la consulta previa y tomar el lock
+        if (texto := buscar_en_cache()) is not None:
+            return texto
+        texto = llamar_al_modelo()
+        vuelo.publicar(texto)
+    finally:
+        vuelo.cerrar()
+
+Cada vuelo Postgres abre su propia conexión (autocommit, fuera de la
+transacción de la request): unos ms frente a segundos de modelo.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import select
+import time
+from pathlib import Path
+from typing import Dict, Optional
+from uuid import uuid4
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin flock
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Directorio de locks/resultados del respaldo por archivo (desarrollo)
+DIRECTORIO = Path(getattr(settings, "IA_SINGLE_FLIGHT_DIR", Path(settings.BASE_DIR) / "cache" / "ia_vuelos"))
+# Caracteres por NOTIFY (el payload máximo es 8000 bytes; UTF-8 usa hasta 4 por carácter)
+TROZO = 1900
+# Archivos de resultado más antiguos que esto se borran (respaldo por archivo)
+RESIDUO_S = 600
+
+
+class VueloOcupado(RuntimeError):
+    """Otro proceso sigue resolviendo la misma consulta y se agotó la espera."""
+
+
+def _es_postgres() -> bool:
+    return connections[DEFAULT_DB_ALIAS].vendor == "postgresql"
+
+
+# ----------------- PostgreSQL: advisory lock + LISTEN/NOTIFY -----------------
+class _VueloPostgres:
+    def __init__(self, clave: str):
+        self.clave = clave
+        self.lock_id = int.from_bytes(bytes.fromhex(clave[:16]), "big", signed=True)
+        self.canal = f"ia_{clave[:32]}"
+        self.id = uuid4().hex[:8]
+        self.lider = False
+        self.resultado: Optional[str] = None
+        self._publicado = False
+        self._fallo = False
+        self._partes: Dict[str, Dict[int, str]] = {}
+        self._conn = None
+
+    # --- conexión propia (autocommit) ---
+    def _conectar(self) -> None:
+        # psycopg2 directo y no un DatabaseWrapper: el camino async la abre,
+        # usa y cierra desde hilos distintos de asyncio.to_thread, y Django no
+        # deja usar un wrapper fuera del hilo que lo creó
+        db = connections[DEFAULT_DB_ALIAS]
+        self._conn = db.Database.connect(**db.get_connection_params())
+        self._conn.autocommit = True
+        with self._conn.cursor() as cur:
+            # escuchar ANTES de intentar el lock: no se pierde un NOTIFY intermedio
+            cur.execute(f'LISTEN "{self.canal}"')
+
+    def _intentar(self) -> bool:
+        with self._conn.cursor() as cur:
+            cur.execute("SELECT pg_try_advisory_lock(%s)", [self.lock_id])
+            self.lider = bool(cur.fetchone()[0])
+        if self.lider:
+            # un líder anterior pudo publicar entre LISTEN y el lock
+            self._leer()
+            if self.resultado is not None:
+                self._soltar()
+        return self.lider
+
+    def _leer(self) -> None:
+        """Procesa los NOTIFY recibidos: trozos 'id i/n:texto' o 'id x' (el líder falló)."""
+        self._conn.poll()
+        while self._conn.notifies:
+            aviso = self._conn.notifies.pop(0)
+            vid, _, resto = aviso.payload.partition(" ")
+            if resto == "x":
+                self._fallo = True
+                continue
+            pos, _, trozo = resto.partition(":")
+            i, _, n = pos.partition("/")
+            partes = self._partes.setdefault(vid, {})
+            partes[int(i)] = trozo
+            if len(partes) == int(n):
+                self.resultado = "".join(partes[j] for j in range(int(n)))
+
+    def _listo(self) -> bool:
+        return self.resultado is not None or self._fallo
+
+    def _soltar(self) -> None:
+        with self._conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_unlock(%s)", [self.lock_id])
+        self.lider = False
+
+    def _vencido(self) -> None:
+        # el líder pudo morir sin avisar: su lock se liberó con la conexión
+        if not self._intentar() and self.resultado is None:
+            raise VueloOcupado("La misma consulta IA sigue en curso en otro proceso.")
+
+    def esperar(self, espera_s: float) -> "_VueloPostgres":
+        self._conectar()
+        limite = time.monotonic() + espera_s
+        while not self._intentar() and self.resultado is None:
+            self._fallo = False
+            while not self._listo():
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    self._vencido()
+                    return self
+                select.select([self._conn], [], [], restante)
+                self._leer()
+            if self.resultado is not None:
+                break
+            logger.info("IA single-flight: el líder falló, se reintenta el lock (%s)", self.canal)
+        return self
+
+    async def aesperar(self, espera_s: float) -> "_VueloPostgres":
+        """Como esperar(), pero la espera es un reader del event loop (no ocupa un hilo)."""
+        await asyncio.to_thread(self._conectar)
+        loop = asyncio.get_running_loop()
+        limite = time.monotonic() + espera_s
+        while not await asyncio.to_thread(self._intentar) and self.resultado is None:
+            self._fallo = False
+            listo = loop.create_future()
+
+            def al_leer():
+                self._leer()
+                if self._listo() and not listo.done():
+                    listo.set_result(None)
+
+            loop.add_reader(self._conn.fileno(), al_leer)
+            try:
+                await asyncio.wait_for(listo, max(limite - time.monotonic(), 0))
+            except asyncio.TimeoutError:
+                await asyncio.to_thread(self._vencido)
+                return self
+            finally:
+                loop.remove_reader(self._conn.fileno())
+            if self.resultado is not None:
+                break
+        return self
+
+    def publicar(self, texto: str) -> None:
+        trozos = [texto[i:i + TROZO] for i in range(0, len(texto), TROZO)] or [""]
+        n = len(trozos)
+        with self._conn.cursor() as cur:
+            # una transacción: los que esperan reciben todos los trozos juntos, en orden
+            cur.execute("BEGIN")
+            for i, trozo in enumerate(trozos):
+                cur.execute("SELECT pg_notify(%s, %s)", [self.canal, f"{self.id} {i}/{n}:{trozo}"])
+            cur.execute("COMMIT")
+        self._publicado = True
+
+    def cerrar(self) -> None:
+        """Suelta el lock y cierra la conexión; nunca lanza (corre en el finally de la llamada IA)."""
+        if self._conn is None:
+            return
+        try:
+            if self.lider:
+                if not self._publicado:
+                    with self._conn.cursor() as cur:
+                        cur.execute("SELECT pg_notify(%s, %s)", [self.canal, f"{self.id} x"])
+                self._soltar()
+        except Exception:
+            logger.exception("IA single-flight: no se pudo liberar %s", self.canal)
+        try:
+            # cerrar la conexión también suelta el lock si lo anterior falló
+            self._conn.close()
+        except Exception:
+            logger.exception("IA single-flight: no se pudo cerrar la conexión de %s", self.canal)
+        finally:
+            self._conn = None
+
+
+# ----------------- respaldo: flock sobre archivos -----------------
+class _VueloArchivo:
+    def __init__(self, clave: str):
+        self.clave = clave
+        self.lider = False
+        self.resultado: Optional[str] = None
+        self._lock = DIRECTORIO / f"{clave}.lock"
+        self._res = DIRECTORIO / f"{clave}.res"
+        self._fd = None
+
+    def esperar(self, espera_s: float) -> "_VueloArchivo":
+        # sin timeout: el líder está acotado por el timeout y los reintentos de la
+        # llamada, y si su proceso muere el kernel suelta el flock
+        DIRECTORIO.mkdir(parents=True, exist_ok=True)
+        inicio = time.time()
+        self._fd = os.open(self._lock, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            # solo vale un resultado escrito mientras esperábamos
+            try:
+                if self._res.stat().st_mtime >= inicio - 1:
+                    self.resultado = self._res.read_text(encoding="utf-8")
+            except FileNotFoundError:
+                pass
+        if self.resultado is None:
+            self.lider = True
+            self._res.unlink(missing_ok=True)
+        else:
+            self._liberar()
+        return self
+
+    async def aesperar(self, espera_s: float) -> "_VueloArchivo":
+        return await asyncio.to_thread(self.esperar, espera_s)
+
+    def publicar(self, texto: str) -> None:
+        tmp = self._res.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(texto, encoding="utf-8")
+        os.replace(tmp, self._res)
+
+    def _liberar(self) -> None:
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+
+    def cerrar(self) -> None:
+        lider = self.lider
+        self._liberar()
+        if lider:
+            _podar()
+
+
+_ultima_poda = 0.0
+
+
+def _podar() -> None:
+    """Borra resultados viejos del respaldo por archivo (a lo más una vez por RESIDUO_S)."""
+    global _ultima_poda
+    ahora = time.time()
+    if ahora - _ultima_poda < RESIDUO_S:
+        return
+    _ultima_poda = ahora
+    for p in DIRECTORIO.glob("*.res"):
+        try:
+            if ahora - p.stat().st_mtime > RESIDUO_S:
+                p.unlink()
+        except OSError:
+            continue
+
+
+class _VueloLocal:
+    """Sin Postgres ni flock (Windows): sin coordinación, siempre líder."""
+    resultado = None
+    lider = True
+
+    def esperar(self, espera_s):
+        return self
+
+    async def aesperar(self, espera_s):
+        return self
+
+    def publicar(self, texto):
+        pass
+
+    def cerrar(self):
+        pass
+
+
+def _vuelo(clave: str):
+    if _es_postgres():
+        return _VueloPostgres(clave)
+    if fcntl is not None:
+        return _VueloArchivo(clave)
+    return _VueloLocal()
+
+
+# ----------------- API -----------------
+def entrar(clave: str, espera_s: float):
+    """
+    Entra al vuelo de 'clave'. Vuelve como líder (resultado None: debe llamar al
+    modelo y publicar) o con el resultado de otro proceso. Siempre cerrar().
+    VueloOcupado si el líder no termina dentro de 'espera_s'.
+    """
+    return _vuelo(clave).esperar(espera_s)
+
+
+async def aentrar(clave: str, espera_s: float):
+    """Versión async de entrar(); cerrar() y publicar() son cortos y se llaman en un hilo."""
+    return await _vuelo(clave).aesperar(espera_s)
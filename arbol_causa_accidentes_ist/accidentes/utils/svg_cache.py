@@ -0,0 +1,205 @@
+# accidentes/utils/svg_cache.py
+# -*- coding: utf-8 -*-
+"""
+Caché de SVG del árbol de causas, direccionada por contenido (sha256 del DOT).
+
+- Se cachea SOLO el SVG del DOT NEUTRO (sin puntero); el resaltado del nodo
+  actual se aplica después como post-proceso de texto, sin re-layout.
+- Un archivo por entrada en un directorio compartido por todos los workers de
+  gunicorn. Expulsión LRU acotada por bytes y por número de entradas: cada hit
+  actualiza el mtime del archivo y al escribir se borran los más antiguos.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import re
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+from graphviz import ExecutableNotFound
+
+from accidentes.utils import graphviz_service, tree_layout
+from accidentes.utils.arbol_journal import dot_neutro
+from accidentes.utils.causal_tree import CausalTree
+
+logger = logging.getLogger(__name__)
+
+SVG_CACHE_DIR = Path(getattr(settings, "ARBOL_SVG_CACHE_DIR", Path(settings.BASE_DIR) / "cache" / "arbol_svg"))
+SVG_CACHE_MAX_BYTES = getattr(settings, "ARBOL_SVG_CACHE_MAX_BYTES", 64 * 1024 * 1024)  # 64 MB
+SVG_CACHE_MAX_ENTRIES = getattr(settings, "ARBOL_SVG_CACHE_MAX_ENTRIES", 2000)
+
+# "nativo" (layout propio, sin subproceso) | "dot" (Graphviz + caché, nativo si falta el binario)
+RENDER_ENGINE = getattr(settings, "ARBOL_RENDER_ENGINE", "nativo")
+
+XML_DECL = '<?xml version="1.0" encoding="UTF-8" standalone="no"?>'
+
+# Estilo del nodo actual (mismo que CausalTree.generate_dot con current resaltado)
+HIGHLIGHT_FILL = "#eceaea"
+HIGHLIGHT_STROKE = "#575757"
+HIGHLIGHT_PENWIDTH = "3"
+
+
+class SvgRenderCache:
+    """LRU en disco; seguro entre procesos (escrituras atómicas con os.replace)."""
+
+    suffix = ".svg"
+
+    def __init__(self, directory: Path, max_bytes: int, max_entries: int):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+
+    def _path(self, digest: str) -> Path:
+        return self.directory / f"{digest}{self.suffix}"
+
+    def get(self, digest: str) -> Optional[str]:
+        path = self._path(digest)
+        try:
+            svg = path.read_text(encoding="utf-8")
+        except (FileNotFoundError, OSError):
+            return None
+        try:
+            os.utime(path)  # marca como usado recientemente (LRU)
+        except OSError:
+            pass
+        return svg
+
+    def set(self, digest: str, svg: str) -> None:
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(svg)
+            os.replace(tmp, self._path(digest))
+        except OSError as e:
+            logger.warning("SVG cache: no se pudo escribir %s: %s", digest, e)
+            return
+        self._evict()
+
+    def _evict(self) -> None:
+        entries = []
+        total = 0
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if not entry.name.endswith(self.suffix):
+                        continue
+                    try:
+                        st = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((st.st_mtime, st.st_size, entry.path))
+                    total += st.st_size
+        except OSError:
+            return
+
+        if total <= self.max_bytes and len(entries) <= self.max_entries:
+            return
+
+        entries.sort()  # más antiguo (menos usado) primero
+        count = len(entries)
+        for _mtime, size, path in entries:
+            if total <= self.max_bytes and count <= self.max_entries:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            count -= 1
+
+
+svg_cache = SvgRenderCache(SVG_CACHE_DIR, SVG_CACHE_MAX_BYTES, SVG_CACHE_MAX_ENTRIES)
+
+
+def dot_digest(dot_source: str) -> str:
+    return hashlib.sha256(dot_source.encode("utf-8")).hexdigest()
+
+
+def render_svg(dot_source: str) -> str:
+    """
+    SVG del DOT (idealmente NEUTRO). Solo invoca a Graphviz en un miss.
+    Propaga graphviz.ExecutableNotFound si el binario 'dot' no está y
+    graphviz_service.RenderError si el render falla / se agota el tiempo.
+    """
+    digest = dot_digest(dot_source)
+    svg = svg_cache.get(digest)
+    if svg is not None:
+        return svg
+
+    svg = graphviz_service.render_svg(dot_source)
+    svg = svg.replace(XML_DECL, "")
+    svg_cache.set(digest, svg)
+    return svg
+
+
+def svg_arbol(tree: CausalTree, base_path: Optional[str]) -> str:
+    """
+    SVG NEUTRO del árbol según ARBOL_RENDER_ENGINE (resaltar luego con highlight_node).
+    Con "dot" puede propagar graphviz_service.RenderError.
+    """
+    if RENDER_ENGINE == "dot":
+        try:
+            return render_svg(dot_neutro(tree, base_path=base_path))
+        except ExecutableNotFound:
+            logger.warning("Graphviz no disponible; usando layout nativo del árbol.")
+    return tree_layout.render_svg(tree, base_path=base_path)
+
+
+_SHAPE_RE = re.compile(r"<(path|polygon|ellipse)\b[^>]*>")
+_TITLE_RE = re.compile(r"<title>([^<]*)</title>")
+
+
+def _set_attr(tag: str, name: str, value: str) -> str:
+    pattern = re.compile(rf'\b{name}="[^"]*"')
+    if pattern.search(tag):
+        return pattern.sub(f'{name}="{value}"', tag, count=1)
+    # atributo ausente: se agrega tras el nombre del elemento
+    return re.sub(r"^<(\w+)", rf'<\1 {name}="{value}"', tag, count=1)
+
+
+def highlight_nodes(svg: str, estilos: Dict[str, Tuple[str, str, str]]) -> str:
+    """
+    Aplica (fill, stroke, stroke-width) a varios nodos en una sola pasada:
+    la primera forma dentro de cada <g class="node"> cuyo <title> esté en 'estilos'.
+    """
+    if not svg or not estilos:
+        return svg
+    partes: List[str] = []
+    pos = 0
+    for t in _TITLE_RE.finditer(svg):
+        estilo = estilos.get(t.group(1))
+        if estilo is None:
+            continue
+        m = _SHAPE_RE.search(svg, t.end())
+        if not m:
+            break
+        # no salir del grupo del nodo
+        next_group = svg.find('class="node"', t.end())
+        if next_group != -1 and m.start() > next_group:
+            continue
+        fill, stroke, width = estilo
+        tag = m.group(0)
+        tag = _set_attr(tag, "fill", fill)
+        tag = _set_attr(tag, "stroke", stroke)
+        tag = _set_attr(tag, "stroke-width", width)
+        partes.append(svg[pos:m.start()])
+        partes.append(tag)
+        pos = m.end()
+    partes.append(svg[pos:])
+    return "".join(partes)
+
+
+def highlight_node(svg: str, node_id: Optional[str]) -> str:
+    """
+    Resalta 'node_id' en un SVG neutro (Graphviz o layout nativo) con el estilo
+    del nodo actual de CausalTree.generate_dot; no re-hace layout.
+    """
+    if not node_id:
+        return svg
+    return highlight_nodes(svg, {node_id: (HIGHLIGHT_FILL, HIGHLIGHT_STROKE, HIGHLIGHT_PENWIDTH)})
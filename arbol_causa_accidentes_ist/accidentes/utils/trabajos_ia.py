@@ -0,0 +1,172 @@
+# accidentes/utils/trabajos_ia.py
+# -*- coding: utf-8 -*-
+"""
+Cola de trabajos IA en BD (TrabajoIA).
+
+Las vistas IA validan y arman el payload en la request, encolan (encolar) y
+responden de inmediato con un aviso que consulta `ia_trabajo` cada POLL_S
+segundos. `manage.py worker_ia` toma los trabajos con
+select_for_update(skip_locked=True), llama a la IA fuera de toda request y
+transacción, y guarda el resultado.
+
+Cada tipo apunta a `ejecutar_trabajo(trabajo) -> dict` en el módulo de su
+vista (import diferido: la vista importa este módulo para encolar). El dict
+puede traer "mensaje", que se muestra al terminar.
+
+'volver' (guardado en parametros) indica qué hace la UI al terminar:
+  {"path": url, "target": "#id", "swap": "innerHTML"}  recarga la sección (HX-Location)
+  {"redirigir": url}                                   navega (HX-Redirect, p.ej. descarga)
+  None                                                 recarga la página (HX-Refresh)
+
+Un trabajo vencido (TIMEOUT_S) vuelve a la cola y otro worker puede tomarlo
+mientras el primero sigue corriendo. Cada ejecución es dueña de la fila solo
+mientras siga 'en_curso' con sus mismos 'intentos': avanzar() lanza
+TrabajoReasignado si la perdió (las tareas avanzan antes de guardar) y el
+cierre de ejecutar() no pisa el estado de la ejecución nueva.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+from datetime import timedelta
+from typing import Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from accidentes.models import TrabajoIA
+
+logger = logging.getLogger(__name__)
+
+# IA en cola (worker_ia) o en la request (vistas async)
+EN_COLA = getattr(settings, "IA_EN_COLA", True)
+# Intervalo (seg.) de consulta de la UI mientras el trabajo sigue activo
+POLL_S = getattr(settings, "IA_TRABAJO_POLL_S", 2)
+# Un trabajo 'en_curso' más antiguo que esto se considera huérfano (worker caído)
+TIMEOUT_S = getattr(settings, "IA_TRABAJO_TIMEOUT_S", 300)
+MAX_INTENTOS = getattr(settings, "IA_TRABAJO_MAX_INTENTOS", 2)
+
+TAREAS = {
+    "relato": "accidentes.views_api.relato.ejecutar_trabajo",
+    "hechos": "accidentes.views_api.hechos.ejecutar_trabajo",
+    "explora": "accidentes.views_api.declaraciones.ejecutar_trabajo",
+    "medidas": "accidentes.views_api.medidas_correctivas.ejecutar_trabajo",
+    "arbol": "accidentes.views_api.arbol.ejecutar_trabajo",
+    "informe": "accidentes.views_api.generar_informe.ejecutar_trabajo",
+}
+
+
+class TrabajoReasignado(RuntimeError):
+    """El trabajo venció y volvió a la cola: esta ejecución ya no es su dueña."""
+
+
+def _clave(tipo: str, accidente_id: int, parametros: dict) -> str:
+    base = json.dumps([tipo, accidente_id, parametros], ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(base.encode("utf-8")).hexdigest()
+
+
+# ----------------- lado vista -----------------
+def encolar(tipo: str, accidente, *, usuario=None, volver: Optional[dict] = None, **parametros) -> TrabajoIA:
+    """
+    Encola un trabajo. Si ya hay uno activo idéntico (doble clic) devuelve ese.
+    'parametros' debe ser serializable a JSON.
+    """
+    if tipo not in TAREAS:
+        raise ValueError(f"Tipo de trabajo IA desconocido: {tipo}")
+    clave = _clave(tipo, accidente.pk, parametros)
+    existente = TrabajoIA.objects.filter(clave=clave, estado__in=TrabajoIA.ACTIVOS).first()
+    if existente:
+        return existente
+    return TrabajoIA.objects.create(
+        tipo=tipo,
+        accidente=accidente,
+        usuario=usuario if getattr(usuario, "is_authenticated", False) else None,
+        parametros={**parametros, "volver": volver},
+        clave=clave,
+    )
+
+
+def activo(accidente, tipo: str) -> Optional[TrabajoIA]:
+    """Último trabajo activo de ese tipo para el accidente (para re-mostrar el aviso al recargar)."""
+    return (
+        TrabajoIA.objects.filter(accidente=accidente, tipo=tipo, estado__in=TrabajoIA.ACTIVOS)
+        .order_by("-creado_en").first()
+    )
+
+
+def contexto(accidente, tipo: str) -> dict:
+    """Variables para accidentes/partials/_trabajo_ia.html."""
+    return {"trabajo_ia": activo(accidente, tipo) if EN_COLA else None, "trabajo_ia_poll_s": POLL_S}
+
+
+# ----------------- lado worker -----------------
+def _propio(trabajo: TrabajoIA):
+    """La fila, solo si esta ejecución sigue siendo su dueña."""
+    return TrabajoIA.objects.filter(pk=trabajo.pk, estado=TrabajoIA.EN_CURSO, intentos=trabajo.intentos)
+
+
+def avanzar(trabajo: TrabajoIA, progreso: int, mensaje: str = "") -> None:
+    """
+    Actualiza el avance visible en la UI (sin tocar el resto de la fila).
+    TrabajoReasignado si el trabajo venció y lo tomó otra ejecución.
+    """
+    trabajo.progreso, trabajo.mensaje = max(0, min(100, progreso)), mensaje[:200]
+    if not _propio(trabajo).update(progreso=trabajo.progreso, mensaje=trabajo.mensaje):
+        raise TrabajoReasignado(f"Trabajo IA {trabajo.pk} reasignado")
+
+
+def tomar() -> Optional[TrabajoIA]:
+    """
+    Reclama el pendiente más antiguo. skip_locked: varios workers no se
+    bloquean entre sí; el UPDATE condicional cubre bases sin FOR UPDATE (SQLite).
+    """
+    with transaction.atomic():
+        candidato = (
+            TrabajoIA.objects.select_for_update(skip_locked=True)
+            .filter(estado=TrabajoIA.PENDIENTE).order_by("creado_en", "pk").first()
+        )
+        if candidato is None:
+            return None
+        ahora = timezone.now()
+        tomado = TrabajoIA.objects.filter(pk=candidato.pk, estado=TrabajoIA.PENDIENTE).update(
+            estado=TrabajoIA.EN_CURSO, iniciado_en=ahora, intentos=candidato.intentos + 1,
+        )
+    if not tomado:
+        return None
+    candidato.refresh_from_db()
+    return candidato
+
+
+def recuperar_vencidos() -> int:
+    """Trabajos 'en_curso' huérfanos: vuelven a la cola o quedan en error tras MAX_INTENTOS."""
+    limite = timezone.now() - timedelta(seconds=TIMEOUT_S)
+    vencidos = TrabajoIA.objects.filter(estado=TrabajoIA.EN_CURSO, iniciado_en__lt=limite)
+    n = vencidos.filter(intentos__lt=MAX_INTENTOS).update(estado=TrabajoIA.PENDIENTE, progreso=0, mensaje="")
+    n += vencidos.update(
+        estado=TrabajoIA.ERROR, error="El trabajo no terminó a tiempo.", terminado_en=timezone.now()
+    )
+    return n
+
+
+def ejecutar(trabajo: TrabajoIA) -> bool:
+    """Ejecuta un trabajo ya tomado y guarda su resultado. True si terminó bien."""
+    try:
+        funcion = import_string(TAREAS[trabajo.tipo])
+        resultado = funcion(trabajo) or {}
+    except TrabajoReasignado:
+        logger.warning("Trabajo IA %s (%s) vencido y reasignado: se descarta esta ejecución", trabajo.pk, trabajo.tipo)
+        return False
+    except Exception as e:
+        logger.exception("Trabajo IA %s (%s) falló", trabajo.pk, trabajo.tipo)
+        _propio(trabajo).update(estado=TrabajoIA.ERROR, error=str(e)[:2000], terminado_en=timezone.now())
+        return False
+    if not _propio(trabajo).update(
+        estado=TrabajoIA.LISTO, progreso=100, resultado=resultado, terminado_en=timezone.now()
+    ):
+        logger.warning("Trabajo IA %s (%s) terminó después de ser reasignado: resultado descartado",
+                       trabajo.pk, trabajo.tipo)
+        return False
+    return True
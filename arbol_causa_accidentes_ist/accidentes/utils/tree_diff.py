@@ -0,0 +1,147 @@
+# accidentes/utils/tree_diff.py
+# -*- coding: utf-8 -*-
+"""
+Diferencias entre dos versiones de un árbol de causas (salidas de
+CausalTree.export_to_5q_json).
+
+Como las claves 5Q son posicionales (cambian al insertar o borrar ramas),
+los nodos se emparejan por contenido y estructura, no por clave:
+
+  1. raíz con raíz;
+  2. etiquetas iguales (hash de la etiqueta normalizada); con repetidas se
+     prefiere la misma clave y luego el orden de aparición;
+  3. lo que queda, por estructura: un nodo nuevo cuyo padre está emparejado
+     toma al hijo libre del padre antiguo en la misma posición (o el primero
+     libre) -> etiqueta cambiada.
+
+Con el emparejamiento:
+  - added / removed  : nodos sin pareja en B / en A
+  - relabelled       : pareja con etiqueta distinta
+  - moved            : pareja cuyo padre en B no es la pareja de su padre en A
+
+Todo es O(n) con diccionarios (más el orden de candidatos repetidos).
+"""
+from __future__ import annotations
+
+import hashlib
+from collections import defaultdict, deque
+from typing import Dict, List
+
+from accidentes.utils.causal_tree import NIL, CausalTree
+
+
+def _hash_label(label: str) -> str:
+    normal = " ".join((label or "").lower().split())
+    return hashlib.sha1(normal.encode("utf-8")).hexdigest()
+
+
+def _bfs(tree: CausalTree) -> List[int]:
+    raices = [h for h in tree._alive() if tree._parent[h] == NIL]
+    orden, cola = [], deque(raices)
+    while cola:
+        h = cola.popleft()
+        orden.append(h)
+        cola.extend(tree._children(h))
+    return orden
+
+
+def diff_arboles(json_a: str, json_b: str) -> Dict:
+    """
+    Compara dos JSON 5Q. Devuelve:
+      {"added": [...], "removed": [...], "relabelled": [...], "moved": [...],
+       "unchanged": int, "mapping": {clave_b: clave_a}}
+    """
+    a, b = CausalTree(json_a), CausalTree(json_b)
+    orden_a, orden_b = _bfs(a), _bfs(b)
+
+    b_a: Dict[int, int] = {}   # handle B -> handle A
+    a_b: Dict[int, int] = {}
+
+    def emparejar(hb: int, ha: int) -> None:
+        b_a[hb] = ha
+        a_b[ha] = hb
+
+    # 1) raíz
+    ra, rb = a._raiz(), b._raiz()
+    if ra != NIL and rb != NIL:
+        emparejar(rb, ra)
+
+    # 2) etiquetas iguales
+    por_hash: Dict[str, List[int]] = defaultdict(list)
+    for ha in orden_a:
+        if ha not in a_b:
+            por_hash[_hash_label(a._labels[ha])].append(ha)
+    pendientes_b: List[int] = []
+    for hb in orden_b:
+        if hb in b_a:
+            continue
+        candidatos = por_hash.get(_hash_label(b._labels[hb]))
+        if not candidatos:
+            pendientes_b.append(hb)
+            continue
+        # preferir la misma clave, luego el mismo padre emparejado, luego el primero
+        elegido = None
+        clave = b._codes[hb]
+        padre_a = b_a.get(b._parent[hb], NIL)
+        for i, ha in enumerate(candidatos):
+            if a._codes[ha] == clave:
+                elegido = i
+                break
+            if elegido is None and a._parent[ha] == padre_a:
+                elegido = i
+        emparejar(hb, candidatos.pop(elegido or 0))
+
+    # 3) por estructura (BFS: el padre ya está resuelto cuando se ve al hijo)
+    for hb in pendientes_b:
+        pa = b_a.get(b._parent[hb], NIL)
+        if pa == NIL:
+            continue
+        libres = [ha for ha in a._children(pa) if ha not in a_b]
+        if not libres:
+            continue
+        misma_pos = [ha for ha in libres if a._slot[ha] == b._slot[hb]]
+        emparejar(hb, (misma_pos or libres)[0])
+
+    def nodo(t: CausalTree, h: int) -> Dict:
+        return {"id": t._key(h), "label": t._labels[h], "parent": t._key(t._parent[h])}
+
+    added = [nodo(b, hb) for hb in orden_b if hb not in b_a]
+    removed = [nodo(a, ha) for ha in orden_a if ha not in a_b]
+    relabelled, moved = [], []
+    unchanged = 0
+    for hb in orden_b:
+        ha = b_a.get(hb)
+        if ha is None:
+            continue
+        cambio = False
+        if _hash_label(a._labels[ha]) != _hash_label(b._labels[hb]):
+            relabelled.append({
+                "old_id": a._key(ha), "new_id": b._key(hb),
+                "old_label": a._labels[ha], "new_label": b._labels[hb],
+            })
+            cambio = True
+        pb, pa = b._parent[hb], a._parent[ha]
+        if pb != NIL and b_a.get(pb, NIL) != pa:
+            moved.append({
+                "old_id": a._key(ha), "new_id": b._key(hb), "label": b._labels[hb],
+                "old_parent": a._key(pa), "new_parent": b._key(pb),
+            })
+            cambio = True
+        if not cambio:
+            unchanged += 1
+
+    return {
+        "added": added,
+        "removed": removed,
+        "relabelled": relabelled,
+        "moved": moved,
+        "unchanged": unchanged,
+        "mapping": {b._key(hb): a._key(ha) for hb, ha in b_a.items()},
+    }
+
+
+def resumen(diff: Dict) -> Dict[str, int]:
+    return {k: len(diff[k]) for k in ("added", "removed", "relabelled", "moved")} | {
+        "unchanged": diff["unchanged"],
+    }
+
@@ -0,0 +1,316 @@
+# accidentes/utils/tree_layout.py
+# -*- coding: utf-8 -*-
+"""
+Layout nativo del árbol de causas (sin Graphviz) y emisión directa de SVG.
+
+El árbol es estrictamente jerárquico (rankdir=TB), así que basta un layout
+tipo Reingold–Tilford: cada subárbol se resume en su "forma" (contornos
+izquierdo/derecho por profundidad + desplazamiento de cada hijo respecto del
+padre) y los hermanos se empaquetan de izquierda a derecha respetando
+NODESEP entre contornos; el padre queda centrado sobre sus hijos.
+
+Las formas se cachean por contenido (ancho del nodo + formas de los hijos),
+así que tras una edición solo se recalculan el subárbol tocado y la cadena de
+ancestros; el resto se reutiliza (también entre requests del mismo worker).
+
+El aspecto replica generate_dot(): Mrecord redondeado 2.0x1.0 in mínimo,
+Arial 10pt, borde #B8B8B8 1.5, aristas #606060 0.8 con flecha hacia el padre,
+<title> = clave 5Q y anclas xlink para navegar (compatible con highlight_node).
+"""
+from __future__ import annotations
+
+import html
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+from accidentes.utils.causal_tree import NIL, CausalTree
+
+# --- medidas en puntos (1 in = 72 pt), mismas que generate_dot ---
+NODE_MIN_W = 2.0 * 72
+NODE_MIN_H = 1.0 * 72
+NODE_MARGIN = 0.1 * 72
+NODESEP = 0.3 * 72
+RANKSEP = 0.4 * 72
+GRAPH_PAD = 4.0
+FONT_SIZE = 10.0
+LINE_H = 12.0
+CORNER_R = 8.0
+ARROW_LEN = 10.0
+ARROW_HALF = 3.5
+
+NODE_FILL = "#ffffff"
+NODE_STROKE = "#b8b8b8"
+NODE_PENWIDTH = "1.5"
+EDGE_COLOR = "#606060"
+EDGE_PENWIDTH = "0.8"
+
+FORMAS_MAX = getattr(settings, "ARBOL_LAYOUT_CACHE_MAX", 20000)
+
+# Ancho aproximado de glifos Arial (en em); el resto usa ANCHO_DEFAULT
+_ANCHOS_ARIAL = {}
+for _chars, _w in (
+    ("iljI.,;:'!|", 0.24), (" ", 0.28), ("ftr()[]-/", 0.33), ("\"*", 0.39),
+    ("sczJ", 0.50), ("0123456789abdeghnopquvxyk$#_?", 0.556),
+    ("ABEKPSVXY", 0.667), ("CDHNRUw", 0.722), ("GOQ", 0.778), ("mM", 0.833), ("W", 0.944),
+):
+    for _c in _chars:
+        _ANCHOS_ARIAL[_c] = _w
+ANCHO_DEFAULT = 0.60
+
+
+def ancho_texto(texto: str, font_size: float = FONT_SIZE) -> float:
+    return sum(_ANCHOS_ARIAL.get(c, ANCHO_DEFAULT) for c in texto) * font_size
+
+
+@lru_cache(maxsize=8192)
+def medir_nodo(label: str) -> Tuple[Tuple[str, ...], float, float]:
+    """(líneas, ancho, alto) del nodo, con el mismo wrap que generate_dot."""
+    lineas = tuple(CausalTree.wrap_text(label))
+    texto_w = max((ancho_texto(ln) for ln in lineas), default=0.0)
+    w = max(NODE_MIN_W, texto_w + 2 * NODE_MARGIN)
+    h = max(NODE_MIN_H, len(lineas) * LINE_H + 2 * NODE_MARGIN)
+    return lineas, w, h
+
+
+@dataclass(frozen=True)
+class _Forma:
+    """Layout relativo de un subárbol (x relativas al centro de su raíz)."""
+    offsets: Tuple[float, ...]   # centro de cada hijo respecto del padre
+    izq: Tuple[float, ...]       # contorno izquierdo por profundidad relativa
+    der: Tuple[float, ...]       # contorno derecho por profundidad relativa
+
+
+# firma (ancho, ids_hijos) -> id estable; id -> _Forma. Ids nunca se reutilizan,
+# así que una forma expulsada invalida correctamente a los ancestros que la citaban.
+_firmas: "OrderedDict[tuple, int]" = OrderedDict()
+_formas: Dict[int, _Forma] = {}
+_siguiente_id = 0
+_lock = threading.Lock()  # gunicorn gthread: varios hilos por worker
+
+
+def _combinar(formas: List[_Forma]) -> Tuple[List[float], List[float], List[float]]:
+    """
+    Empaqueta subárboles hermanos de izquierda a derecha (separación mínima
+    NODESEP entre contornos) y los centra en 0.
+    Devuelve (posiciones, contorno_izq, contorno_der).
+    """
+    posiciones: List[float] = []
+    izq: List[float] = []
+    der: List[float] = []
+    for f in formas:
+        if not posiciones:
+            pos = 0.0
+        else:
+            comunes = min(len(der), len(f.izq))
+            pos = max(der[d] - f.izq[d] + NODESEP for d in range(comunes))
+        posiciones.append(pos)
+        for d, (l, r) in enumerate(zip(f.izq, f.der)):
+            if d < len(izq):
+                izq[d] = min(izq[d], pos + l)
+                der[d] = max(der[d], pos + r)
+            else:
+                izq.append(pos + l)
+                der.append(pos + r)
+
+    if posiciones:
+        medio = (posiciones[0] + posiciones[-1]) / 2.0
+        posiciones = [p - medio for p in posiciones]
+        izq = [x - medio for x in izq]
+        der = [x - medio for x in der]
+    return posiciones, izq, der
+
+
+def _forma(ancho: float, hijos: List[Tuple[int, _Forma]]) -> Tuple[int, _Forma]:
+    """(id, forma) de un nodo de 'ancho' cuyos hijos tienen las formas 'hijos' (cacheada)."""
+    global _siguiente_id
+    firma = (round(ancho, 2), tuple(fid for fid, _ in hijos))
+    with _lock:
+        fid = _firmas.get(firma)
+        if fid is not None:
+            _firmas.move_to_end(firma)
+            return fid, _formas[fid]
+
+    offsets, izq, der = _combinar([f for _, f in hijos])
+    media = ancho / 2.0
+    forma = _Forma(tuple(offsets), (-media, *izq), (media, *der))
+
+    with _lock:
+        fid = _siguiente_id
+        _siguiente_id += 1
+        _firmas[firma] = fid
+        _formas[fid] = forma
+        while len(_firmas) > FORMAS_MAX:
+            _, viejo = _firmas.popitem(last=False)
+            _formas.pop(viejo, None)
+    return fid, forma
+
+
+def vaciar_cache() -> None:
+    """Olvida formas y medidas cacheadas (benchmarks en frío, tests)."""
+    global _siguiente_id
+    with _lock:
+        _firmas.clear()
+        _formas.clear()
+        _siguiente_id = 0
+    medir_nodo.cache_clear()
+
+
+@dataclass
+class NodoLayout:
+    key: str
+    label: str
+    lineas: Tuple[str, ...]
+    x: float        # centro
+    y: float        # centro
+    w: float
+    h: float
+
+
+@dataclass
+class Layout:
+    nodos: Dict[int, NodoLayout]          # handle -> nodo
+    aristas: List[Tuple[int, int]]        # (padre, hijo) en handles
+    ancho: float
+    alto: float
+
+
+def calcular_layout(tree: CausalTree) -> Layout:
+    """Posiciones absolutas (pt, origen arriba-izquierda) de todos los nodos vivos."""
+    # 1) medidas de cada nodo
+    medidas = {h: medir_nodo(tree._labels[h]) for h in tree._alive()}
+
+    raices = [h for h in tree._alive() if tree._parent[h] == NIL]
+    if not raices:
+        return Layout({}, [], 0.0, 0.0)
+
+    # 2) formas bottom-up (postorden iterativo); solo se recalcula lo que cambió
+    forma_de: Dict[int, Tuple[int, _Forma]] = {}
+    for raiz in raices:
+        for h in reversed(tree._subtree(raiz)):
+            forma_de[h] = _forma(medidas[h][1], [forma_de[c] for c in tree._children(h)])
+
+    # 3) posiciones absolutas (bosque: raíces huérfanas lado a lado)
+    pos_raices, izq, _der = _combinar([forma_de[r][1] for r in raices])
+    x0 = GRAPH_PAD - min(izq)
+
+    x: Dict[int, float] = {}
+    prof: Dict[int, int] = {}
+    alto_rango: List[float] = []
+    aristas: List[Tuple[int, int]] = []
+    for raiz, px in zip(raices, pos_raices):
+        x[raiz] = x0 + px
+        prof[raiz] = 0
+        for h in tree._subtree(raiz):
+            d = prof[h]
+            if d == len(alto_rango):
+                alto_rango.append(0.0)
+            alto_rango[d] = max(alto_rango[d], medidas[h][2])
+            offsets = forma_de[h][1].offsets
+            for c, off in zip(tree._children(h), offsets):
+                x[c] = x[h] + off
+                prof[c] = d + 1
+                aristas.append((h, c))
+
+    # 4) y por rango: todos los nodos de una profundidad comparten centro (como dot)
+    centro_rango: List[float] = []
+    y = GRAPH_PAD
+    for alto in alto_rango:
+        centro_rango.append(y + alto / 2.0)
+        y += alto + RANKSEP
+    alto_total = y - RANKSEP + GRAPH_PAD
+
+    nodos: Dict[int, NodoLayout] = {}
+    derecha = 0.0
+    for h, (lineas, w, hgt) in medidas.items():
+        if h not in x:
+            continue
+        nodos[h] = NodoLayout(tree._key(h), tree._labels[h], lineas, x[h], centro_rango[prof[h]], w, hgt)
+        derecha = max(derecha, x[h] + w / 2.0)
+
+    return Layout(nodos, aristas, derecha + GRAPH_PAD, alto_total)
+
+
+# ====================== SVG ======================
+
+def _f(v: float) -> str:
+    return f"{v:.2f}"
+
+
+def _rect_redondeado(n: NodoLayout) -> str:
+    x0, y0 = n.x - n.w / 2.0, n.y - n.h / 2.0
+    x1, y1 = x0 + n.w, y0 + n.h
+    r = CORNER_R
+    return (
+        f"M{_f(x0 + r)},{_f(y0)} L{_f(x1 - r)},{_f(y0)} A{r},{r} 0 0 1 {_f(x1)},{_f(y0 + r)} "
+        f"L{_f(x1)},{_f(y1 - r)} A{r},{r} 0 0 1 {_f(x1 - r)},{_f(y1)} "
+        f"L{_f(x0 + r)},{_f(y1)} A{r},{r} 0 0 1 {_f(x0)},{_f(y1 - r)} "
+        f"L{_f(x0)},{_f(y0 + r)} A{r},{r} 0 0 1 {_f(x0 + r)},{_f(y0)} Z"
+    )
+
+
+def _svg_nodo(i: int, n: NodoLayout, base_path: Optional[str]) -> str:
+    titulo = html.escape(n.label, quote=True)
+    partes = [
+        f'<g id="node{i}" class="node">',
+        f"<title>{html.escape(n.key)}</title>",
+    ]
+    if base_path:
+        href = html.escape(f"{base_path}?action=navigate_to&node_id={n.key}", quote=True)
+        partes.append(f'<g id="a_node{i}"><a xlink:href="{href}" xlink:title="{titulo}" target="_self">')
+    partes.append(
+        f'<path fill="{NODE_FILL}" stroke="{NODE_STROKE}" stroke-width="{NODE_PENWIDTH}" d="{_rect_redondeado(n)}"/>'
+    )
+    base = n.y - len(n.lineas) * LINE_H / 2.0 + FONT_SIZE * 0.9
+    for k, linea in enumerate(n.lineas):
+        partes.append(
+            f'<text text-anchor="middle" x="{_f(n.x)}" y="{_f(base + k * LINE_H)}" '
+            f'font-family="Arial" font-size="{FONT_SIZE:.2f}">{html.escape(linea)}</text>'
+        )
+    if base_path:
+        partes.append("</a></g>")
+    partes.append("</g>")
+    return "\n".join(partes)
+
+
+def _svg_arista(i: int, padre: NodoLayout, hijo: NodoLayout) -> str:
+    # dir=back: la flecha apunta al padre (sale del borde superior del hijo)
+    x0, y0 = hijo.x, hijo.y - hijo.h / 2.0
+    x1, y1 = padre.x, padre.y + padre.h / 2.0
+    yb = y1 + ARROW_LEN
+    cy = (y0 + yb) / 2.0
+    titulo = html.escape(f"{padre.key}->{hijo.key}")
+    return "\n".join([
+        f'<g id="edge{i}" class="edge">',
+        f"<title>{titulo}</title>",
+        f'<path fill="none" stroke="{EDGE_COLOR}" stroke-width="{EDGE_PENWIDTH}" '
+        f'd="M{_f(x0)},{_f(y0)} C{_f(x0)},{_f(cy)} {_f(x1)},{_f(cy)} {_f(x1)},{_f(yb)}"/>',
+        f'<polygon fill="{EDGE_COLOR}" stroke="{EDGE_COLOR}" stroke-width="{EDGE_PENWIDTH}" '
+        f'points="{_f(x1)},{_f(y1)} {_f(x1 - ARROW_HALF)},{_f(yb)} {_f(x1 + ARROW_HALF)},{_f(yb)} {_f(x1)},{_f(y1)}"/>',
+        "</g>",
+    ])
+
+
+def render_svg(tree: CausalTree, base_path: Optional[str] = None) -> str:
+    """
+    SVG NEUTRO (sin nodo resaltado) del árbol; el resaltado se aplica después
+    con svg_cache.highlight_node, igual que con la salida de Graphviz.
+    """
+    lay = calcular_layout(tree)
+    w, h = lay.ancho, lay.alto
+    partes = [
+        f'<svg width="{w:.0f}pt" height="{h:.0f}pt" viewBox="0.00 0.00 {_f(w)} {_f(h)}" '
+        f'xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink">',
+        '<g id="graph0" class="graph">',
+        f'<polygon fill="#ffffff" stroke="none" points="0,0 {_f(w)},0 {_f(w)},{_f(h)} 0,{_f(h)} 0,0"/>',
+    ]
+    for i, (p, c) in enumerate(lay.aristas, start=1):
+        partes.append(_svg_arista(i, lay.nodos[p], lay.nodos[c]))
+    for i, n in enumerate(lay.nodos.values(), start=1):
+        partes.append(_svg_nodo(i, n, base_path))
+    partes.append("</g>\n</svg>")
+    return "\n".join(partes)
@@ -4,26 +4,61 @@ from __future__ import annotations
 
 import json
 import logging
+import time
 from uuid import uuid4
 
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.views import View
 from django.shortcuts import render
 from django.urls import reverse
-from django.http import HttpResponseBadRequest
+from django.http import HttpResponseBadRequest, JsonResponse
+from django.db import transaction
 from django.db.models import Max
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
 
-from graphviz import Source, ExecutableNotFound
-
 from accidentes.models import Accidentes, ArbolCausas, Hechos, Relato
 from accidentes.utils.causal_tree import CausalTree
-from accidentes.access import get_accidente_scoped_or_404  # helper central (404 si fuera de alcance)
-from accidentes.utils.mixins import AccidenteScopedByCodigoMixin  # resuelve self.accidente (+sesión)
-from .prompt_utils import call_ia_json
+from accidentes.utils.arbol_journal import cargar_arbol, dot_neutro, registrar_operacion, registrar_operaciones
+from accidentes.utils.arbol_historial import archivar_anteriores, json_5q_version
+from accidentes.utils.arbol_indice import MAX_RESULTADOS as INDICE_MAX_RESULTADOS, buscar
+from accidentes.utils.graphviz_service import RenderError
+from accidentes.utils.layout_json import layout_payload
+from accidentes.utils.svg_cache import highlight_node, highlight_nodes, svg_arbol
+from accidentes.utils.tree_diff import diff_arboles, resumen
+from accidentes.utils.tree_layout import render_svg as render_svg_nativo
+from accidentes.utils.json_5q_stream import Parser5Q
+from accidentes.access import accidentes_accesibles, get_accidente_scoped_or_404  # helper central (404 si fuera de alcance)
+from accidentes.utils.mixins import AccidenteScopedByCodigoMixin, AsyncIAViewMixin, EventStreamMixin  # resuelve self.accidente (+sesión)
+from .prompt_utils import acall_ia_json, astream_ia_text, call_ia_json
+from accidentes.utils import trabajos_ia
 
 logger = logging.getLogger(__name__)
 
+# Dibujo del árbol en el navegador (layout JSON + deltas) en vez de SVG en el partial
+DIBUJO_CLIENTE = getattr(settings, "ARBOL_DIBUJO_CLIENTE", False)
+# Máximo de operaciones por lote (ArbolLoteView)
+LOTE_MAX_OPERACIONES = getattr(settings, "ARBOL_LOTE_MAX_OPERACIONES", 200)
+# Árboles grandes: solo se dibujan VENTANA_NIVELES niveles alrededor del nodo actual
+VENTANA_NIVELES = getattr(settings, "ARBOL_VENTANA_NIVELES", 3)
+VENTANA_MIN_NODOS = getattr(settings, "ARBOL_VENTANA_MIN_NODOS", 60)
+# Generación en streaming (árbol parcial mientras responde la IA) y
+# intervalo mínimo (seg.) entre árboles parciales enviados
+GENERACION_STREAM = getattr(settings, "ARBOL_GENERACION_STREAM", True)
+STREAM_INTERVALO = getattr(settings, "ARBOL_STREAM_INTERVALO", 0.5)
+
+
+def arbol_visible(tree: CausalTree, colapsados: list[str] | tuple = ()) -> CausalTree:
+    """
+    Lo que se dibuja: el árbol completo si es chico y no hay ramas colapsadas;
+    si no, la ventana alrededor del nodo actual (CausalTree.ventana).
+    """
+    niveles = VENTANA_NIVELES if len(tree.nodes) >= VENTANA_MIN_NODOS else None
+    if niveles is None and not colapsados:
+        return tree
+    return tree.ventana(niveles, colapsados)
+
 
 # ----------------- Helpers de LOG (una sola línea + truncado) -----------------
 def _pretty(obj, max_len: int = 3500) -> str:
@@ -79,6 +114,12 @@ class ArbolIAView(LoginRequiredMixin, AccidenteScopedByCodigoMixin, View):
     template_name = "accidentes/arbol.html"
     partial_template = "accidentes/partials/arbol/_arbol_partial.html"
 
+    # Cursor (nodo resaltado) por usuario y caso: vive en la sesión, nunca en arbol_causas
+    cursor_session_key = "arbol_cursor"
+    cursor_max_casos = 20
+    # Ramas colapsadas por usuario y caso (misma política que el cursor)
+    colapsados_session_key = "arbol_colapsados"
+
     # ----------------- helpers -----------------
     def get_arbol_model(self, accidente: Accidentes):
         return ArbolCausas.objects.filter(accidente=accidente, is_current=True).first()
@@ -91,17 +132,47 @@ class ArbolIAView(LoginRequiredMixin, AccidenteScopedByCodigoMixin, View):
             and Hechos.objects.filter(accidente=accidente).exists()
         )
 
+    def _get_cursor(self, request, arbol_model: ArbolCausas) -> str | None:
+        cursores = request.session.get(self.cursor_session_key) or {}
+        return cursores.get(str(arbol_model.pk))
+
+    def _set_cursor(self, request, arbol_model: ArbolCausas, node_id: str | None) -> None:
+        """
+        Guarda el nodo actual en sesión (clave = arbol_id, o sea caso + versión).
+        Solo marca la sesión como modificada si el cursor cambió.
+        """
+        cursores = dict(request.session.get(self.cursor_session_key) or {})
+        key = str(arbol_model.pk)
+        if not node_id or cursores.get(key) == node_id:
+            return
+        cursores.pop(key, None)
+        cursores[key] = node_id
+        # acotar: conservar solo los casos más recientes
+        while len(cursores) > self.cursor_max_casos:
+            cursores.pop(next(iter(cursores)))
+        request.session[self.cursor_session_key] = cursores
+
+    def _get_colapsados(self, request, arbol_model: ArbolCausas) -> list[str]:
+        return list((request.session.get(self.colapsados_session_key) or {}).get(str(arbol_model.pk)) or [])
+
+    def _set_colapsados(self, request, arbol_model: ArbolCausas, colapsados: list[str]) -> None:
+        todos = dict(request.session.get(self.colapsados_session_key) or {})
+        key = str(arbol_model.pk)
+        todos.pop(key, None)
+        if colapsados:
+            todos[key] = colapsados
+        while len(todos) > self.cursor_max_casos:
+            todos.pop(next(iter(todos)))
+        request.session[self.colapsados_session_key] = todos
+
+    def get_arbol_visible(self, request, arbol_model: ArbolCausas, tree: CausalTree) -> CausalTree:
+        return arbol_visible(tree, self._get_colapsados(request, arbol_model))
+
     def _dot_neutro_para_bd(self, tree: CausalTree, base_path: str | None) -> str:
         """
-        Genera un DOT sin resaltar el nodo actual (sin 'puntero'),
-        usando el truco de poner current=None temporalmente.
+        Genera un DOT sin resaltar el nodo actual (sin 'puntero').
         """
-        _cur = tree.current
-        try:
-            tree.current = None
-            return tree.generate_dot(base_path=base_path)
-        finally:
-            tree.current = _cur
+        return dot_neutro(tree, base_path=base_path)
 
     # ----------------- GET -----------------
     def get(self, request, codigo: str):
@@ -111,12 +182,12 @@ class ArbolIAView(LoginRequiredMixin, AccidenteScopedByCodigoMixin, View):
         """
         is_htmx = (request.headers.get("HX-Request") == "true")
 
-        # Validamos y sincronizamos sesión SIEMPRE, incluso en wrapper,
-        # para homogeneizar comportamiento y evitar estados colgantes.
-        accidente = self.accidente_from(codigo)  # <- 404 si no existe o fuera de alcance
+        # Validamos alcance SIEMPRE, incluso en wrapper (dispatch ya lo resolvió).
+        accidente = self.accidente or self.accidente_from(codigo)  # <- 404 si no existe o fuera de alcance
 
         if not is_htmx:
-            return render(request, self.template_name, {"codigo": codigo})
+            # node_id: enlace directo a un nodo (p.ej. desde la búsqueda)
+            return render(request, self.template_name, {"codigo": codigo, "node_id": request.GET.get("node_id")})
 
         action = request.GET.get("action")
         node_id = request.GET.get("node_id")
@@ -125,28 +196,21 @@ class ArbolIAView(LoginRequiredMixin, AccidenteScopedByCodigoMixin, View):
         if not arbol_model:
             return self.render_arbol(request, codigo, accidente, tree=None, partial=True)
 
-        # Hay árbol: construir y eventualmente navegar
+        # Hay árbol: construir (snapshot + journal) y eventualmente navegar
         try:
-            tree = CausalTree(arbol_model.arbol_json_5q)
+            tree = cargar_arbol(arbol_model)
         except (ValueError, json.JSONDecodeError):
             # JSON roto -> mostrar botón generar
             return self.render_arbol(request, codigo, accidente, tree=None, partial=True)
 
         if action == "navigate_to" and node_id:
-            # Mover puntero en memoria
+            # Mover puntero: solo lectura sobre arbol_causas, el cursor va a la sesión
             tree.set_current(node_id)
+            self._set_cursor(request, arbol_model, tree.current)
+        else:
+            tree.set_current(self._get_cursor(request, arbol_model))
 
-            # Guardar JSON (labels) normalmente
-            arbol_model.arbol_json_5q = tree.export_to_5q_json()
-
-            # Guardar DOT NEUTRO en BD (sin puntero)
-            base = reverse('accidentes:ia_arbol', args=[codigo])
-            arbol_model.arbol_json_dot = self._dot_neutro_para_bd(tree, base_path=base)
-            arbol_model.save()
-
-            return self.render_arbol(request, codigo, accidente, tree, partial=True)
-
-        return self.render_arbol(request, codigo, accidente, tree, partial=True)
+        return self.render_arbol(request, codigo, accidente, tree, partial=True, arbol_model=arbol_model)
 
     # ----------------- POST -----------------
     def post(self, request, codigo: str):
@@ -165,12 +229,27 @@ class ArbolIAView(LoginRequiredMixin, AccidenteScopedByCodigoMixin, View):
             return self.render_arbol(request, codigo, accidente, tree=None, partial=True)
 
         try:
-            tree = CausalTree(arbol_model.arbol_json_5q)
+            tree = cargar_arbol(arbol_model)
         except (ValueError, json.JSONDecodeError):
             return self.render_arbol(request, codigo, accidente, tree=None, partial=True)
 
-        if node_id:
-            tree.set_current(node_id)
+        tree.set_current(node_id or self._get_cursor(request, arbol_model))
+
+        if not self.aplicar_accion(request, codigo, arbol_model, tree, action, node_id, new_label):
+            return self.render_arbol(request, codigo, accidente, tree, partial=True, arbol_model=arbol_model)
+        self._set_cursor(request, arbol_model, tree.current)
+
+        return self.render_arbol(request, codigo, accidente, tree, partial=True, arbol_model=arbol_model)
+
+    # ----------------- acciones -----------------
+    def aplicar_accion(self, request, codigo: str, arbol_model: ArbolCausas, tree: CausalTree,
+                       action: str, node_id: str, new_label: str) -> bool:
+        """
+        Aplica una acción de navegación/edición sobre 'tree' (cursor ya posicionado)
+        y registra la edición en el journal. Devuelve False si la acción no existe.
+        """
+        # Operación a registrar en el journal (None => solo navegación, no se escribe nada)
+        operacion = None
 
         if action == "navigate_to" and node_id:
             tree.set_current(node_id)
@@ -189,7 +268,9 @@ class ArbolIAView(LoginRequiredMixin, AccidenteScopedByCodigoMixin, View):
             else:
                 messages.warning(request, "No hay más nodos a la derecha.")
         elif action == "edit_node":
+            target = tree.current
             if tree.update_current_label(new_label):
+                operacion = ("edit_label", target, new_label, None)
                 messages.success(request, "Etiqueta actualizada.")
             else:
                 messages.warning(request, "Texto inválido.")
@@ -198,54 +279,73 @@ class ArbolIAView(LoginRequiredMixin, AccidenteScopedByCodigoMixin, View):
                 attach_to = (request.POST.get("attach_to") or "").strip()
                 if attach_to:
                     # Inserta entre el padre (nodo actual) y la rama existente seleccionada
-                    ok = getattr(tree, "insert_between_parent_and_child", None)
-                    if callable(ok):
-                        ok = tree.insert_between_parent_and_child(tree.current, attach_to, new_label)
-                    else:
-                        ok = False
+                    target = tree.current
+                    ok = tree.insert_between_parent_and_child(target, attach_to, new_label)
                     if ok:
+                        operacion = ("insert_between", target, new_label, attach_to)
                         messages.success(request, "Nodo insertado entre el padre y la rama seleccionada.")
                     else:
                         messages.warning(request, "No fue posible insertar: la rama seleccionada no es hija directa.")
                 else:
                     # Comportamiento por defecto: crear hijo directo nuevo
                     tree.add_child_node(new_label)
+                    operacion = ("add_child", tree.current, new_label, None)
                     messages.success(request, "Hijo añadido.")
             else:
                 messages.warning(request, "Etiqueta vacía.")
         elif action == "add_sibling":
             if new_label:
+                target = tree.current
                 success = tree.add_sibling_node(new_label)
                 if success:
+                    operacion = ("add_sibling", target, new_label, None)
                     messages.success(request, "Hermano añadido.")
                 else:
                     messages.warning(request, "No se puede añadir un hermano al nodo raíz.")
             else:
                 messages.warning(request, "Etiqueta vacía.")
+        elif action == "toggle_collapse":
+            # Solo vista (sesión): no toca arbol_causas ni el journal
+            colapsados = self._get_colapsados(request, arbol_model)
+            target = tree.current
+            if target in colapsados:
+                colapsados.remove(target)
+            elif target:
+                colapsados.append(target)
+            self._set_colapsados(request, arbol_model, colapsados)
+        elif action == "expand_all":
+            self._set_colapsados(request, arbol_model, [])
         elif action in {"delete_node", "delete_current"}:
-            tree.delete_current_node()
-            messages.success(request, "Nodo eliminado correctamente.")
+            target = tree.current
+            if tree.delete_current_node():
+                operacion = ("delete", target, "", None)
+                messages.success(request, "Nodo eliminado correctamente.")
+            else:
+                messages.warning(request, "No se puede eliminar el nodo raíz.")
         else:
             messages.error(request, "Acción no reconocida.")
-            return self.render_arbol(request, codigo, accidente, tree, partial=True)
-
-        # Guardar cambios en BD:
-        # - JSON 5Q normal (sin estado visual)
-        # - DOT NEUTRO (sin puntero)
-        arbol_model.arbol_json_5q = tree.export_to_5q_json()
-        base = reverse('accidentes:ia_arbol', args=[codigo])
-        arbol_model.arbol_json_dot = self._dot_neutro_para_bd(tree, base_path=base)
-        arbol_model.save()
-
-        return self.render_arbol(request, codigo, accidente, tree, partial=True)
+            return False
+
+        # Guardar cambios en BD: solo la operación (journal). El snapshot
+        # JSON 5Q + DOT NEUTRO se reescribe al compactar.
+        if operacion:
+            op, target, label, target_id = operacion
+            registrar_operacion(
+                arbol_model, op, target,
+                label=label, target_id=target_id,
+                usuario=request.user, codigo=codigo, tree=tree,
+            )
+        return True
 
     # ----------------- renderizador común -----------------
-    def render_arbol(self, request, codigo: str, accidente: Accidentes, tree: CausalTree | None, partial: bool):
+    def render_arbol(self, request, codigo: str, accidente: Accidentes, tree: CausalTree | None, partial: bool,
+                     arbol_model: ArbolCausas | None = None):
         """
         Si 'partial' es True (o HTMX), renderiza el fragmento.
         Si no, renderiza la página completa.
         """
-        arbol_model = self.get_arbol_model(accidente)
+        if arbol_model is None:
+            arbol_model = self.get_arbol_model(accidente)
 
         # --- requisitos para generar ---
         tiene_hechos = Hechos.objects.filter(accidente=accidente).exists()
@@ -265,21 +365,29 @@ class ArbolIAView(LoginRequiredMixin, AccidenteScopedByCodigoMixin, View):
                 "show_boton_generar_inicial": True,
                 "show_boton_regenerar": False,
                 "puede_generar": puede_generar,
+                "stream_url": reverse("accidentes:generar_arbol_stream", args=[codigo]) if GENERACION_STREAM else None,
                 "faltan_hechos": not tiene_hechos,
                 "faltan_relato": not tiene_relato,
                 "child_targets": [],
+                **trabajos_ia.contexto(accidente, "arbol"),
             }
             tpl = self.partial_template if partial or (request.headers.get("HX-Request") == "true") else self.template_name
             return render(request, tpl, context)
 
         # ---- SÍ hay árbol ----
-        try:
-            dot_source = tree.generate_dot(base_path=base_path)  # con current resaltado SOLO UI
-            svg = Source(dot_source).pipe(format="svg").decode("utf-8")
-            svg = svg.replace('<?xml version="1.0" encoding="UTF-8" standalone="no"?>', "")
-        except ExecutableNotFound:
-            svg = None
-            dot_source = tree.generate_dot(base_path=base_path)
+        # Dibujo en cliente: el partial no lleva SVG, el JS pide el layout (o su delta)
+        layout_url = reverse("accidentes:ia_arbol_layout", args=[codigo]) if DIBUJO_CLIENTE else None
+
+        # SVG NEUTRO (layout nativo o Graphviz+caché según ARBOL_RENDER_ENGINE);
+        # el nodo actual se resalta sobre el SVG, sin volver a hacer layout.
+        visible = self.get_arbol_visible(request, arbol_model, tree)
+        svg = None
+        if not layout_url:
+            try:
+                svg = highlight_node(svg_arbol(visible, base_path), visible.current)
+            except RenderError as e:
+                logger.warning("Render árbol %s: %s", codigo, e)
+                messages.warning(request, "No fue posible dibujar el árbol en este momento. Intenta nuevamente.")
 
         # Construir opciones de ramas hijas del nodo actual (para insertar "entre medio")
         child_targets: list[dict[str, str]] = []
@@ -290,23 +398,312 @@ class ArbolIAView(LoginRequiredMixin, AccidenteScopedByCodigoMixin, View):
 
         context = {
             "svg": svg,
+            "layout_url": layout_url,
             "current_id": tree.current,
-            "dot_source": dot_source,
             "breadcrumbs": tree.get_breadcrumbs(),
             "current_label": tree.get_current_label(),
             "codigo": codigo,
             "puede_generar": puede_generar,
+            "stream_url": reverse("accidentes:generar_arbol_stream", args=[codigo]) if GENERACION_STREAM else None,
             "show_boton_generar_inicial": False,
             "show_boton_regenerar": puede_generar,
             "modo_edicion": True,
             "child_targets": child_targets,  # <- ahora sí definido antes
+            "version": arbol_model.version,
+            "vista_parcial": visible is not tree,
+            "nodos_visibles": len(visible.nodes),
+            "nodos_total": len(tree.nodes),
+            "rama_colapsada": tree.current in self._get_colapsados(request, arbol_model),
+            **trabajos_ia.contexto(accidente, "arbol"),
         }
 
         tpl = self.partial_template if partial or (request.headers.get("HX-Request") == "true") else self.template_name
         return render(request, tpl, context)
 
 
-class GenerarArbolIACreateView(LoginRequiredMixin, AccidenteScopedByCodigoMixin, View):
+class ArbolLayoutView(ArbolIAView):
+    """
+    Árbol como layout JSON para el dibujo en cliente (static accidentes/js/arbol_layout.js).
+
+    GET  ?rev=<rev>           -> layout completo o delta respecto de 'rev'
+    GET  ?action=navigate_to  -> además mueve el cursor (sesión)
+    POST action=...&rev=...   -> mismas acciones que ArbolIAView; responde solo el delta,
+                                 el nuevo cursor y los datos del formulario.
+    """
+
+    def _respuesta(self, request, tree: CausalTree | None, base_rev: str | None, status: int = 200,
+                   arbol_model: ArbolCausas | None = None):
+        if tree is None:
+            return JsonResponse({"tree": False}, status=404)
+        # Layout solo de la ventana visible: el costo no depende del total de nodos
+        visible = self.get_arbol_visible(request, arbol_model, tree) if arbol_model else tree
+        data = layout_payload(visible, base_rev=base_rev or None)
+        data.update({
+            "tree": True,
+            "current_label": tree.get_current_label(),
+            "breadcrumbs": tree.get_breadcrumbs(),
+            "child_targets": tree.suggest_child_targets(),
+            "messages": [
+                {"level": m.level_tag, "text": str(m)} for m in messages.get_messages(request)
+            ],
+        })
+        return JsonResponse(data, status=status)
+
+    def _cargar(self, accidente: Accidentes):
+        arbol_model = self.get_arbol_model(accidente)
+        if not arbol_model:
+            return None, None
+        try:
+            return arbol_model, cargar_arbol(arbol_model)
+        except (ValueError, json.JSONDecodeError):
+            return arbol_model, None
+
+    def get(self, request, codigo: str):
+        accidente = self.accidente or self.accidente_from(codigo)
+        arbol_model, tree = self._cargar(accidente)
+        if tree is None:
+            return self._respuesta(request, None, None)
+
+        node_id = request.GET.get("node_id")
+        if request.GET.get("action") == "navigate_to" and node_id:
+            tree.set_current(node_id)
+            self._set_cursor(request, arbol_model, tree.current)
+        else:
+            tree.set_current(self._get_cursor(request, arbol_model))
+        return self._respuesta(request, tree, request.GET.get("rev"), arbol_model=arbol_model)
+
+    def post(self, request, codigo: str):
+        accidente = self.accidente_from(codigo)
+        arbol_model, tree = self._cargar(accidente)
+        if tree is None:
+            return self._respuesta(request, None, None)
+
+        action = (request.POST.get("action") or "").strip()
+        node_id = (request.POST.get("node_id") or "").strip()
+        new_label = (request.POST.get("new_label") or "").strip()
+
+        tree.set_current(node_id or self._get_cursor(request, arbol_model))
+        if not self.aplicar_accion(request, codigo, arbol_model, tree, action, node_id, new_label):
+            return self._respuesta(request, tree, request.POST.get("rev"), status=400, arbol_model=arbol_model)
+        self._set_cursor(request, arbol_model, tree.current)
+        return self._respuesta(request, tree, request.POST.get("rev"), arbol_model=arbol_model)
+
+
+class ArbolLoteView(ArbolIAView):
+    """
+    Aplica un lote de operaciones (estilo JSON-patch) de forma atómica.
+
+    POST JSON:
+      {"operations": [
+          {"op": "add_child",      "node_id": "1.0.0.0.0.0.0.0.0", "label": "..."},
+          {"op": "edit_label",     "node_id": "$0", "label": "..."},
+          {"op": "insert_between", "node_id": "...", "target_id": "...", "label": "..."},
+          {"op": "add_sibling" | "delete", ...}
+      ]}
+
+    "$<i>" referencia al nodo que resultó de la operación i del mismo lote
+    (el hijo/hermano/interpuesto creado o el nodo editado).
+
+    Todas se aplican sobre UNA instancia de CausalTree; si alguna falla no se
+    guarda nada (400 con el resultado por operación). Si todas resultan, se
+    registran en el journal en una sola transacción y se dibuja una sola vez.
+    """
+
+    def _resolver(self, ref, tree: CausalTree, uids: list) -> str | None:
+        # "$i" guarda el id estable del nodo: su clave 5Q se obtiene recién ahora,
+        # porque un insert_between posterior pudo mover su rama
+        if isinstance(ref, str) and ref.startswith("$"):
+            try:
+                node_id = tree.get_node_id(uids[int(ref[1:])])
+            except (ValueError, IndexError, TypeError):
+                node_id = None
+            if node_id is None:
+                raise ValueError(f"Referencia inválida: {ref}")
+            return node_id
+        if ref and not isinstance(ref, str):
+            raise ValueError(f"Referencia inválida: {ref}")
+        return ref or None
+
+    def _aplicar_lote(self, tree: CausalTree, operaciones: list) -> tuple[bool, list[dict], list[tuple]]:
+        resultados: list[dict] = []
+        uids: list = []  # id estable del nodo resultante de cada operación
+        journal: list[tuple] = []
+        for i, item in enumerate(operaciones):
+            res = {"index": i, "op": item.get("op") if isinstance(item, dict) else None, "ok": False}
+            resultados.append(res)
+            try:
+                if not isinstance(item, dict):
+                    raise ValueError("Cada operación debe ser un objeto")
+                op = item.get("op")
+                node_id = self._resolver(item.get("node_id"), tree, uids)
+                target_id = self._resolver(item.get("target_id"), tree, uids)
+                label = item.get("label") or ""
+                if not isinstance(label, str):
+                    raise ValueError("label debe ser texto")
+                label = label.strip()
+                if not node_id:
+                    raise ValueError("Falta node_id")
+
+                uid = tree.get_uid(node_id)
+                if not tree.apply_operation(op, node_id, label, target_id):
+                    raise ValueError("La operación no tuvo efecto")
+            except ValueError as e:
+                res["error"] = str(e)
+                return False, resultados, []
+
+            # nodo resultante (para referencias "$i" y para el cliente)
+            if op == "add_child":
+                hijos = tree.nodes[tree.get_node_id(uid)]["children"]
+                uids.append(tree.get_uid(hijos[-1]) if hijos else None)
+            elif op == "edit_label":
+                uids.append(uid)
+            else:  # delete deja al padre como actual; add_sibling / insert_between, al nodo creado
+                uids.append(tree.get_uid(tree.current))
+            res["ok"] = True
+            journal.append((op, node_id, label, target_id))
+
+        # claves 5Q finales (las del momento de cada operación pudieron cambiar)
+        for res, uid in zip(resultados, uids):
+            res["node_id"] = tree.get_node_id(uid) if uid is not None else None
+        return True, resultados, journal
+
+    def post(self, request, codigo: str):
+        accidente = self.accidente_from(codigo)
+        try:
+            body = json.loads(request.body or b"{}")
+        except (ValueError, UnicodeDecodeError):
+            return JsonResponse({"ok": False, "error": "JSON inválido."}, status=400)
+        operaciones = body.get("operations") if isinstance(body, dict) else None
+        if not isinstance(operaciones, list) or not operaciones:
+            return JsonResponse({"ok": False, "error": "Se espera una lista 'operations' no vacía."}, status=400)
+        if len(operaciones) > LOTE_MAX_OPERACIONES:
+            return JsonResponse(
+                {"ok": False, "error": f"Máximo {LOTE_MAX_OPERACIONES} operaciones por lote."}, status=400
+            )
+
+        arbol_model = self.get_arbol_model(accidente)
+        if not arbol_model:
+            return JsonResponse({"ok": False, "error": "No hay árbol para este caso."}, status=404)
+        try:
+            tree = cargar_arbol(arbol_model)
+        except (ValueError, json.JSONDecodeError):
+            return JsonResponse({"ok": False, "error": "El árbol guardado está dañado."}, status=409)
+
+        ok, resultados, journal = self._aplicar_lote(tree, operaciones)
+        if not ok:
+            # Nada se persistió: el árbol en memoria se descarta completo
+            return JsonResponse({"ok": False, "results": resultados}, status=400)
+
+        registrar_operaciones(arbol_model, journal, usuario=request.user, codigo=codigo, tree=tree)
+        self._set_cursor(request, arbol_model, tree.current)
+
+        data = {"ok": True, "results": resultados, "current": tree.current}
+        if body.get("render", True):
+            base_path = reverse("accidentes:ia_arbol", args=[codigo])
+            try:
+                visible = self.get_arbol_visible(request, arbol_model, tree)
+                data["svg"] = highlight_node(svg_arbol(visible, base_path), visible.current)
+            except RenderError as e:
+                logger.warning("Render árbol %s: %s", codigo, e)
+                data["svg"] = None
+        return JsonResponse(data)
+
+
+class ArbolDiffView(LoginRequiredMixin, AccidenteScopedByCodigoMixin, View):
+    """
+    Compara dos versiones del árbol del caso (?a=<versión>&b=<versión>).
+    Por defecto: la versión anterior contra la vigente.
+
+    Dibuja la versión B resaltando nodos agregados, con etiqueta cambiada y
+    movidos; los eliminados (solo existen en A) se listan aparte.
+    """
+    template_name = "accidentes/arbol_diff.html"
+
+    # (fill, stroke, stroke-width) por tipo de cambio
+    ESTILOS = {
+        "added": ("#e3f4e1", "#2e7d32", "2.5"),
+        "relabelled": ("#fff4d6", "#b7791f", "2.5"),
+        "moved": ("#e1ecfa", "#1f5fa8", "2.5"),
+    }
+
+    def _version(self, versiones: dict, valor: str | None, defecto: ArbolCausas | None) -> ArbolCausas | None:
+        if valor in (None, ""):
+            return defecto
+        try:
+            return versiones.get(int(valor))
+        except (TypeError, ValueError):
+            return None
+
+    def get(self, request, codigo: str):
+        accidente = self.accidente_from(codigo)
+        versiones = {a.version: a for a in ArbolCausas.objects.filter(accidente=accidente).order_by("version")}
+        vigente = next((a for a in versiones.values() if a.is_current), None)
+        if vigente is None and versiones:
+            vigente = versiones[max(versiones)]
+        anterior = None
+        if vigente is not None:
+            previas = [v for v in versiones if v < vigente.version]
+            anterior = versiones[max(previas)] if previas else None
+
+        arbol_a = self._version(versiones, request.GET.get("a"), anterior)
+        arbol_b = self._version(versiones, request.GET.get("b"), vigente)
+
+        context = {
+            "codigo": codigo,
+            "versiones": sorted(versiones),
+            "arbol_a": arbol_a,
+            "arbol_b": arbol_b,
+            "svg": None,
+            "diff": None,
+            "resumen": None,
+        }
+        if not arbol_a or not arbol_b:
+            messages.info(request, "Se necesitan dos versiones del árbol para comparar.")
+            return render(request, self.template_name, context)
+
+        try:
+            json_a, json_b = json_5q_version(arbol_a), json_5q_version(arbol_b)
+            diff = diff_arboles(json_a, json_b)
+            tree_b = CausalTree(json_b)
+        except (ValueError, json.JSONDecodeError):
+            messages.error(request, "Una de las versiones guardadas está dañada.")
+            return render(request, self.template_name, context)
+
+        # Un nodo con etiqueta cambiada y movido se muestra como movido
+        estilos = {}
+        for tipo, clave in (("relabelled", "new_id"), ("moved", "new_id"), ("added", "id")):
+            for n in diff[tipo]:
+                estilos[n[clave]] = self.ESTILOS[tipo]
+        try:
+            base_path = reverse("accidentes:ia_arbol", args=[codigo])
+            context["svg"] = highlight_nodes(svg_arbol(tree_b, base_path), estilos)
+        except RenderError as e:
+            logger.warning("Render diff árbol %s: %s", codigo, e)
+            messages.warning(request, "No fue posible dibujar el árbol en este momento. Intenta nuevamente.")
+
+        context.update({"diff": diff, "resumen": resumen(diff)})
+        return render(request, self.template_name, context)
+
+
+class ArbolBuscarView(LoginRequiredMixin, View):
+    """
+    Busca nodos por etiqueta en los árboles vigentes de los casos que el usuario
+    puede abrir (índice invertido, sin abrir los JSON). GET ?q=
+    """
+    template_name = "accidentes/arbol_buscar.html"
+
+    def get(self, request):
+        consulta = (request.GET.get("q") or "").strip()
+        context = {"q": consulta, "resultados": [], "ms": None}
+        if consulta:
+            t0 = time.perf_counter()
+            context["resultados"] = buscar(consulta, accidentes=accidentes_accesibles(request.user))
+            context["ms"] = int((time.perf_counter() - t0) * 1000)
+            context["limite"] = len(context["resultados"]) >= INDICE_MAX_RESULTADOS
+        return render(request, self.template_name, context)
+
+
+class GenerarArbolIACreateView(AsyncIAViewMixin, LoginRequiredMixin, AccidenteScopedByCodigoMixin, View):
     """
     Recibe el POST del botón “Generar árbol…”.
     Devuelve SIEMPRE el partial (para swap dentro de #arbol-container).
@@ -315,19 +712,17 @@ class GenerarArbolIACreateView(LoginRequiredMixin, AccidenteScopedByCodigoMixin,
     """
     template_name = "accidentes/partials/arbol/_arbol_partial.html"
 
-    def post(self, request, codigo: str):
-        accidente = self.accidente_from(codigo)  # <- 404 si no existe o fuera de alcance
-
+    def _entrada(self, accidente: Accidentes) -> dict | None:
+        """Entrada para el prompt "arbol_causas" (None si faltan hechos o relato)."""
         hechos_qs = Hechos.objects.filter(accidente=accidente).order_by("secuencia", "hecho_id")
         relato_obj = Relato.objects.filter(
             accidente=accidente, is_current=True, relato_final__isnull=False
         ).first()
 
         if not hechos_qs.exists() or not relato_obj:
-            return HttpResponseBadRequest("Faltan hechos o relato válido para generar el árbol")
+            return None
 
-        # Entrada para el prompt "arbol_causas"
-        entrada = {
+        return {
             "relato": (relato_obj.relato_final or "").strip(),
             "hechos": [
                 (h.descripcion or "").strip()
@@ -336,77 +731,203 @@ class GenerarArbolIACreateView(LoginRequiredMixin, AccidenteScopedByCodigoMixin,
             ],
         }
 
-        try:
-            prompt_key = "arbol_causas"
-            prompt_id = _log_request(prompt_key, codigo, entrada)
+    @transaction.atomic
+    def _guardar(self, accidente: Accidentes, codigo: str, arbol_dict: dict) -> CausalTree:
+        """
+        Crea la nueva versión vigente a partir del JSON 5Q de la IA y archiva la
+        anterior. ValueError si el JSON no forma un árbol válido.
+        """
+        tree = CausalTree(json.dumps(arbol_dict, ensure_ascii=False))
 
-            # IA devuelve un JSON 5Q con claves del tipo "0.0.0.0.0.0.0.0.0"
-            arbol_dict = call_ia_json(json.dumps(entrada, ensure_ascii=False), prompt_key=prompt_key)
+        base = reverse("accidentes:ia_arbol", args=[codigo])
 
-            _log_response(prompt_id, prompt_key, codigo, arbol_dict)
+        # --- DOT NEUTRO para guardar en BD (sin puntero) ---
+        dot_bd = dot_neutro(tree, base_path=base)
 
-            if not isinstance(arbol_dict, dict) or "0.0.0.0.0.0.0.0.0" not in arbol_dict:
-                return HttpResponseBadRequest("La IA no devolvió un JSON 5Q válido para el árbol.")
+        # Versionado
+        ultima_version = (
+            ArbolCausas.objects.filter(accidente=accidente).aggregate(Max("version"))["version__max"] or 0
+        )
+        nueva_version = ultima_version + 1
 
-            arbol_json_5q = json.dumps(arbol_dict, ensure_ascii=False)
-            tree = CausalTree(arbol_json_5q)
+        ArbolCausas.objects.filter(accidente=accidente).update(is_current=False)
 
+        ArbolCausas.objects.create(
+            accidente=accidente,
+            version=nueva_version,
+            is_current=True,
+            arbol_json_5q=tree.export_to_5q_json(),
+            arbol_json_dot=dot_bd,   # <- guardamos SIN puntero
+        )
+        # La versión anterior pasa al historial comprimido
+        archivar_anteriores(accidente.pk)
+        return tree
+
+    def _responder(self, request, codigo: str, tree: CausalTree):
+        # SVG neutro + highlight SOLO UI (o dibujo en cliente)
+        layout_url = reverse("accidentes:ia_arbol_layout", args=[codigo]) if DIBUJO_CLIENTE else None
+        svg = None
+        if not layout_url:
             base = reverse("accidentes:ia_arbol", args=[codigo])
+            try:
+                visible = arbol_visible(tree)
+                svg = highlight_node(svg_arbol(visible, base), visible.current)
+            except RenderError as e:
+                # El árbol ya quedó guardado; solo falló el dibujo
+                logger.warning("Render árbol %s: %s", codigo, e)
+                messages.warning(request, "Árbol generado, pero no fue posible dibujarlo. Recarga la sección.")
+
+        # Opciones para insertar "entre medio" desde el inicio (raíz)
+        child_targets: list[dict[str, str]] = []
+        if tree and tree.current and tree.current in tree.nodes:
+            for cid in (tree.nodes[tree.current].get("children") or []):
+                if cid in tree.nodes:
+                    child_targets.append({"id": cid, "label": tree.nodes[cid].get("label", "")})
 
-            # --- DOT NEUTRO para guardar en BD (sin puntero) ---
-            _cur = tree.current
-            tree.current = None
-            dot_neutro = tree.generate_dot(base_path=base)
-            tree.current = _cur
-            # ---------------------------------------------------
+        context = {
+            "svg": svg,
+            "layout_url": layout_url,
+            "current_id": tree.current,
+            "current_label": tree.get_current_label(),
+            "codigo": codigo,
+            "modo_edicion": True,
+            "show_boton_generar_inicial": False,
+            "show_boton_regenerar": True,
+            "puede_generar": True,
+            "stream_url": reverse("accidentes:generar_arbol_stream", args=[codigo]) if GENERACION_STREAM else None,
+            "child_targets": child_targets,
+            "vista_parcial": len(tree.nodes) >= VENTANA_MIN_NODOS,
+        }
+        return render(request, self.template_name, context)
 
-            # Versionado
-            ultima_version = (
-                ArbolCausas.objects.filter(accidente=accidente).aggregate(Max("version"))["version__max"] or 0
-            )
-            nueva_version = ultima_version + 1
+    async def post(self, request, codigo: str):
+        accidente = self.accidente  # <- resuelto en dispatch (404 si fuera de alcance)
 
-            ArbolCausas.objects.filter(accidente=accidente).update(is_current=False)
+        entrada = await sync_to_async(self._entrada)(accidente)
+        if entrada is None:
+            return HttpResponseBadRequest("Faltan hechos o relato válido para generar el árbol")
+
+        # "Volver a generar": respuesta nueva, sin caché ni almacén de respuestas IA
+        regenerar = request.POST.get("regenerar") == "1"
 
-            ArbolCausas.objects.create(
-                accidente=accidente,
-                version=nueva_version,
-                is_current=True,
-                arbol_json_5q=tree.export_to_5q_json(),
-                arbol_json_dot=dot_neutro,   # <- guardamos SIN puntero
+        if trabajos_ia.EN_COLA:
+            # el aviso reemplaza el árbol hasta que termina; luego se recarga el partial
+            trabajo = await sync_to_async(trabajos_ia.encolar)(
+                "arbol", accidente, usuario=request.user, regenerar=regenerar,
+                volver={"path": reverse("accidentes:ia_arbol", args=[codigo]),
+                        "target": "#arbol-container", "swap": "innerHTML"},
             )
+            return await sync_to_async(render)(request, "accidentes/partials/_trabajo_ia.html", {
+                "trabajo_ia": trabajo, "trabajo_ia_poll_s": trabajos_ia.POLL_S,
+            })
 
-            # DOT con highlight SOLO para renderizar
-            try:
-                dot_runtime = tree.generate_dot(base_path=base)
-                svg = Source(dot_runtime).pipe(format="svg").decode("utf-8")
-                svg = svg.replace('<?xml version="1.0" encoding="UTF-8" standalone="no"?>', "")
-            except ExecutableNotFound:
-                svg = None
-
-            # Opciones para insertar "entre medio" desde el inicio (raíz)
-            child_targets: list[dict[str, str]] = []
-            if tree and tree.current and tree.current in tree.nodes:
-                for cid in (tree.nodes[tree.current].get("children") or []):
-                    if cid in tree.nodes:
-                        child_targets.append({"id": cid, "label": tree.nodes[cid].get("label", "")})
+        prompt_key = "arbol_causas"
+        prompt_id = _log_request(prompt_key, codigo, entrada)
+        try:
+            # IA devuelve un JSON 5Q con claves del tipo "0.0.0.0.0.0.0.0.0"
+            arbol_dict = await acall_ia_json(
+                json.dumps(entrada, ensure_ascii=False), prompt_key=prompt_key, regenerar=regenerar
+            )
 
-            context = {
-                "svg": svg,
-                "current_id": tree.current,
-                "current_label": tree.get_current_label(),
-                "codigo": codigo,
-                "modo_edicion": True,
-                "show_boton_generar_inicial": False,
-                "show_boton_regenerar": True,
-                "puede_generar": True,
-                "child_targets": child_targets,
-            }
-            return render(request, self.template_name, context)
+            _log_response(prompt_id, prompt_key, codigo, arbol_dict)
+
+            if not isinstance(arbol_dict, dict) or "0.0.0.0.0.0.0.0.0" not in arbol_dict:
+                return HttpResponseBadRequest("La IA no devolvió un JSON 5Q válido para el árbol.")
+
+            tree = await sync_to_async(self._guardar)(accidente, codigo, arbol_dict)
+            return await sync_to_async(self._responder)(request, codigo, tree)
 
         except Exception as e:
-            try:
-                _log_error(prompt_id, prompt_key, codigo, e)  # type: ignore[name-defined]
-            except Exception:
-                pass
+            _log_error(prompt_id, prompt_key, codigo, e)
             return HttpResponseBadRequest(f"No fue posible generar el árbol: {e}")
+
+
+class GenerarArbolIAStreamView(EventStreamMixin, GenerarArbolIACreateView):
+    """
+    Generación del árbol con la respuesta de la IA en streaming (text/event-stream).
+
+    El navegador hace POST (fetch) y lee los eventos:
+      event: parcial -> {"svg": ..., "nodos": n}   árbol parcial (solo ramas completas)
+      event: fin     -> {"ok": true, "nodos": n}   versión guardada; recargar el partial
+      event: error   -> {"message": ...}           nada se guardó
+
+    La fila ArbolCausas se crea solo si el stream termina y el JSON completo es válido.
+    Bajo ASGI el stream es un generador async: la conexión abierta no ocupa un hilo.
+    """
+
+    @staticmethod
+    def _svg_parcial(parcial: dict) -> str:
+        # Layout nativo directo: los parciales no pasan por Graphviz ni por la caché de SVG
+        return render_svg_nativo(CausalTree(json.dumps(parcial, ensure_ascii=False)), None)
+
+    async def _eventos(self, accidente: Accidentes, codigo: str, entrada: dict, regenerar: bool = False):
+        prompt_key = "arbol_causas"
+        prompt_id = _log_request(prompt_key, codigo, entrada)
+        parser = Parser5Q()
+        dibujados = 0
+        ultimo = 0.0
+        try:
+            async for fragmento in astream_ia_text(
+                json.dumps(entrada, ensure_ascii=False), prompt_key=prompt_key, regenerar=regenerar
+            ):
+                if not parser.feed(fragmento):
+                    continue
+                ahora = time.monotonic()
+                if ahora - ultimo < STREAM_INTERVALO:
+                    continue
+                parcial = parser.parcial()
+                if len(parcial) <= dibujados:
+                    continue
+                svg = await sync_to_async(self._svg_parcial)(parcial)
+                dibujados, ultimo = len(parcial), ahora
+                yield self._evento("parcial", {"svg": svg, "nodos": dibujados})
+
+            arbol_dict = parser.resultado()
+            _log_response(prompt_id, prompt_key, codigo, arbol_dict)
+            if not isinstance(arbol_dict, dict) or CausalTree.ROOT_KEY not in arbol_dict:
+                yield self._evento("error", {"message": "La IA no devolvió un JSON 5Q válido para el árbol."})
+                return
+            tree = await sync_to_async(self._guardar)(accidente, codigo, arbol_dict)
+            yield self._evento("fin", {"ok": True, "nodos": len(tree.nodes)})
+        except Exception as e:
+            _log_error(prompt_id, prompt_key, codigo, e)
+            yield self._evento("error", {"message": f"No fue posible generar el árbol: {e}"})
+
+    async def post(self, request, codigo: str):
+        accidente = self.accidente  # <- resuelto en dispatch (404 si fuera de alcance)
+        entrada = await sync_to_async(self._entrada)(accidente)
+        if entrada is None:
+            return HttpResponseBadRequest("Faltan hechos o relato válido para generar el árbol")
+
+        return self._event_stream(
+            self._eventos(accidente, codigo, entrada, request.POST.get("regenerar") == "1")
+        )
+
+
+def ejecutar_trabajo(trabajo) -> dict:
+    """Generación del árbol en cola (worker_ia); la versión se crea solo si el JSON 5Q es válido."""
+    vista = GenerarArbolIACreateView()
+    accidente = trabajo.accidente
+    codigo = accidente.codigo_accidente
+    entrada = vista._entrada(accidente)
+    if entrada is None:
+        raise ValueError("Faltan hechos o relato válido para generar el árbol")
+
+    prompt_key = "arbol_causas"
+    prompt_id = _log_request(prompt_key, codigo, entrada)
+    trabajos_ia.avanzar(trabajo, 10, "Generando árbol de causas…")
+    try:
+        arbol_dict = call_ia_json(
+            json.dumps(entrada, ensure_ascii=False), prompt_key=prompt_key,
+            regenerar=bool(trabajo.parametros.get("regenerar")),
+        )
+    except Exception as e:
+        _log_error(prompt_id, prompt_key, codigo, e)
+        raise RuntimeError(f"No fue posible generar el árbol: {e}") from e
+    _log_response(prompt_id, prompt_key, codigo, arbol_dict)
+    if not isinstance(arbol_dict, dict) or CausalTree.ROOT_KEY not in arbol_dict:
+        raise ValueError("La IA no devolvió un JSON 5Q válido para el árbol.")
+
+    trabajos_ia.avanzar(trabajo, 80, "Guardando el árbol…")
+    tree = vista._guardar(accidente, codigo, arbol_dict)
+    return {"mensaje": "Árbol de causas generado.", "nodos": len(tree.nodes)}
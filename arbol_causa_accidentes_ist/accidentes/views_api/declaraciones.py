@@ -4,10 +4,13 @@ import json
 import uuid
 from uuid import uuid4
 
+from asgiref.sync import sync_to_async
 from django.http import Http404, HttpResponseNotAllowed, HttpResponse
 from django.shortcuts import render
+from django.urls import reverse
 from django.views import View
 from django.contrib import messages
+from django.db import transaction
 from django.db.models import Q
 from django.contrib.auth.mixins import LoginRequiredMixin
 import logging
@@ -16,17 +19,18 @@ from django.template.loader import render_to_string
 
 logger = logging.getLogger(__name__)
 
-from .prompt_utils import call_ia_json
+from .prompt_utils import acall_ia_json, call_ia_json
+from accidentes.utils import trabajos_ia
 from accidentes.models import (
     Accidentes,
     Declaraciones,   # si no lo usas, puedes eliminar este import
     PreguntasGuia,
     Documentos,
 )
-from accidentes.utils.mixins import AnchorRedirectMixin, AccidenteScopedByCodigoMixin
+from accidentes.utils.mixins import AnchorRedirectMixin, AccidenteScopedByCodigoMixin, AsyncIAViewMixin
 
 
-class DeclaracionesIAView(LoginRequiredMixin, AnchorRedirectMixin, AccidenteScopedByCodigoMixin, View):
+class DeclaracionesIAView(AsyncIAViewMixin, LoginRequiredMixin, AnchorRedirectMixin, AccidenteScopedByCodigoMixin, View):
     """
     Vista única GET/POST, con scoping robusto:
     - El accidente se resuelve vía AccidenteScopedByCodigoMixin (self.accidente),
@@ -85,6 +89,7 @@ class DeclaracionesIAView(LoginRequiredMixin, AnchorRedirectMixin, AccidenteScop
             "count_supervision": count_supervision,
             "has_generated": has_generated,
             "codigo": codigo,
+            **trabajos_ia.contexto(accidente, "explora"),
         }
     def _render_notifications(self, request) -> str:
         """Devuelve el HTML del área de notificaciones con soporte OOB."""
@@ -97,14 +102,160 @@ class DeclaracionesIAView(LoginRequiredMixin, AnchorRedirectMixin, AccidenteScop
         """
         notif = self._render_notifications(request)
         return HttpResponse((html or "") + notif)
+    # ----------------- IA: generar preguntas y documentos -----------------
+    def _payload_generate(self, accidente) -> dict:
+        trabajador = getattr(accidente, "trabajador", None)
+        nombre_trabajador = getattr(trabajador, "nombre_trabajador", "") if trabajador else ""
+
+        centro = getattr(accidente, "centro", None)
+        empresa = getattr(centro, "empresa", None) if centro else None
+        # Fallback por si no hay centro->empresa, intenta con trabajador->empresa
+        if not empresa and trabajador:
+            empresa = getattr(trabajador, "empresa", None)
+
+        # ✅ Actividad económica (empresa.actividad)
+        actividad = getattr(empresa, "actividad", "") if empresa else ""
+
+        # ✅ Centro de trabajo (centro.nombre_local)
+        nombre_local = getattr(centro, "nombre_local", "") if centro else ""
+
+        preinitial_data = {
+            "datos_generales": {
+                "nombre_accidentado": self._as_str(nombre_trabajador),
+                "fecha": self._as_str(getattr(accidente, "fecha_accidente", "")),
+                "hora": self._as_str(getattr(accidente, "hora_accidente", "")),
+                "actividad": self._as_str(actividad),
+                "local": self._as_str(nombre_local),
+                "lugar_accidente": self._as_str(getattr(accidente, "lugar_accidente", "")),
+                "lesion": self._as_str(getattr(accidente, "naturaleza_lesion", "")),
+            },
+            "operaciones": {
+                "nombre proceso": self._as_str(getattr(accidente, "tarea", "")),
+                "tarea u operación": self._as_str(getattr(accidente, "operacion", "")),
+            },
+            "contexto": {
+                "proceso habitual": self._as_str(getattr(accidente, "contexto", "")),
+                "circunstancias del accidente": self._as_str(getattr(accidente, "circunstancias", "")),
+            },
+        }
+        return {"preinitial_data": preinitial_data}
+
+    @transaction.atomic
+    def _guardar_generate(self, accidente, raw) -> None:
+        # --------- tu lógica original: reset y creación ----------
+        PreguntasGuia.objects.filter(accidente=accidente).delete()
+        Documentos.objects.filter(accidente=accidente).delete()
+
+        if isinstance(raw, dict):
+            for rol, items in raw.items():
+                if rol == "documentos":
+                    continue
+                if not isinstance(items, (list, tuple)):
+                    continue
+                for item in items:
+                    PreguntasGuia.objects.create(
+                        accidente=accidente,
+                        uuid=str(item.get("id")) or str(uuid4()),
+                        categoria=rol,
+                        pregunta=item.get("pregunta", "") or "",
+                        objetivo=item.get("objetivo", "") or "",
+                        respuesta=""
+                    )
+            documentos = raw.get("documentos", [])
+            if isinstance(documentos, list):
+                for doc in documentos:
+                    Documentos.objects.create(
+                        accidente=accidente,
+                        documento_id=doc.get("id") or str(uuid4()),
+                        documento=doc.get("documento", "") or "",
+                        objetivo=doc.get("objetivo", "") or ""
+                    )
+
+    def _responder_generate(self, request, codigo, anchor, is_htmx):
+        if is_htmx:
+            ctx = self._build_context(self.accidente, codigo)
+            html = render_to_string("accidentes/partials/entrevistas/_declaraciones_wrapper.html", ctx, request=request)
+            return self._http_response_with_notif(request, html)
+
+        return self._build_redirect(request, "accidentes:ia_declaraciones", args=[codigo], anchor=anchor)
+
+    async def _generate(self, request, codigo):
+        accidente = self.accidente  # ya scoped
+        anchor = (request.POST.get("anchor") or "").strip()
+        is_htmx = bool(getattr(request, "htmx", False) or request.headers.get("HX-Request") == "true")
+
+        if trabajos_ia.EN_COLA:
+            # el payload se arma en el worker con los datos vigentes del caso
+            await sync_to_async(trabajos_ia.encolar)(
+                "explora", accidente, usuario=request.user,
+                volver={"path": reverse("accidentes:ia_declaraciones", args=[codigo]),
+                        "target": "#declaraciones-wrapper", "swap": "outerHTML"},
+            )
+            return await sync_to_async(self._responder_generate)(request, codigo, anchor, is_htmx)
+
+        payload = await sync_to_async(self._payload_generate)(accidente)
+
+        # ---- LOGGING SIMPLE A CONSOLA ----
+        prompt_key = "explora"
+        prompt_id = uuid4().hex  # id único para correlacionar request/response en consola
+
+        try:
+            # imprime el id del prompt, el prompt_key y el payload
+            logger.info(
+                "[IA][request] prompt_id=%s prompt_key=%s codigo=%s payload=%s",
+                prompt_id, prompt_key, codigo, json.dumps(payload, ensure_ascii=False, indent=2)
+            )
+
+            raw = await acall_ia_json(
+                json.dumps(payload, ensure_ascii=False, indent=2),
+                prompt_key=prompt_key,
+            )
+
+            # imprime la respuesta (dict o str)
+            try:
+                response_str = raw if isinstance(raw, str) else json.dumps(raw, ensure_ascii=False, indent=2)
+            except Exception:
+                response_str = f"<<no-serializable: {type(raw)}>>"
+
+            logger.info(
+                "[IA][response] prompt_id=%s prompt_key=%s codigo=%s response=%s",
+                prompt_id, prompt_key, codigo, response_str
+            )
+
+            await sync_to_async(self._guardar_generate)(accidente, raw)
+            messages.success(request, "Preguntas y documentos generados correctamente.")
+
+        except Exception as e:
+            # imprime el error asociado al mismo prompt_id
+            logger.exception(
+                "[IA][error] prompt_id=%s prompt_key=%s codigo=%s error=%s",
+                prompt_id, prompt_key, codigo, str(e)
+            )
+            messages.error(request, f"Error IA: {e}")
+
+        return await sync_to_async(self._responder_generate)(request, codigo, anchor, is_htmx)
+
     # ----------------- GET -----------------
-    def get(self, request, codigo):
+    async def get(self, request, codigo):
         # Accidente ya viene resuelto en dispatch() del mixin → self.accidente
+        return await sync_to_async(self._get)(request, codigo)
+
+    def _get(self, request, codigo):
         ctx = self._build_context(self.accidente, codigo)
+        if request.headers.get("HX-Request") == "true":
+            # recarga de la sección (p.ej. al terminar la generación en cola)
+            html = render_to_string("accidentes/partials/entrevistas/_declaraciones_wrapper.html", ctx, request=request)
+            return self._http_response_with_notif(request, html)
         return render(request, self.template_name, ctx)
 
     # ----------------- POST -----------------
-    def post(self, request, codigo):
+    async def post(self, request, codigo):
+        # 1) Generar preguntas y documentos con IA (async, sin ocupar hilo)
+        if (request.POST.get("action") or "").strip() == "generate":
+            return await self._generate(request, codigo)
+        return await sync_to_async(self._post_bd)(request, codigo)
+
+    def _post_bd(self, request, codigo):
         accidente = self.accidente  # ya scoped
         action = (request.POST.get("action") or "").strip()
         anchor = (request.POST.get("anchor") or "").strip()
@@ -118,118 +269,6 @@ class DeclaracionesIAView(LoginRequiredMixin, AnchorRedirectMixin, AccidenteScop
                 return None
             return PreguntasGuia.objects.filter(accidente=accidente, pk=pk).first()
 
-        # 1) Generar preguntas y documentos con IA
-        if action == "generate":
-            trabajador = getattr(accidente, "trabajador", None)
-            nombre_trabajador = getattr(trabajador, "nombre_trabajador", "") if trabajador else ""
-
-            centro = getattr(accidente, "centro", None)
-            empresa = getattr(centro, "empresa", None) if centro else None
-            # Fallback por si no hay centro->empresa, intenta con trabajador->empresa
-            if not empresa and trabajador:
-                empresa = getattr(trabajador, "empresa", None)
-
-            # ✅ Actividad económica (empresa.actividad)
-            actividad = getattr(empresa, "actividad", "") if empresa else ""
-
-            # ✅ Centro de trabajo (centro.nombre_local)
-            nombre_local = getattr(centro, "nombre_local", "") if centro else ""
-
-            preinitial_data = {
-                "datos_generales": {
-                    "nombre_accidentado": self._as_str(nombre_trabajador),
-                    "fecha": self._as_str(getattr(accidente, "fecha_accidente", "")),
-                    "hora": self._as_str(getattr(accidente, "hora_accidente", "")),
-                    "actividad": self._as_str(actividad),
-                    "local": self._as_str(nombre_local),
-                    "lugar_accidente": self._as_str(getattr(accidente, "lugar_accidente", "")),
-                    "lesion": self._as_str(getattr(accidente, "naturaleza_lesion", "")),
-                },
-                "operaciones": {
-                    "nombre proceso": self._as_str(getattr(accidente, "tarea", "")),
-                    "tarea u operación": self._as_str(getattr(accidente, "operacion", "")),
-                },
-                "contexto": {
-                    "proceso habitual": self._as_str(getattr(accidente, "contexto", "")),
-                    "circunstancias del accidente": self._as_str(getattr(accidente, "circunstancias", "")),
-                },
-            }
-
-            payload = {"preinitial_data": preinitial_data}
-
-            # ---- LOGGING SIMPLE A CONSOLA ----
-            prompt_key = "explora"
-            prompt_id = uuid4().hex  # id único para correlacionar request/response en consola
-
-            try:
-                # imprime el id del prompt, el prompt_key y el payload
-                logger.info(
-                    "[IA][request] prompt_id=%s prompt_key=%s codigo=%s payload=%s",
-                    prompt_id, prompt_key, codigo, json.dumps(payload, ensure_ascii=False, indent=2)
-                )
-
-                raw = call_ia_json(
-                    json.dumps(payload, ensure_ascii=False, indent=2),
-                    prompt_key=prompt_key,
-                )
-
-                # imprime la respuesta (dict o str)
-                try:
-                    response_str = raw if isinstance(raw, str) else json.dumps(raw, ensure_ascii=False, indent=2)
-                except Exception:
-                    response_str = f"<<no-serializable: {type(raw)}>>"
-
-                logger.info(
-                    "[IA][response] prompt_id=%s prompt_key=%s codigo=%s response=%s",
-                    prompt_id, prompt_key, codigo, response_str
-                )
-
-                # --------- tu lógica original: reset y creación ----------
-                PreguntasGuia.objects.filter(accidente=accidente).delete()
-                Documentos.objects.filter(accidente=accidente).delete()
-
-                if isinstance(raw, dict):
-                    for rol, items in raw.items():
-                        if rol == "documentos":
-                            continue
-                        if not isinstance(items, (list, tuple)):
-                            continue
-                        for item in items:
-                            PreguntasGuia.objects.create(
-                                accidente=accidente,
-                                uuid=str(item.get("id")) or str(uuid4()),
-                                categoria=rol,
-                                pregunta=item.get("pregunta", "") or "",
-                                objetivo=item.get("objetivo", "") or "",
-                                respuesta=""
-                            )
-                    documentos = raw.get("documentos", [])
-                    if isinstance(documentos, list):
-                        for doc in documentos:
-                            Documentos.objects.create(
-                                accidente=accidente,
-                                documento_id=doc.get("id") or str(uuid4()),
-                                documento=doc.get("documento", "") or "",
-                                objetivo=doc.get("objetivo", "") or ""
-                            )
-
-                messages.success(request, "Preguntas y documentos generados correctamente.")
-
-            except Exception as e:
-                # imprime el error asociado al mismo prompt_id
-                logger.exception(
-                    "[IA][error] prompt_id=%s prompt_key=%s codigo=%s error=%s",
-                    prompt_id, prompt_key, codigo, str(e)
-                )
-                messages.error(request, f"Error IA: {e}")
-
-            if is_htmx:
-                ctx = self._build_context(accidente, codigo)
-                html = render_to_string("accidentes/partials/entrevistas/_declaraciones_wrapper.html", ctx, request=request)
-                return self._http_response_with_notif(request, html)
-
-            return self._build_redirect(request, "accidentes:ia_declaraciones", args=[codigo], anchor=anchor)
-
         # 2) Guardar respuesta (HTMX o normal)
         if action == "save_single":
             slot = get_slot_by_pk(request.POST.get("slot_pk"))
@@ -412,3 +451,32 @@ class DeclaracionesIAView(LoginRequiredMixin, AnchorRedirectMixin, AccidenteScop
             return self._build_redirect(request, "accidentes:ia_declaraciones", args=[codigo], anchor=anchor)
 
         return HttpResponseNotAllowed(["GET", "POST"])
+
+
+def ejecutar_trabajo(trabajo) -> dict:
+    """Preguntas guía y documentos ("explora") en cola (worker_ia)."""
+    vista = DeclaracionesIAView()
+    accidente = trabajo.accidente
+    payload = vista._payload_generate(accidente)
+    prompt_key = "explora"
+    prompt_id = uuid4().hex
+    logger.info(
+        "[IA][request] prompt_id=%s prompt_key=%s codigo=%s payload=%s",
+        prompt_id, prompt_key, accidente.codigo_accidente, json.dumps(payload, ensure_ascii=False)
+    )
+    trabajos_ia.avanzar(trabajo, 10, "Generando preguntas y documentos…")
+    try:
+        raw = call_ia_json(json.dumps(payload, ensure_ascii=False, indent=2), prompt_key=prompt_key)
+    except Exception as e:
+        logger.exception(
+            "[IA][error] prompt_id=%s prompt_key=%s codigo=%s error=%s",
+            prompt_id, prompt_key, accidente.codigo_accidente, str(e)
+        )
+        raise RuntimeError(f"Error IA: {e}") from e
+    logger.info(
+        "[IA][response] prompt_id=%s prompt_key=%s codigo=%s response=%s",
+        prompt_id, prompt_key, accidente.codigo_accidente, json.dumps(raw, ensure_ascii=False, default=str)
+    )
+    trabajos_ia.avanzar(trabajo, 90, "Guardando…")
+    vista._guardar_generate(accidente, raw)
+    return {"mensaje": "Preguntas y documentos generados correctamente."}
@@ -23,6 +23,7 @@ from django.template.loader import render_to_string  # NEW
 from accidentes.models import Accidentes, Informes
 from accidentes.utils.crear_informe_doc import InformeDocxBuilder
 from accidentes.utils.mixins import AccidenteScopedByCodigoMixin
+from accidentes.utils import trabajos_ia
 
 log = logging.getLogger(__name__)
 
@@ -142,6 +143,19 @@ class GenerarInformeIAView(LoginRequiredMixin, AccidenteScopedByCodigoMixin, Vie
             order = ["-pk"]
         return order
 
+    @staticmethod
+    def _descarga_url(codigo: str, inf) -> str:
+        return (
+            reverse("accidentes:generar_informe", args=[codigo])
+            + f"?download=1&codigo_informe={inf.codigo}&version={inf.version}"
+        )
+
+    def _descarga_pendiente(self, request, acc: Accidentes, codigo: str) -> Optional[str]:
+        """?descargar=<pk>: informe recién generado en cola con 'descargar al generar'."""
+        pk = request.GET.get("descargar") or ""
+        inf = Informes.objects.filter(accidente=acc, pk=int(pk)).first() if pk.isdigit() else None
+        return self._descarga_url(codigo, inf) if inf else None
+
     # ----------------- GET -----------------
     def get(self, request, codigo: str):
         # DESCARGA POR GET (usado por el flujo HTMX)
@@ -181,6 +195,8 @@ class GenerarInformeIAView(LoginRequiredMixin, AccidenteScopedByCodigoMixin, Vie
             "default_fecha": datetime.date.today(),
             "informes": list(informes_qs),
             "current_informe": current,  # usado por el template para “Descargar versión actual”
+            "descarga_url": self._descarga_pendiente(request, acc, codigo),
+            **trabajos_ia.contexto(acc, "informe"),
         }
         return render(request, self.template_name, ctx)
 
@@ -218,6 +234,15 @@ class GenerarInformeIAView(LoginRequiredMixin, AccidenteScopedByCodigoMixin, Vie
                 accidente=acc,
             )
 
+            if trabajos_ia.EN_COLA:
+                # el DOCX (con el resumen IA) lo arma worker_ia; la página espera el aviso
+                volver = None
+                if descargar_flag:
+                    volver = {"redirigir": reverse("accidentes:generar_informe", args=[codigo]) + f"?descargar={inf.pk}"}
+                trabajos_ia.encolar("informe", acc, usuario=request.user, volver=volver, informe_id=inf.pk)
+                messages.info(request, f"Generando informe {inf.codigo} v{inf.version}…")
+                return HttpResponseRedirect(reverse("accidentes:generar_informe", args=[codigo]))
+
             resumen = self._get_resumen_from_relato(acc.accidente_id)
             out_path = InformeDocxBuilder().build(accidente=acc, informe=inf, resumen_texto=resumen)
 
@@ -338,3 +363,28 @@ class GenerarInformeIAView(LoginRequiredMixin, AccidenteScopedByCodigoMixin, Vie
 
         messages.error(request, "Acción no reconocida.")
         return HttpResponseRedirect(reverse("accidentes:generar_informe", args=[codigo]))
+
+
+def ejecutar_trabajo(trabajo) -> dict:
+    """Armado del DOCX en cola (worker_ia). Si falla, la versión creada por la vista se descarta."""
+    acc = trabajo.accidente
+    inf = Informes.objects.filter(accidente=acc, pk=trabajo.parametros["informe_id"]).first()
+    if inf is None:
+        raise ValueError("El informe ya no existe.")
+
+    vista = GenerarInformeIAView()
+    trabajos_ia.avanzar(trabajo, 10, "Redactando el informe…")
+    try:
+        resumen = vista._get_resumen_from_relato(acc.accidente_id)
+        InformeDocxBuilder().build(accidente=acc, informe=inf, resumen_texto=resumen)
+    except Exception:
+        with transaction.atomic():
+            was_current = getattr(inf, "is_current", False)
+            inf.delete()
+            if was_current:
+                anterior = Informes.objects.filter(accidente=acc).order_by(*vista._order_fields(Informes)).first()
+                if anterior:
+                    anterior.is_current = True
+                    anterior.save(update_fields=["is_current"])
+        raise
+    return {"mensaje": f"Informe generado: {inf.codigo} v{inf.version}"}
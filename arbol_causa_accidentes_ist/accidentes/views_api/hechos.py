@@ -189,22 +189,31 @@ import json
 import logging
 from uuid import uuid4
 
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.db import transaction
 from django.db.models import Max
+from django.http import HttpResponseBadRequest
 from django.shortcuts import render
+from django.urls import reverse
 from django.contrib import messages
 from django.views import View
 from django.contrib.auth.mixins import LoginRequiredMixin
 
-from .prompt_utils import call_ia_text
+from .prompt_utils import acall_ia_text, astream_ia_text, call_ia_text
+from accidentes.utils import trabajos_ia
 from accidentes.models import Hechos, Relato, Accidentes
-from accidentes.utils.mixins import AnchorRedirectMixin, AccidenteScopedByCodigoMixin
+from accidentes.utils.mixins import (
+    AnchorRedirectMixin, AccidenteScopedByCodigoMixin, AsyncIAViewMixin, EventStreamMixin,
+)
 
 logger = logging.getLogger(__name__)
 
+# "Identificar hechos" en streaming desde el navegador
+TEXTO_STREAM = getattr(settings, "IA_TEXTO_STREAM", True)
 
-class HechosIAView(LoginRequiredMixin, AccidenteScopedByCodigoMixin, AnchorRedirectMixin, View):
+
+class HechosIAView(AsyncIAViewMixin, LoginRequiredMixin, AccidenteScopedByCodigoMixin, AnchorRedirectMixin, View):
     template_name = "accidentes/hechos.html"
     partial_name  = "accidentes/partials/hechos/_hechos_wrapper.html"
     anchor_id = "hechos-section"
@@ -273,6 +282,8 @@ class HechosIAView(LoginRequiredMixin, AccidenteScopedByCodigoMixin, AnchorRedir
             "hechos_generados": self.get_hechos_from_db(accidente),
             "codigo": codigo,
             "anchor": self.anchor_id,
+            "stream_url": reverse("accidentes:ia_hechos_stream", args=[codigo]) if TEXTO_STREAM else None,
+            **trabajos_ia.contexto(accidente, "hechos"),
         }
         return accidente, ctx
 
@@ -293,54 +304,85 @@ class HechosIAView(LoginRequiredMixin, AccidenteScopedByCodigoMixin, AnchorRedir
             print("    ", line)
         print("")
 
-    # ---------- Handlers ----------
-    def get(self, request, codigo: str):
-        return self._render(request, codigo)
+    # ---------- IA: identificar hechos desde relato confirmado ----------
+    def _relato_confirmado(self):
+        return Relato.objects.filter(
+            accidente=self.accidente,
+            is_current=True,
+            relato_final__isnull=False
+        ).first()
+
+    @staticmethod
+    def _parsear_hechos(raw: str) -> list[str]:
+        return [
+            re.sub(r'^\s*\d+\.\s*', '', line).strip()
+            for line in raw.splitlines() if line.strip()
+        ]
 
     @transaction.atomic
-    def post(self, request, codigo: str):
-        action = (request.POST.get("action") or "").strip()
-        accidente = self.accidente_from(codigo)  # ⬅️ 404 si no está en alcance
-        hechos_descripciones = self.get_hechos_from_db(accidente)
+    def _guardar_hechos(self, facts: list[str]):
+        Hechos.objects.filter(accidente=self.accidente).delete()
+        for i, desc in enumerate(facts, start=1):
+            Hechos.objects.create(accidente=self.accidente, secuencia=i, descripcion=desc)
+        self._debug_print("hechos_generados tras identify_hechos", facts)
+
+    async def _identificar_hechos(self, request, codigo: str):
+        relato = await sync_to_async(self._relato_confirmado)()
+        if not relato:
+            messages.warning(request, "Primero confirma el relato.")
+            return
+        if trabajos_ia.EN_COLA:
+            await sync_to_async(trabajos_ia.encolar)(
+                "hechos", self.accidente, usuario=request.user,
+                volver={"path": reverse("accidentes:ia_hechos", args=[codigo]),
+                        "target": "#hechos-wrapper", "swap": "innerHTML"},
+                relato_id=str(relato.pk),
+            )
+            return
 
-        # ---- IA: identificar hechos desde relato confirmado ----
-        if action == "identify_hechos":
-            relato = Relato.objects.filter(
-                accidente=accidente,
-                is_current=True,
-                relato_final__isnull=False
-            ).first()
+        prompt_key = "hechos"
+        payload = relato.relato_final
+        prompt_id = self._log_request(prompt_key, codigo, payload)
+        try:
+            raw = await acall_ia_text(payload, prompt_key=prompt_key)
 
-            if not relato:
-                messages.warning(request, "Primero confirma el relato.")
-            else:
-                try:
-                    prompt_key = "hechos"
-                    payload = relato.relato_final
-                    prompt_id = self._log_request(prompt_key, codigo, payload)
+            self._log_response(prompt_id, prompt_key, codigo, raw)
 
-                    raw = call_ia_text(payload, prompt_key=prompt_key)
+            facts = self._parsear_hechos(raw)
+            await sync_to_async(self._guardar_hechos)(facts)
+            messages.success(request, "Hechos identificados con IA.")
+        except Exception as e:
+            self._log_error(prompt_id, prompt_key, codigo, e)
+            messages.error(request, f"Error identificando hechos: {e}")
 
-                    self._log_response(prompt_id, prompt_key, codigo, raw)
+    def _responder(self, request, codigo: str):
+        # Responder según sea HTMX o navegación normal
+        if request.headers.get("HX-Request"):
+            return self._render(request, codigo)
 
-                    facts = [
-                        re.sub(r'^\s*\d+\.\s*', '', line).strip()
-                        for line in raw.splitlines() if line.strip()
-                    ]
-                    Hechos.objects.filter(accidente=accidente).delete()
-                    for i, desc in enumerate(facts, start=1):
-                        Hechos.objects.create(accidente=accidente, secuencia=i, descripcion=desc)
-                    self._debug_print("hechos_generados tras identify_hechos", facts)
-                    messages.success(request, "Hechos identificados con IA.")
-                except Exception as e:
-                    try:
-                        self._log_error(prompt_id, prompt_key, codigo, e)  # type: ignore[name-defined]
-                    except Exception:
-                        pass
-                    messages.error(request, f"Error identificando hechos: {e}")
+        return self._build_redirect(
+            request, "accidentes:ia_hechos", args=[codigo], anchor=self.anchor_id
+        )
+
+    # ---------- Handlers ----------
+    async def get(self, request, codigo: str):
+        return await sync_to_async(self._render)(request, codigo)
+
+    async def post(self, request, codigo: str):
+        action = (request.POST.get("action") or "").strip()
+        if action == "identify_hechos":
+            # sin transacción abierta mientras se espera a la IA
+            await self._identificar_hechos(request, codigo)
+            return await sync_to_async(self._responder)(request, codigo)
+        return await sync_to_async(self._post_bd)(request, codigo, action)
+
+    @transaction.atomic
+    def _post_bd(self, request, codigo: str, action: str):
+        """Acciones de edición (solo BD)."""
+        accidente = self.accidente
 
         # ---- Añadir un hecho vacío al final ----
-        elif action == "add_fact":
+        if action == "add_fact":
             next_seq = (Hechos.objects.filter(accidente=accidente)
                         .aggregate(Max("secuencia"))["secuencia__max"] or 0) + 1
             Hechos.objects.create(accidente=accidente, secuencia=next_seq, descripcion="")
@@ -413,10 +455,63 @@ class HechosIAView(LoginRequiredMixin, AccidenteScopedByCodigoMixin, AnchorRedir
         else:
             messages.error(request, "Acción no reconocida.")
 
-        # Responder según sea HTMX o navegación normal
-        if request.headers.get("HX-Request"):
-            return self._render(request, codigo)
+        return self._responder(request, codigo)
 
-        return self._build_redirect(
-            request, "accidentes:ia_hechos", args=[codigo], anchor=self.anchor_id
-        )
+
+class HechosIAStreamView(EventStreamMixin, HechosIAView):
+    """
+    Identificación de hechos con la respuesta en streaming (text/event-stream),
+    para accidentes/js/texto_stream.js:
+      event: parcial -> {"texto": fragmento}
+      event: fin     -> {"ok": true, "mensaje": ..., "hechos": n}   guardados; recargar el partial
+      event: error   -> {"message": ...}                           nada se guardó
+
+    Los Hechos se reemplazan solo cuando el stream termina.
+    """
+
+    async def _eventos(self, codigo: str, payload: str):
+        prompt_key = "hechos"
+        prompt_id = self._log_request(prompt_key, codigo, payload)
+        partes = []
+        try:
+            async for fragmento in astream_ia_text(payload, prompt_key=prompt_key):
+                partes.append(fragmento)
+                yield self._evento("parcial", {"texto": fragmento})
+            raw = "".join(partes)
+            self._log_response(prompt_id, prompt_key, codigo, raw)
+
+            facts = self._parsear_hechos(raw)
+            await sync_to_async(self._guardar_hechos)(facts)
+            yield self._evento("fin", {"ok": True, "mensaje": "Hechos identificados con IA.", "hechos": len(facts)})
+        except Exception as e:
+            self._log_error(prompt_id, prompt_key, codigo, e)
+            yield self._evento("error", {"message": f"Error identificando hechos: {e}"})
+
+    async def post(self, request, codigo: str):
+        relato = await sync_to_async(self._relato_confirmado)()
+        if not relato:
+            return HttpResponseBadRequest("Primero confirma el relato.")
+        return self._event_stream(self._eventos(codigo, relato.relato_final))
+
+
+def ejecutar_trabajo(trabajo) -> dict:
+    """Identificación de hechos en cola (worker_ia)."""
+    vista = HechosIAView()
+    vista.accidente = trabajo.accidente
+    relato = Relato.objects.filter(pk=trabajo.parametros["relato_id"], relato_final__isnull=False).first()
+    if relato is None:
+        raise ValueError("El relato confirmado ya no existe.")
+
+    prompt_key = "hechos"
+    codigo = trabajo.accidente.codigo_accidente
+    prompt_id = vista._log_request(prompt_key, codigo, relato.relato_final)
+    trabajos_ia.avanzar(trabajo, 10, "Identificando hechos…")
+    try:
+        raw = call_ia_text(relato.relato_final, prompt_key=prompt_key)
+    except Exception as e:
+        vista._log_error(prompt_id, prompt_key, codigo, e)
+        raise RuntimeError(f"Error identificando hechos: {e}") from e
+    vista._log_response(prompt_id, prompt_key, codigo, raw)
+    trabajos_ia.avanzar(trabajo, 90, "Guardando…")
+    vista._guardar_hechos(vista._parsear_hechos(raw))
+    return {"mensaje": "Hechos identificados con IA."}
@@ -4,7 +4,10 @@ import logging
 import datetime
 from uuid import uuid4
 
+from asgiref.sync import sync_to_async
+from django.db import transaction
 from django.shortcuts import render, redirect
+from django.urls import reverse
 from django.views import View
 from django.contrib import messages
 
@@ -14,9 +17,11 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.conf import settings  # <-- NUEVO
 
-from .prompt_utils import call_ia_json  # usamos JSON directo para robustez
+from .prompt_utils import acall_ia_json, call_ia_json  # usamos JSON directo para robustez
+from accidentes.utils import trabajos_ia
 from accidentes.models import Accidentes, Relato, ArbolCausas, Prescripciones
-from accidentes.utils.mixins import AccidenteScopedByCodigoMixin
+from accidentes.utils.mixins import AccidenteScopedByCodigoMixin, AsyncIAViewMixin
+from accidentes.utils.arbol_journal import json_5q_vigente
 
 logger = logging.getLogger(__name__)
 
@@ -57,7 +62,7 @@ def _log_error(prompt_id: str, prompt_key: str, codigo: str, err: Exception):
 
 
 @method_decorator(login_required(login_url="/accounts/login/"), name="dispatch")
-class MedidasCorrectivasView(LoginRequiredMixin, AccidenteScopedByCodigoMixin, View):
+class MedidasCorrectivasView(AsyncIAViewMixin, LoginRequiredMixin, AccidenteScopedByCodigoMixin, View):
     template_name = "accidentes/medidas_correctivas.html"
     partial_name = "accidentes/partials/medidas/_medidas_wrapper.html"
     login_url = "/accounts/login/"
@@ -92,6 +97,7 @@ class MedidasCorrectivasView(LoginRequiredMixin, AccidenteScopedByCodigoMixin, V
             "codigo": codigo,
             "edit_mode": edit_mode,
             "edit_index": edit_index,
+            **trabajos_ia.contexto(accidente, "medidas"),
         }
         return accidente, ctx
 
@@ -107,18 +113,160 @@ class MedidasCorrectivasView(LoginRequiredMixin, AccidenteScopedByCodigoMixin, V
     def _current_path(self, request):
         return request.path
 
+    # ----------------- IA: regenerar todas las medidas -----------------
+    @staticmethod
+    def _extract_json_block(text: str):
+        if not isinstance(text, str):
+            return None
+        if "```" in text:
+            try:
+                return text.split("```json", 1)[1].split("```", 1)[0].strip()
+            except Exception:
+                pass
+        try:
+            start = text.find("{")
+            end = text.rfind("}")
+            if start != -1 and end != -1 and end > start:
+                return text[start:end+1]
+        except Exception:
+            pass
+        return None
+
+    def _payload_medidas(self, accidente) -> dict | None:
+        """Payload explícito: relato, hechos, arbol (None si no hay datos)."""
+        relato_obj = Relato.objects.filter(accidente=accidente, is_current=True).first()
+        relatof = (relato_obj.relato_final or "").strip() if relato_obj else ""
+
+        hechos_payload: list[str] = []
+        try:
+            from accidentes.models import Hechos  # opcional
+            hqs = Hechos.objects.filter(accidente=accidente).order_by("secuencia", "pk")
+            hechos_payload = [
+                (h.descripcion or "").strip()
+                for h in hqs
+                if (h.descripcion or "").strip()
+            ]
+        except Exception:
+            hechos_payload = []
+
+        arbol_obj = ArbolCausas.objects.filter(accidente=accidente, is_current=True).first()
+        arbol_raw = json_5q_vigente(arbol_obj).strip() if arbol_obj else ""
+        arbol_payload = None
+        if arbol_raw:
+            try:
+                arbol_payload = json.loads(arbol_raw)
+            except Exception:
+                arbol_payload = arbol_raw  # string
+
+        self._debug_print("MEDIDAS payload.relato", [relatof] if relatof else ["<vacío>"])
+        self._debug_print("MEDIDAS payload.hechos", hechos_payload or ["<vacío>"])
+        self._debug_print(
+            "MEDIDAS payload.arbol_de_causa",
+            [json.dumps(arbol_payload, ensure_ascii=False)] if isinstance(arbol_payload, (dict, list)) else
+            [arbol_payload] if arbol_payload else ["<vacío>"]
+        )
+
+        if not (relatof or hechos_payload or arbol_payload):
+            return None
+        return {
+            "relato": relatof,
+            "hechos": hechos_payload,
+            "arbol_de_causa": arbol_payload or ""
+        }
+
+    @classmethod
+    def _medidas_de(cls, data) -> list:
+        """Lista 'medidas' de la respuesta IA (dict, o texto con un bloque JSON)."""
+        if isinstance(data, str):
+            block = cls._extract_json_block(data) or data
+            try:
+                data = json.loads(block)
+            except Exception:
+                data = {}
+        data = data or {}
+        return data.get("medidas", []) if isinstance(data, dict) else []
+
+    @transaction.atomic
+    def _guardar_medidas(self, accidente, medidas: list) -> None:
+        Prescripciones.objects.filter(accidente=accidente).delete()
+
+        for m in medidas:
+            tipo = (m.get("tipo") or "Administrativa").strip()
+            prioridad = (m.get("prioridad") or "Media").strip()
+            descripcion = (m.get("descripcion") or "").strip()
+            responsable = (m.get("responsable") or "").strip().title()
+            fecha_str = (m.get("fecha") or "").strip()
+
+            try:
+                plazo = datetime.datetime.strptime(fecha_str, "%Y-%m-%d").date() if fecha_str else datetime.date.today()
+            except ValueError:
+                plazo = datetime.date.today()
+
+            Prescripciones.objects.create(
+                accidente=accidente,
+                tipo=tipo,
+                prioridad=prioridad,
+                descripcion=descripcion,
+                responsable=responsable,
+                plazo=plazo,
+            )
+
+    async def _regenerar(self, request, codigo: str):
+        accidente = self.accidente
+        prompt_key = "medidas"
+        prompt_id = None
+        # con medidas ya generadas el botón pide una respuesta nueva (sin caché ni almacén IA)
+        regenerar = request.POST.get("regenerar") == "1"
+        try:
+            payload = await sync_to_async(self._payload_medidas)(accidente)
+            if payload is None:
+                messages.warning(request, "No hay datos suficientes (relato final / hechos / árbol 5Q) para generar medidas.")
+            elif trabajos_ia.EN_COLA:
+                await sync_to_async(trabajos_ia.encolar)(
+                    "medidas", accidente, usuario=request.user, regenerar=regenerar,
+                    volver={"path": reverse("accidentes:ia_medidas", args=[codigo]),
+                            "target": "#mc-wrapper", "swap": "innerHTML"},
+                )
+            else:
+                prompt_id = _log_request(prompt_key, codigo, payload)
+                data = await acall_ia_json(
+                    json.dumps(payload, ensure_ascii=False), prompt_key=prompt_key, regenerar=regenerar
+                )
+                _log_response(prompt_id, prompt_key, codigo, data)
+
+                medidas = self._medidas_de(data)
+                await sync_to_async(self._guardar_medidas)(accidente, medidas)
+                messages.success(request, "Medidas regeneradas correctamente.")
+        except Exception as e:
+            try:
+                _log_error(prompt_id or "-", prompt_key, codigo, e)
+            except Exception:
+                pass
+            logger.exception("Error al generar medidas")
+            messages.error(request, f"Error generando medidas: {e}")
+
     # ----------------- GET -----------------
     @method_decorator(require_GET)
-    def get(self, request, codigo: str):
-        return self._render(request, codigo)
+    async def get(self, request, codigo: str):
+        return await sync_to_async(self._render)(request, codigo)
 
     # ----------------- POST -----------------
     @method_decorator(require_POST)
-    def post(self, request, codigo: str):
+    async def post(self, request, codigo: str):
+        # ---- Regenerar todas las medidas (IA, async: sin ocupar hilo) ----
+        if "regenerate" in request.POST:
+            await self._regenerar(request, codigo)
+            is_htmx = bool(request.headers.get("HX-Request"))
+            if is_htmx:
+                return await sync_to_async(self._render)(request, codigo)
+            return redirect("accidentes:ia_medidas", codigo=codigo)
+        return await sync_to_async(self._post_bd)(request, codigo)
+
+    def _post_bd(self, request, codigo: str):
         """
         Todas las operaciones usan accidente resuelto por helper con alcance (mixin).
         """
-        accidente = self.accidente_from(codigo)  # 🔐
+        accidente = self.accidente  # 🔐 resuelto en dispatch
         is_htmx = bool(request.headers.get("HX-Request"))
 
         # ---- Entrar a modo edición de una medida (por índice visual) ----
@@ -183,120 +331,6 @@ class MedidasCorrectivasView(LoginRequiredMixin, AccidenteScopedByCodigoMixin, V
 
             return self._render(request, codigo) if is_htmx else redirect("accidentes:ia_medidas", codigo=codigo)
 
-        # ---- Regenerar todas las medidas (IA) ----
-        if "regenerate" in request.POST:
-            prompt_key = "medidas"
-            prompt_id = None
-
-            def _extract_json_block(text: str):
-                if not isinstance(text, str):
-                    return None
-                if "```" in text:
-                    try:
-                        return text.split("```json", 1)[1].split("```", 1)[0].strip()
-                    except Exception:
-                        pass
-                try:
-                    start = text.find("{")
-                    end = text.rfind("}")
-                    if start != -1 and end != -1 and end > start:
-                        return text[start:end+1]
-                except Exception:
-                    pass
-                return None
-
-            try:
-                # === 1) Armar payload explícito: relato, hechos, arbol ===
-                relato_obj = Relato.objects.filter(accidente=accidente, is_current=True).first()
-                relatof = (relato_obj.relato_final or "").strip() if relato_obj else ""
-
-                hechos_payload: list[str] = []
-                try:
-                    from accidentes.models import Hechos  # opcional
-                    hqs = Hechos.objects.filter(accidente=accidente).order_by("secuencia", "pk")
-                    hechos_payload = [
-                        (h.descripcion or "").strip()
-                        for h in hqs
-                        if (h.descripcion or "").strip()
-                    ]
-                except Exception:
-                    hechos_payload = []
-
-                arbol_obj = ArbolCausas.objects.filter(accidente=accidente, is_current=True).first()
-                arbol_raw = (arbol_obj.arbol_json_5q or "").strip() if arbol_obj else ""
-                arbol_payload = None
-                if arbol_raw:
-                    try:
-                        arbol_payload = json.loads(arbol_raw)
-                    except Exception:
-                        arbol_payload = arbol_raw  # string
-
-                payload = {
-                    "relato": relatof,
-                    "hechos": hechos_payload,
-                    "arbol_de_causa": arbol_payload or ""
-                }
-
-                self._debug_print("MEDIDAS payload.relato", [relatof] if relatof else ["<vacío>"])
-                self._debug_print("MEDIDAS payload.hechos", hechos_payload or ["<vacío>"])
-                self._debug_print(
-                    "MEDIDAS payload.arbol_de_causa",
-                    [json.dumps(arbol_payload, ensure_ascii=False)] if isinstance(arbol_payload, (dict, list)) else
-                    [arbol_payload] if arbol_payload else ["<vacío>"]
-                )
-
-                if not (relatof or hechos_payload or arbol_payload):
-                    messages.warning(request, "No hay datos suficientes (relato final / hechos / árbol 5Q) para generar medidas.")
-                else:
-                    prompt_id = _log_request(prompt_key, codigo, payload)
-                    data = call_ia_json(json.dumps(payload, ensure_ascii=False), prompt_key=prompt_key)
-
-                    if isinstance(data, str):
-                        block = _extract_json_block(data) or data
-                        try:
-                            data = json.loads(block)
-                        except Exception:
-                            data = {}
-
-                    _log_response(prompt_id, prompt_key, codigo, data)
-
-                    data = data or {}
-                    medidas = data.get("medidas", []) if isinstance(data, dict) else []
-
-                    Prescripciones.objects.filter(accidente=accidente).delete()
-
-                    for m in medidas:
-                        tipo = (m.get("tipo") or "Administrativa").strip()
-                        prioridad = (m.get("prioridad") or "Media").strip()
-                        descripcion = (m.get("descripcion") or "").strip()
-                        responsable = (m.get("responsable") or "").strip().title()
-                        fecha_str = (m.get("fecha") or "").strip()
-
-                        try:
-                            plazo = datetime.datetime.strptime(fecha_str, "%Y-%m-%d").date() if fecha_str else datetime.date.today()
-                        except ValueError:
-                            plazo = datetime.date.today()
-
-                        Prescripciones.objects.create(
-                            accidente=accidente,
-                            tipo=tipo,
-                            prioridad=prioridad,
-                            descripcion=descripcion,
-                            responsable=responsable,
-                            plazo=plazo,
-                        )
-
-                    messages.success(request, "Medidas regeneradas correctamente.")
-            except Exception as e:
-                try:
-                    _log_error(prompt_id or "-", prompt_key, codigo, e)
-                except Exception:
-                    pass
-                logger.exception("Error al generar medidas")
-                messages.error(request, f"Error generando medidas: {e}")
-
-            return self._render(request, codigo) if is_htmx else redirect("accidentes:ia_medidas", codigo=codigo)
-
         # ---- Guardar todo (informativo) ----
         if "save_all" in request.POST:
             messages.success(request, "Todos los cambios ya están guardados.")
@@ -351,3 +385,29 @@ class MedidasCorrectivasView(LoginRequiredMixin, AccidenteScopedByCodigoMixin, V
 
         # ---- Fallback ----
         return self._render(request, codigo) if is_htmx else redirect("accidentes:ia_medidas", codigo=codigo)
+
+
+def ejecutar_trabajo(trabajo) -> dict:
+    """Regeneración de medidas correctivas en cola (worker_ia)."""
+    vista = MedidasCorrectivasView()
+    accidente = trabajo.accidente
+    codigo = accidente.codigo_accidente
+    payload = vista._payload_medidas(accidente)
+    if payload is None:
+        raise ValueError("No hay datos suficientes (relato final / hechos / árbol 5Q) para generar medidas.")
+
+    prompt_key = "medidas"
+    prompt_id = _log_request(prompt_key, codigo, payload)
+    trabajos_ia.avanzar(trabajo, 10, "Generando medidas correctivas…")
+    try:
+        data = call_ia_json(
+            json.dumps(payload, ensure_ascii=False), prompt_key=prompt_key,
+            regenerar=bool(trabajo.parametros.get("regenerar")),
+        )
+    except Exception as e:
+        _log_error(prompt_id, prompt_key, codigo, e)
+        raise RuntimeError(f"Error generando medidas: {e}") from e
+    _log_response(prompt_id, prompt_key, codigo, data)
+    trabajos_ia.avanzar(trabajo, 90, "Guardando…")
+    vista._guardar_medidas(accidente, vista._medidas_de(data))
+    return {"mensaje": "Medidas regeneradas correctamente."}
@@ -1,5 +1,6 @@
 # accidentes/views_api/prompt_utils.py
 
+import asyncio
 import json
 from json import JSONDecodeError
 from pathlib import Path
@@ -7,30 +8,74 @@ import hashlib
 import logging
 import random
 import time
-from typing import Optional
+import weakref
+from typing import AsyncIterator, Iterator, Optional, Tuple
 
 from django.conf import settings
 from django.core.cache import cache  # requiere caché configurada (Memcached/Redis/LocMem)
 from decouple import Config, RepositoryEnv
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
+from asgiref.sync import sync_to_async
 
-logger = logging.getLogger(__name__)
+from accidentes.utils import payload_ia, respuestas_ia, single_flight
+from accidentes.utils.prompts_ia import registro as prompts
 
-# ─── Load IA prompts ────────────────────────────────────────────────────────────
-PROMPT_FILE = Path(settings.BASE_DIR) / "accidentes" / "setting" / "prompt" / "prompt.json"
-with open(PROMPT_FILE, encoding="utf-8") as f:
-    PROMPTS = json.load(f)["prompts"]
+logger = logging.getLogger(__name__)
 
 # ─── OpenAI client setup ───────────────────────────────────────────────────────
+# Diferido: ni el .env ni el cliente se tocan al importar (workers, comandos de gestión)
 ENV_PATH = Path(settings.BASE_DIR) / ".env"
-config = Config(repository=RepositoryEnv(ENV_PATH))
-openai_client = OpenAI(api_key=config("OPENAI_API_KEY"))
+_config = None
+_client = None
+
+
+def _env(nombre: str, default=None):
+    global _config
+    if _config is None:
+        _config = Config(repository=RepositoryEnv(ENV_PATH))
+    return _config(nombre, default=default)
+
+
+def _credenciales() -> dict:
+    # OPENAI_BASE_URL (opcional): API compatible alternativa, p.ej. `manage.py ia_stub` en pruebas
+    # max_retries=0: los reintentos (y la espera del single-flight, _espera_s) son los de este módulo
+    return {"api_key": _env("OPENAI_API_KEY"), "base_url": _env("OPENAI_BASE_URL") or None, "max_retries": 0}
+
+
+def _sync_client() -> OpenAI:
+    global _client
+    if _client is None:
+        _client = OpenAI(**_credenciales())
+    return _client
+
+
+# Cliente async (vistas IA bajo ASGI): uno por event loop, su pool httpx queda
+# atado al loop que lo creó (bajo WSGI async_to_sync abre un loop por request)
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncOpenAI]" = weakref.WeakKeyDictionary()
+
+
+def _async_client() -> AsyncOpenAI:
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = AsyncOpenAI(**_credenciales())
+    return client
+
+
+def __getattr__(nombre: str):
+    # compatibilidad: PROMPTS / openai_client como atributos del módulo, resueltos al usarlos
+    if nombre == "PROMPTS":
+        return prompts.todos()
+    if nombre == "openai_client":
+        return _sync_client()
+    raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
+
 
 # ─── Config por defecto (puedes ajustar desde settings si quieres) ─────────────
 DEFAULT_TIMEOUT_S = getattr(settings, "IA_TIMEOUT_S", 20)
 DEFAULT_RETRIES = getattr(settings, "IA_RETRIES", 2)  # reintentos adicionales
 DEFAULT_IDEM_TTL_S = getattr(settings, "IA_IDEM_TTL_S", 300)  # 5 min
-MAX_PAYLOAD_CHARS = getattr(settings, "IA_MAX_PAYLOAD_CHARS", 50_000)
+# Espera mínima (seg.) por el resultado de otro proceso con la misma clave (single-flight)
 SINGLE_FLIGHT_LOCK_S = getattr(settings, "IA_SINGLE_FLIGHT_LOCK_S", 30)
 
 # Log de payload (método A)
@@ -42,40 +87,48 @@ IA_LOG_PROMPTS_MAX = getattr(settings, "IA_LOG_PROMPTS_MAX", 8000)
 # Helpers
 # ───────────────────────────────────────────────────────────────────────────────
 
-def _minify_and_limit(input_str: str, max_chars: int = MAX_PAYLOAD_CHARS) -> str:
-    """
-    - Si es JSON válido, lo re-dumpa minificado (sin espacios).
-    - Si no, colapsa espacios.
-    - Si excede el límite, trunca con marca.
-    """
-    s = (input_str or "").strip()
-    if not s:
-        return ""
-
-    # ¿Es JSON?
-    try:
-        obj = json.loads(s)
-        s = json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
-    except Exception:
-        # No es JSON → colapsa whitespace
-        s = " ".join(s.split())
-
-    if len(s) > max_chars:
-        s = s[: max_chars - 12] + " [TRUNCADO]"
-        logger.warning("IA payload truncado a %s caracteres", max_chars)
-    return s
-
-
-def _idem_key(prompt_key: str, model: str, payload: str, temperature: Optional[float], top_p: Optional[float]) -> str:
-    base = f"{prompt_key}|{model}|{temperature}|{top_p}|{payload}"
+def _idem_key(prompt_key: str, version: str, model: str, payload: str,
+              temperature: Optional[float], top_p: Optional[float]) -> str:
+    # 'version' (hash de la configuración del prompt): editar el prompt invalida lo cacheado
+    base = f"{prompt_key}|{version}|{model}|{temperature}|{top_p}|{payload}"
     return hashlib.sha256(base.encode("utf-8")).hexdigest()
 
 
-def _sleep_backoff(attempt: int) -> None:
+def _backoff_s(attempt: int) -> float:
     # attempt: 1..N  → 0.5s, 1.0s, 2.0s ... con jitter ±20%
     base = 0.5 * (2 ** (attempt - 1))
     jitter = random.uniform(-0.2, 0.2) * base
-    time.sleep(max(0.1, base + jitter))
+    return max(0.1, base + jitter)
+
+
+def _sleep_backoff(attempt: int) -> None:
+    time.sleep(_backoff_s(attempt))
+
+
+def _espera_s(timeout_s: int, retries: int) -> float:
+    """Cuánto esperar al líder del single-flight: su peor caso (timeouts + backoff), o más."""
+    return max(SINGLE_FLIGHT_LOCK_S, timeout_s * (retries + 1) + sum(_backoff_s(a) for a in range(1, retries + 1)) * 1.2)
+
+
+def _resuelto(prompt_key: str, cfg: dict, payload: str, cache_key: str, idem_ttl_s: int,
+              contar_fallo: bool = True) -> Optional[str]:
+    """Respuesta ya disponible: caché de idempotencia y, si no, el almacén persistente."""
+    cached = cache.get(cache_key)
+    if cached is None:
+        cached = respuestas_ia.buscar(prompt_key, cfg, payload, contar_fallo=contar_fallo)
+        if cached is not None:
+            cache.set(cache_key, cached, timeout=idem_ttl_s)
+    return cached
+
+
+async def _aresuelto(prompt_key: str, cfg: dict, payload: str, cache_key: str, idem_ttl_s: int,
+                     contar_fallo: bool = True) -> Optional[str]:
+    cached = await cache.aget(cache_key)
+    if cached is None:
+        cached = await sync_to_async(respuestas_ia.buscar)(prompt_key, cfg, payload, contar_fallo=contar_fallo)
+        if cached is not None:
+            await cache.aset(cache_key, cached, timeout=idem_ttl_s)
+    return cached
 
 
 def _is_transient_error(exc: Exception) -> bool:
@@ -87,7 +140,7 @@ def _is_transient_error(exc: Exception) -> bool:
 def _call_openai_text(model: str, temperature: float, top_p: float, system: str, user: str, timeout_s: int) -> str:
     # Nota: la lib moderna de OpenAI acepta 'timeout' (httpx). Si tu versión usa otro nombre,
     # cámbialo por 'request_timeout'.
-    resp = openai_client.chat.completions.create(
+    resp = _sync_client().chat.completions.create(
         model=model,
         temperature=temperature,
         top_p=top_p,
@@ -101,18 +154,26 @@ def _call_openai_text(model: str, temperature: float, top_p: float, system: str,
     return content
 
 
-# ───────────────────────────────────────────────────────────────────────────────
-# API pública
-# ───────────────────────────────────────────────────────────────────────────────
+async def _acall_openai_text(model: str, temperature: float, top_p: float, system: str, user: str, timeout_s: int) -> str:
+    resp = await _async_client().chat.completions.create(
+        model=model,
+        temperature=temperature,
+        top_p=top_p,
+        messages=[
+            {"role": "system", "content": system},
+            {"role": "user", "content": user},
+        ],
+        timeout=timeout_s,
+    )
+    return (resp.choices[0].message.content or "").strip()
 
-def call_ia_text(input_str: str, prompt_key: str,
-                 *,
-                 timeout_s: int = DEFAULT_TIMEOUT_S,
-                 retries: int = DEFAULT_RETRIES,
-                 idempotency: bool = True,
-                 idem_ttl_s: int = DEFAULT_IDEM_TTL_S) -> str:
 
-    cfg = PROMPTS.get(prompt_key)
+def _solicitud(input_str: str, prompt_key: str, idempotency: bool) -> Tuple[dict, str, Optional[str], Optional[str]]:
+    """
+    Parte común de call_ia_text / acall_ia_text:
+    (cfg del prompt, payload a enviar, cache_key, idem_key).
+    """
+    cfg = prompts.get(prompt_key)
     if not cfg:
         raise ValueError(f"Prompt '{prompt_key}' not found")
 
@@ -120,10 +181,15 @@ def call_ia_text(input_str: str, prompt_key: str,
     temperature = cfg.get("temperature", 0.7)
     top_p = cfg.get("top_p", 1.0)
 
-    # Payload que realmente se enviará
-    payload = _minify_and_limit(input_str, MAX_PAYLOAD_CHARS)
+    # Payload que realmente se enviará: minificado y dentro del presupuesto de tokens
+    payload = payload_ia.empaquetar(
+        input_str, model, max_tokens=cfg.get("max_payload_tokens"),
+        prioridad=cfg.get("prioridad"), etiqueta=prompt_key,
+    )
     if not payload:
         logger.warning("call_ia_text: payload vacío para prompt_key=%s", prompt_key)
+    if cfg.get("user_template"):
+        payload = cfg["user_template"].replace("{payload}", payload)
 
     # LOG DEL PAYLOAD (método A)
     if IA_LOG_PROMPTS:
@@ -133,93 +199,209 @@ def call_ia_text(input_str: str, prompt_key: str,
             prompt_key, model, temperature, top_p, len(payload), sample
         )
 
-    idem_key = _idem_key(prompt_key, model, payload, temperature, top_p) if idempotency else None
+    idem_key = _idem_key(prompt_key, cfg["version"], model, payload, temperature, top_p) if idempotency else None
     cache_key = f"ia:{idem_key}:result" if idem_key else None
-    lock_key = f"ia:{idem_key}:lock" if idem_key else None
+    return cfg, payload, cache_key, idem_key
 
-    # Idempotencia: hit de caché
-    if cache_key:
-        cached = cache.get(cache_key)
+
+def _json_de(raw: str, prompt_key: str) -> dict:
+    """Desfencea bloques ``` si el modelo los agrega y parsea el JSON."""
+    content = raw.strip()
+    if content.startswith("```"):
+        lines = content.splitlines()[1:]
+        if lines and lines[-1].strip().startswith("```"):
+            lines = lines[:-1]
+        content = "\n".join(lines).strip()
+
+    try:
+        return json.loads(content)
+    except JSONDecodeError:
+        logger.error("call_ia_json: contenido inválido para prompt_key=%s len=%s", prompt_key, len(content))
+        raise ValueError(f"IA response is not valid JSON:\n{content}")
+
+
+# ───────────────────────────────────────────────────────────────────────────────
+# API pública
+# ───────────────────────────────────────────────────────────────────────────────
+
+def call_ia_text(input_str: str, prompt_key: str,
+                 *,
+                 timeout_s: int = DEFAULT_TIMEOUT_S,
+                 retries: int = DEFAULT_RETRIES,
+                 idempotency: bool = True,
+                 idem_ttl_s: int = DEFAULT_IDEM_TTL_S,
+                 regenerar: bool = False) -> str:
+
+    cfg, payload, cache_key, idem_key = _solicitud(input_str, prompt_key, idempotency)
+    model = cfg["model"]
+    temperature = cfg.get("temperature", 0.7)
+    top_p = cfg.get("top_p", 1.0)
+
+    # Idempotencia: hit de caché y, si no, del almacén persistente ('regenerar' los salta)
+    if cache_key and not regenerar:
+        cached = _resuelto(prompt_key, cfg, payload, cache_key, idem_ttl_s)
         if cached is not None:
             logger.info("IA idempotencia: HIT prompt=%s", prompt_key)
             return cached
 
-    # Single-flight: acquire lock
-    got_lock = False
-    if lock_key:
-        got_lock = cache.add(lock_key, "1", timeout=SINGLE_FLIGHT_LOCK_S)
-
-    if not got_lock and cache_key:
-        # Otra request está resolviendo la misma llamada → espera resultado
-        logger.info("IA idempotencia: esperando resultado de otra request (prompt=%s)", prompt_key)
-        waited = 0.0
-        step = 0.25
-        while waited < SINGLE_FLIGHT_LOCK_S:
-            cached = cache.get(cache_key)
+    # Single-flight entre procesos: si otro ya llama con la misma clave, se
+    # espera bloqueado (sin sondeo) y se usa su resultado
+    vuelo = single_flight.entrar(idem_key, _espera_s(timeout_s, retries)) if idem_key else None
+    try:
+        if vuelo is not None and vuelo.resultado is not None:
+            logger.info("IA single-flight: resultado de otra request (prompt=%s)", prompt_key)
+            cache.set(cache_key, vuelo.resultado, timeout=idem_ttl_s)
+            return vuelo.resultado
+        if vuelo is not None and not regenerar:
+            # otro líder pudo terminar entre la consulta de arriba y el lock: lo dejó guardado
+            cached = _resuelto(prompt_key, cfg, payload, cache_key, idem_ttl_s, contar_fallo=False)
             if cached is not None:
+                logger.info("IA single-flight: resuelto por otro líder (prompt=%s)", prompt_key)
                 return cached
-            time.sleep(step)
-            waited += step
-        # Lock expiró sin resultado → seguimos y llamamos nosotros.
 
-    attempts = retries + 1
-    last_exc = None
-    start = time.time()
-
-    for attempt in range(1, attempts + 1):
-        try:
-            content = _call_openai_text(
-                model=model,
-                temperature=temperature,
-                top_p=top_p,
-                system=cfg["instruction"],
-                user=payload,
-                timeout_s=timeout_s,
-            )
-
-            if not content:
-                raise RuntimeError("IA devolvió contenido vacío")
-
-            # Cachea resultado para idempotencia
+        attempts = retries + 1
+        last_exc = None
+        content = ""
+        start = time.time()
+
+        for attempt in range(1, attempts + 1):
+            try:
+                content = _call_openai_text(
+                    model=model,
+                    temperature=temperature,
+                    top_p=top_p,
+                    system=cfg["instruction"],
+                    user=payload,
+                    timeout_s=timeout_s,
+                )
+
+                if not content:
+                    raise RuntimeError("IA devolvió contenido vacío")
+                break
+
+            except Exception as e:
+                last_exc = e
+                content = ""
+                is_transient = _is_transient_error(e)
+                if attempt < attempts and is_transient:
+                    logger.warning("IA retry prompt=%s attempt=%s/%s: %s", prompt_key, attempt, attempts, e)
+                    _sleep_backoff(attempt)
+                    continue
+                # Sin más reintentos o error no transitorio
+                logger.error("IA error prompt=%s attempt=%s/%s: %s", prompt_key, attempt, attempts, e)
+                break
+
+        if content:
+            # Cachea resultado para idempotencia y lo entrega a quienes esperan
             if cache_key:
                 cache.set(cache_key, content, timeout=idem_ttl_s)
+            if vuelo is not None:
+                vuelo.publicar(content)
+            if idem_key:
+                respuestas_ia.guardar(prompt_key, cfg, payload, content)
 
             elapsed = int((time.time() - start) * 1000)
             logger.info("IA ok prompt=%s model=%s ms=%s attempt=%s", prompt_key, model, elapsed, attempt)
             return content
+    finally:
+        if vuelo is not None:
+            vuelo.cerrar()
 
-        except Exception as e:
-            last_exc = e
-            is_transient = _is_transient_error(e)
-            if attempt < attempts and is_transient:
-                logger.warning("IA retry prompt=%s attempt=%s/%s: %s", prompt_key, attempt, attempts, e)
-                _sleep_backoff(attempt)
-                continue
-            # Sin más reintentos o error no transitorio
-            logger.error("IA error prompt=%s attempt=%s/%s: %s", prompt_key, attempt, attempts, e)
-            break
-        finally:
-            # Libera lock si eres el poseedor (aunque con caché por TTL no es crítico)
-            if got_lock and lock_key:
-                cache.delete(lock_key)
-    
     # Fallback coherente (no explotar UX)
     raise RuntimeError(f"No se pudo completar la llamada IA para '{prompt_key}': {last_exc}")
 
 
+def stream_ia_text(input_str: str, prompt_key: str,
+                   *,
+                   timeout_s: int = DEFAULT_TIMEOUT_S,
+                   idempotency: bool = True,
+                   idem_ttl_s: int = DEFAULT_IDEM_TTL_S,
+                   regenerar: bool = False) -> Iterator[str]:
+    """
+    Igual que call_ia_text pero entrega el texto en fragmentos a medida que
+    llega (stream=True). Sin reintentos: un corte a mitad de respuesta se
+    propaga al consumidor. Comparte la caché de idempotencia y el single-flight
+    con call_ia_text (un HIT, o el resultado de otra request, se entrega como
+    un único fragmento; la respuesta completa se cachea).
+    """
+    cfg, payload, cache_key, idem_key = _solicitud(input_str, prompt_key, idempotency)
+    model = cfg["model"]
+
+    if cache_key and not regenerar:
+        cached = _resuelto(prompt_key, cfg, payload, cache_key, idem_ttl_s)
+        if cached is not None:
+            logger.info("IA idempotencia: HIT (stream) prompt=%s", prompt_key)
+            yield cached
+            return
+
+    vuelo = single_flight.entrar(idem_key, _espera_s(timeout_s, 0)) if idem_key else None
+    try:
+        if vuelo is not None and vuelo.resultado is not None:
+            logger.info("IA single-flight: resultado de otra request (stream) prompt=%s", prompt_key)
+            cache.set(cache_key, vuelo.resultado, timeout=idem_ttl_s)
+            yield vuelo.resultado
+            return
+        if vuelo is not None and not regenerar:
+            cached = _resuelto(prompt_key, cfg, payload, cache_key, idem_ttl_s, contar_fallo=False)
+            if cached is not None:
+                logger.info("IA single-flight: resuelto por otro líder (stream) prompt=%s", prompt_key)
+                yield cached
+                return
+
+        start = time.time()
+        partes = []
+        stream = _sync_client().chat.completions.create(
+            model=model,
+            temperature=cfg.get("temperature", 0.7),
+            top_p=cfg.get("top_p", 1.0),
+            messages=[
+                {"role": "system", "content": cfg["instruction"]},
+                {"role": "user", "content": payload},
+            ],
+            timeout=timeout_s,
+            stream=True,
+        )
+        try:
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    partes.append(delta)
+                    yield delta
+        finally:
+            stream.close()
+
+        content = "".join(partes).strip()
+        if not content:
+            raise RuntimeError("IA devolvió contenido vacío")
+        if cache_key:
+            cache.set(cache_key, content, timeout=idem_ttl_s)
+        if vuelo is not None:
+            vuelo.publicar(content)
+        if idem_key:
+            respuestas_ia.guardar(prompt_key, cfg, payload, content)
+        elapsed = int((time.time() - start) * 1000)
+        logger.info("IA ok (stream) prompt=%s model=%s ms=%s", prompt_key, model, elapsed)
+    finally:
+        if vuelo is not None:
+            vuelo.cerrar()
+
+
 def call_ia_json(input_str: str, prompt_key: str = "explora",
                  *,
                  timeout_s: int = DEFAULT_TIMEOUT_S,
                  retries: int = DEFAULT_RETRIES,
                  idempotency: bool = True,
-                 idem_ttl_s: int = DEFAULT_IDEM_TTL_S) -> dict:
+                 idem_ttl_s: int = DEFAULT_IDEM_TTL_S,
+                 regenerar: bool = False) -> dict:
     """
     Llama a OpenAI esperando JSON.
     - Aplica mismas garantías que call_ia_text.
     - Desfencea bloques ``` si el modelo los agrega.
+    - regenerar=True: ignora la caché y el almacén de respuestas ("Volver a generar").
     """
-    cfg = PROMPTS.get(prompt_key)
-    if not cfg:
+    if not prompts.get(prompt_key):
         raise ValueError(f"Prompt '{prompt_key}' not found")
 
     raw = call_ia_text(
@@ -229,17 +411,183 @@ def call_ia_json(input_str: str, prompt_key: str = "explora",
         retries=retries,
         idempotency=idempotency,
         idem_ttl_s=idem_ttl_s,
+        regenerar=regenerar,
     )
+    return _json_de(raw, prompt_key)
 
-    content = raw.strip()
-    if content.startswith("```"):
-        lines = content.splitlines()[1:]
-        if lines and lines[-1].strip().startswith("```"):
-            lines = lines[:-1]
-        content = "\n".join(lines).strip()
 
+# ───────────────────────────────────────────────────────────────────────────────
+# API async (vistas IA bajo ASGI): misma caché, single-flight y reintentos;
+# la espera al modelo no ocupa un hilo del worker
+# ───────────────────────────────────────────────────────────────────────────────
+
+async def acall_ia_text(input_str: str, prompt_key: str,
+                        *,
+                        timeout_s: int = DEFAULT_TIMEOUT_S,
+                        retries: int = DEFAULT_RETRIES,
+                        idempotency: bool = True,
+                        idem_ttl_s: int = DEFAULT_IDEM_TTL_S,
+                        regenerar: bool = False) -> str:
+    """Versión async de call_ia_text (AsyncOpenAI)."""
+    # empaquetar el payload (tokenizar) es CPU: fuera del event loop
+    cfg, payload, cache_key, idem_key = await asyncio.to_thread(_solicitud, input_str, prompt_key, idempotency)
+    model = cfg["model"]
+    temperature = cfg.get("temperature", 0.7)
+    top_p = cfg.get("top_p", 1.0)
+
+    if cache_key and not regenerar:
+        cached = await _aresuelto(prompt_key, cfg, payload, cache_key, idem_ttl_s)
+        if cached is not None:
+            logger.info("IA idempotencia: HIT prompt=%s", prompt_key)
+            return cached
+
+    vuelo = await single_flight.aentrar(idem_key, _espera_s(timeout_s, retries)) if idem_key else None
     try:
-        return json.loads(content)
-    except JSONDecodeError:
-        logger.error("call_ia_json: contenido inválido para prompt_key=%s len=%s", prompt_key, len(content))
-        raise ValueError(f"IA response is not valid JSON:\n{content}")
+        if vuelo is not None and vuelo.resultado is not None:
+            logger.info("IA single-flight: resultado de otra request (prompt=%s)", prompt_key)
+            await cache.aset(cache_key, vuelo.resultado, timeout=idem_ttl_s)
+            return vuelo.resultado
+        if vuelo is not None and not regenerar:
+            # otro líder pudo terminar entre la consulta de arriba y el lock: lo dejó guardado
+            cached = await _aresuelto(prompt_key, cfg, payload, cache_key, idem_ttl_s, contar_fallo=False)
+            if cached is not None:
+                logger.info("IA single-flight: resuelto por otro líder (prompt=%s)", prompt_key)
+                return cached
+
+        attempts = retries + 1
+        last_exc = None
+        content = ""
+        start = time.time()
+
+        for attempt in range(1, attempts + 1):
+            try:
+                content = await _acall_openai_text(
+                    model=model,
+                    temperature=temperature,
+                    top_p=top_p,
+                    system=cfg["instruction"],
+                    user=payload,
+                    timeout_s=timeout_s,
+                )
+                if not content:
+                    raise RuntimeError("IA devolvió contenido vacío")
+                break
+
+            except Exception as e:
+                last_exc = e
+                content = ""
+                if attempt < attempts and _is_transient_error(e):
+                    logger.warning("IA retry prompt=%s attempt=%s/%s: %s", prompt_key, attempt, attempts, e)
+                    await asyncio.sleep(_backoff_s(attempt))
+                    continue
+                logger.error("IA error prompt=%s attempt=%s/%s: %s", prompt_key, attempt, attempts, e)
+                break
+
+        if content:
+            if cache_key:
+                await cache.aset(cache_key, content, timeout=idem_ttl_s)
+            if vuelo is not None:
+                await asyncio.to_thread(vuelo.publicar, content)
+            if idem_key:
+                await sync_to_async(respuestas_ia.guardar)(prompt_key, cfg, payload, content)
+
+            elapsed = int((time.time() - start) * 1000)
+            logger.info("IA ok prompt=%s model=%s ms=%s attempt=%s", prompt_key, model, elapsed, attempt)
+            return content
+    finally:
+        if vuelo is not None:
+            await asyncio.to_thread(vuelo.cerrar)
+
+    raise RuntimeError(f"No se pudo completar la llamada IA para '{prompt_key}': {last_exc}")
+
+
+async def astream_ia_text(input_str: str, prompt_key: str,
+                          *,
+                          timeout_s: int = DEFAULT_TIMEOUT_S,
+                          idempotency: bool = True,
+                          idem_ttl_s: int = DEFAULT_IDEM_TTL_S,
+                          regenerar: bool = False) -> AsyncIterator[str]:
+    """Versión async de stream_ia_text (mismas reglas: sin reintentos, HIT en un fragmento)."""
+    # empaquetar el payload (tokenizar) es CPU: fuera del event loop
+    cfg, payload, cache_key, idem_key = await asyncio.to_thread(_solicitud, input_str, prompt_key, idempotency)
+    model = cfg["model"]
+
+    if cache_key and not regenerar:
+        cached = await _aresuelto(prompt_key, cfg, payload, cache_key, idem_ttl_s)
+        if cached is not None:
+            logger.info("IA idempotencia: HIT (stream) prompt=%s", prompt_key)
+            yield cached
+            return
+
+    vuelo = await single_flight.aentrar(idem_key, _espera_s(timeout_s, 0)) if idem_key else None
+    try:
+        if vuelo is not None and vuelo.resultado is not None:
+            logger.info("IA single-flight: resultado de otra request (stream) prompt=%s", prompt_key)
+            await cache.aset(cache_key, vuelo.resultado, timeout=idem_ttl_s)
+            yield vuelo.resultado
+            return
+        if vuelo is not None and not regenerar:
+            cached = await _aresuelto(prompt_key, cfg, payload, cache_key, idem_ttl_s, contar_fallo=False)
+            if cached is not None:
+                logger.info("IA single-flight: resuelto por otro líder (stream) prompt=%s", prompt_key)
+                yield cached
+                return
+
+        start = time.time()
+        partes = []
+        stream = await _async_client().chat.completions.create(
+            model=model,
+            temperature=cfg.get("temperature", 0.7),
+            top_p=cfg.get("top_p", 1.0),
+            messages=[
+                {"role": "system", "content": cfg["instruction"]},
+                {"role": "user", "content": payload},
+            ],
+            timeout=timeout_s,
+            stream=True,
+        )
+        try:
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    partes.append(delta)
+                    yield delta
+        finally:
+            await stream.close()
+
+        content = "".join(partes).strip()
+        if not content:
+            raise RuntimeError("IA devolvió contenido vacío")
+        if cache_key:
+            await cache.aset(cache_key, content, timeout=idem_ttl_s)
+        if vuelo is not None:
+            await asyncio.to_thread(vuelo.publicar, content)
+        if idem_key:
+            await sync_to_async(respuestas_ia.guardar)(prompt_key, cfg, payload, content)
+        elapsed = int((time.time() - start) * 1000)
+        logger.info("IA ok (stream) prompt=%s model=%s ms=%s", prompt_key, model, elapsed)
+    finally:
+        if vuelo is not None:
+            await asyncio.to_thread(vuelo.cerrar)
+
+
+async def acall_ia_json(input_str: str, prompt_key: str = "explora",
+                        *,
+                        timeout_s: int = DEFAULT_TIMEOUT_S,
+                        retries: int = DEFAULT_RETRIES,
+                        idempotency: bool = True,
+                        idem_ttl_s: int = DEFAULT_IDEM_TTL_S,
+                        regenerar: bool = False) -> dict:
+    """Versión async de call_ia_json."""
+    raw = await acall_ia_text(
+        input_str=input_str,
+        prompt_key=prompt_key,
+        timeout_s=timeout_s,
+        retries=retries,
+        idempotency=idempotency,
+        idem_ttl_s=idem_ttl_s,
+        regenerar=regenerar,
+    )
+    return _json_de(raw, prompt_key)
@@ -2,22 +2,31 @@
 import json
 import logging
 
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponseBadRequest
+from django.db import transaction
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_protect
 from django.shortcuts import render
+from django.urls import reverse
 from django.contrib import messages
 from django.views import View
 from django.contrib.auth.mixins import LoginRequiredMixin  # ← NUEVO
 
 from accidentes.models import Declaraciones, PreguntasGuia, Relato
-from .prompt_utils import call_ia_text
-from accidentes.utils.mixins import AccidenteScopedByCodigoMixin
+from .prompt_utils import acall_ia_text, astream_ia_text, call_ia_text
+from accidentes.utils import trabajos_ia
+from accidentes.utils.mixins import AccidenteScopedByCodigoMixin, AsyncIAViewMixin, EventStreamMixin
 
 logger = logging.getLogger(__name__)
 
+# Pasos con texto visible (relato, preguntas) en streaming desde el navegador
+TEXTO_STREAM = getattr(settings, "IA_TEXTO_STREAM", True)
+
 
 @method_decorator(csrf_protect, name="dispatch")
-class RelatoIAView(LoginRequiredMixin, AccidenteScopedByCodigoMixin, View):  # ← LoginRequiredMixin agregado
+class RelatoIAView(AsyncIAViewMixin, LoginRequiredMixin, AccidenteScopedByCodigoMixin, View):  # ← LoginRequiredMixin agregado
     """
     Flujo paso-a-paso (minimizando llamadas a la API):
       1) generar_relato              -> crea relato_inicial
@@ -60,7 +69,11 @@ class RelatoIAView(LoginRequiredMixin, AccidenteScopedByCodigoMixin, View):  # 
             paso = 2
         else:
             paso = 4
-        return {"relato": relato, "codigo": codigo, "paso": paso, "accidente": accidente}
+        return {
+            "relato": relato, "codigo": codigo, "paso": paso, "accidente": accidente,
+            "stream_url": reverse("accidentes:ia_relato_stream", args=[codigo]) if TEXTO_STREAM else None,
+            **trabajos_ia.contexto(accidente, "relato"),
+        }
 
     def _render(self, request, codigo: str):
         ctx = self._compute_ctx(request, codigo)
@@ -155,60 +168,197 @@ class RelatoIAView(LoginRequiredMixin, AccidenteScopedByCodigoMixin, View):  # 
             self._dbg_blob("IA payload initial_story (gather_data)", payload)
         return payload
 
-    def _phrase_qa(self, pregunta: str, respuesta: str) -> str:
+    def _payload_frase(self, pregunta: str, respuesta: str) -> str:
         """
         Payload de 'frasear_preguntas' SIN 'relato': solo 'pregunta' y 'respuesta'.
         """
-        payload = json.dumps(
+        return json.dumps(
             {
                 "pregunta": (pregunta or "").strip(),
                 "respuesta": (respuesta or "").strip(),
             },
             ensure_ascii=False,
         )
+
+    def _relato_actual(self):
+        return Relato.objects.filter(accidente=self.accidente, is_current=True).first()
+
+    def _persistir_relato_input(self, request, relato, n: int) -> None:
+        relato_input = (request.POST.get("relato_input") or "").strip()
+        if relato_input:
+            if logger.isEnabledFor(logging.DEBUG):
+                self._dbg_blob(f"Persist relato_inicial before P{n}", relato_input)
+            relato.relato_inicial = relato_input
+            relato.save(update_fields=["relato_inicial"])
+
+    # ------- pasos IA: preparar (BD) -> IA (async) -> guardar (BD) -------
+    # preparar(request, n) -> (relato, payload, prompt_key) | None (ya dejó mensaje)
+    # guardar(relato, salida, n) -> mensaje; salida=None si la IA falló y el paso tolera el error
+    # (sin request: también lo usa el worker, ver ejecutar_trabajo)
+    def _preparar_relato(self, request, n):
+        return None, self._gather_data(self.accidente), "relato_inicial"
+
+    @transaction.atomic
+    def _guardar_relato(self, relato, texto: str, n):
+        # el relato vigente se reemplaza recién con la respuesta en mano
+        Relato.objects.filter(accidente=self.accidente, is_current=True).update(is_current=False)
+        Relato.objects.create(accidente=self.accidente, relato_inicial=texto, is_current=True)
+        return "Relato inicial generado."
+
+    def _preparar_pregunta(self, request, n: int):
+        relato = self._relato_actual()
+        if not relato:
+            messages.error(request, "No existe un relato activo.")
+            return None
+        if n == 2 and not (relato.pregunta_1 and relato.respuesta_1):
+            messages.error(request, "Para generar la Pregunta 2, debes tener la Pregunta 1 y su respuesta.")
+            return None
+        if n == 3 and not (relato.pregunta_1 and relato.respuesta_1 and relato.pregunta_2 and relato.respuesta_2):
+            messages.error(request, "Para generar la Pregunta 3, debes tener P1+R1 y P2+R2.")
+            return None
+
+        self._persistir_relato_input(request, relato, n)
+        if n == 1:
+            return relato, relato.relato_inicial, "investiga1"
+
+        # P2 usa fraseQR1; P3 usa fraseQR1 + fraseQR2 (desde BD)
+        qaps = [self._get_frase_qr(relato, i) for i in range(1, n)]
+        if not all(qaps):
+            if n == 2:
+                messages.warning(request, "Falta el fraseo 1 (fraseQR1). Guarda la Respuesta 1 para continuar.")
+            else:
+                messages.warning(request, "Faltan fraseos previos (fraseQR1 y/o fraseQR2). Guarda las respuestas anteriores.")
+            return None
+        payload = {"relato_inicial": relato.relato_inicial}
+        if n == 2:
+            payload["qap"] = qaps[0]
+        else:
+            payload.update({"qap1": qaps[0], "qap2": qaps[1]})
+        return relato, json.dumps(payload, ensure_ascii=False), f"investiga{n}"
+
+    def _guardar_pregunta(self, relato, pregunta: str, n: int):
+        setattr(relato, f"pregunta_{n}", pregunta)
+        relato.save(update_fields=[f"pregunta_{n}"])
+        return f"Pregunta {n} generada."
+
+    def _preparar_respuesta(self, request, n: int):
+        relato = self._relato_actual()
+        pregunta = getattr(relato, f"pregunta_{n}", "") if relato else ""
+        if not pregunta:
+            messages.error(request, f"Primero genera la Pregunta {n}.")
+            return None
+        respuesta = (request.POST.get(f"respuesta_{n}") or "").strip()
+        if not respuesta:
+            messages.warning(request, f"Debes escribir la respuesta {n}.")
+            return None
+
         if logger.isEnabledFor(logging.DEBUG):
-            self._dbg_blob("IA payload frasear_preguntas", payload)
+            self._dbg_blob(f"Save respuesta_{n}", respuesta)
+        setattr(relato, f"respuesta_{n}", respuesta)
+        return relato, self._payload_frase(pregunta, respuesta), "frasear_preguntas"
+
+    def _guardar_respuesta(self, relato, frase: str | None, n: int):
+        pregunta = getattr(relato, f"pregunta_{n}")
+        respuesta = getattr(relato, f"respuesta_{n}")
         try:
-            out = call_ia_text(payload, prompt_key="frasear_preguntas").strip()
-            if logger.isEnabledFor(logging.DEBUG):
-                self._dbg_blob("IA out frasear_preguntas", out)
-            return out
+            self._set_frase_qr(relato, n, frase or f"Pregunta: {pregunta}\nRespuesta: {respuesta}")
         except Exception:
-            logger.exception("Error en frasear_preguntas")
-            return f"Pregunta: {pregunta}\nRespuesta: {respuesta}"
+            logger.exception("No se pudo generar/guardar fraseQR%s", n)
+        relato.save(update_fields=[f"respuesta_{n}"])
+        return f"Respuesta {n} guardada."
+
+    def _preparar_relato_final(self, request, n):
+        relato = self._relato_actual()
+        if not relato:
+            messages.error(request, "No existe un relato activo.")
+            return None
+
+        relato_input = (request.POST.get("relato_input") or "").strip() or (relato.relato_inicial or "")
+        if not relato_input:
+            messages.warning(request, "El relato base no puede estar vacío.")
+            return None
+
+        if not (relato.pregunta_1 and relato.respuesta_1 and
+                relato.pregunta_2 and relato.respuesta_2 and
+                relato.pregunta_3 and relato.respuesta_3):
+            messages.warning(request, "Debes completar las tres preguntas y sus respuestas antes de generar el final.")
+            return None
+
+        # usa fraseQRn desde BD; NO re-frasea
+        qap1, qap2, qap3 = (self._get_frase_qr(relato, i) for i in (1, 2, 3))
+        if not (qap1 and qap2 and qap3):
+            messages.warning(request, "Faltan fraseos (fraseQR1, fraseQR2 y/o fraseQR3). Guarda todas las respuestas antes de continuar.")
+            return None
+
+        relato.relato_inicial = relato_input
+        final_payload = {"relato_inicial": relato_input, "qap1": qap1, "qap2": qap2, "qap3": qap3}
+        return relato, json.dumps(final_payload, ensure_ascii=False), "reporte_final"
+
+    def _guardar_relato_final(self, relato, texto: str, n):
+        relato.relato_final = texto
+        relato.save(update_fields=["relato_inicial", "relato_final"])
+        return "Relato final generado correctamente."
+
+    # acción -> (preparar, guardar, mensaje de error | None = la IA puede fallar)
+    ACCIONES_IA = {
+        "generar_relato": ("_preparar_relato", "_guardar_relato", "Error generando relato inicial"),
+        "generar_pregunta_1": ("_preparar_pregunta", "_guardar_pregunta", "Error generando Pregunta 1"),
+        "generar_pregunta_2": ("_preparar_pregunta", "_guardar_pregunta", "Error generando Pregunta 2"),
+        "generar_pregunta_3": ("_preparar_pregunta", "_guardar_pregunta", "Error generando Pregunta 3"),
+        "guardar_respuesta_1": ("_preparar_respuesta", "_guardar_respuesta", None),
+        "guardar_respuesta_2": ("_preparar_respuesta", "_guardar_respuesta", None),
+        "guardar_respuesta_3": ("_preparar_respuesta", "_guardar_respuesta", None),
+        "generar_relato_final": ("_preparar_relato_final", "_guardar_relato_final", "Error generando relato final"),
+    }
+
+    def _encolar(self, request, codigo: str, action: str, relato, payload: str, prompt_key: str):
+        # lo preparado en memoria (respuesta_n, relato base) queda en BD antes de que lo lea el worker
+        if relato is not None:
+            relato.save()
+        trabajos_ia.encolar(
+            "relato", self.accidente, usuario=request.user,
+            volver={"path": reverse("accidentes:ia_relato", args=[codigo]),
+                    "target": "#relato-wrapper", "swap": "innerHTML"},
+            accion=action, relato_id=str(relato.pk) if relato else None, payload=payload, prompt_key=prompt_key,
+        )
 
     # ----------------- HTTP -----------------
-    def get(self, request, codigo: str):
-        return self._render(request, codigo)
+    async def get(self, request, codigo: str):
+        return await sync_to_async(self._render)(request, codigo)
 
-    def post(self, request, codigo: str):
-        accidente = self.accidente_from(codigo)
+    async def post(self, request, codigo: str):
         action = (request.POST.get("action") or "").strip()
-        logger.debug("POST action=%s accidente_id=%s", action, getattr(accidente, "pk", None))
-
-        # == 1) Generar relato inicial ==
-        if action == "generar_relato":
-            Relato.objects.filter(accidente=accidente, is_current=True).update(is_current=False)
+        logger.debug("POST action=%s accidente_id=%s", action, getattr(self.accidente, "pk", None))
+
+        pasos = self.ACCIONES_IA.get(action)
+        if pasos is None:
+            return await sync_to_async(self._post_bd)(request, codigo, action)
+
+        preparar, guardar, error = pasos
+        n = int(action[-1]) if action[-1].isdigit() else None
+        llamada = await sync_to_async(getattr(self, preparar))(request, n)
+        if llamada is not None and trabajos_ia.EN_COLA:
+            await sync_to_async(self._encolar)(request, codigo, action, *llamada)
+        elif llamada is not None:
+            relato, payload, prompt_key = llamada
+            if logger.isEnabledFor(logging.DEBUG):
+                self._dbg_blob(f"IA in {prompt_key}", payload)
             try:
-                initial_story = self._gather_data(accidente)
-                if logger.isEnabledFor(logging.DEBUG):
-                    self._dbg_blob("IA in relato_inicial", initial_story)
-
-                texto_relato = call_ia_text(initial_story, prompt_key="relato_inicial").strip()
-
+                salida = (await acall_ia_text(payload, prompt_key=prompt_key)).strip()
                 if logger.isEnabledFor(logging.DEBUG):
-                    self._dbg_blob("IA out relato_inicial", texto_relato)
-
-                Relato.objects.create(
-                    accidente=accidente,
-                    relato_inicial=texto_relato,
-                    is_current=True,
-                )
-                messages.success(request, "Relato inicial generado.")
+                    self._dbg_blob(f"IA out {prompt_key}", salida)
             except Exception as e:
-                logger.exception("Error generando relato inicial")
-                messages.error(request, f"Error generando relato inicial: {e}")
-            return self._render(request, codigo)
+                logger.exception("Error en %s (%s)", prompt_key, action)
+                salida = None
+                if error:
+                    messages.error(request, f"{error}: {e}")
+            if salida is not None or not error:
+                messages.success(request, await sync_to_async(getattr(self, guardar))(relato, salida, n))
+        return await sync_to_async(self._render)(request, codigo)
+
+    def _post_bd(self, request, codigo: str, action: str):
+        """Acciones sin IA (solo BD)."""
+        accidente = self.accidente
 
         # == Guardar cambios al relato inicial ==
         if action == "guardar_relato_inicial":
@@ -227,224 +377,6 @@ class RelatoIAView(LoginRequiredMixin, AccidenteScopedByCodigoMixin, View):  # 
             messages.success(request, "Relato guardado.")
             return self._render(request, codigo)
 
-        # == 2) Generar P1 ==
-        if action == "generar_pregunta_1":
-            relato = Relato.objects.filter(accidente=accidente, is_current=True).first()
-            if not relato:
-                messages.error(request, "No existe un relato activo.")
-                return self._render(request, codigo)
-
-            relato_input = (request.POST.get("relato_input") or "").strip()
-            if relato_input:
-                if logger.isEnabledFor(logging.DEBUG):
-                    self._dbg_blob("Persist relato_inicial before P1", relato_input)
-                relato.relato_inicial = relato_input
-                relato.save()
-
-            try:
-                if logger.isEnabledFor(logging.DEBUG):
-                    self._dbg_blob("IA in investiga1", relato.relato_inicial)
-                p1 = call_ia_text(relato.relato_inicial, prompt_key="investiga1").strip()
-                if logger.isEnabledFor(logging.DEBUG):
-                    self._dbg_blob("IA out investiga1 (P1)", p1)
-
-                relato.pregunta_1 = p1
-                relato.save(update_fields=["relato_inicial", "pregunta_1"])
-                messages.success(request, "Pregunta 1 generada.")
-            except Exception as e:
-                logger.exception("Error generando pregunta 1")
-                messages.error(request, f"Error generando Pregunta 1: {e}")
-            return self._render(request, codigo)
-
-        # Guardar R1 (+ fraseQR1)
-        if action == "guardar_respuesta_1":
-            relato = Relato.objects.filter(accidente=accidente, is_current=True).first()
-            if not relato or not relato.pregunta_1:
-                messages.error(request, "Primero genera la Pregunta 1.")
-                return self._render(request, codigo)
-            r1 = (request.POST.get("respuesta_1") or "").strip()
-            if not r1:
-                messages.warning(request, "Debes escribir la respuesta 1.")
-                return self._render(request, codigo)
-
-            if logger.isEnabledFor(logging.DEBUG):
-                self._dbg_blob("Save respuesta_1", r1)
-            relato.respuesta_1 = r1
-            try:
-                frase = self._phrase_qa(relato.pregunta_1, r1)
-                self._set_frase_qr(relato, 1, frase)
-            except Exception:
-                logger.exception("No se pudo generar/guardar fraseQR1")
-            relato.save(update_fields=["respuesta_1"])
-            messages.success(request, "Respuesta 1 guardada.")
-            return self._render(request, codigo)
-
-        # == 4) Generar P2 (usa fraseQR1 desde BD) ==
-        if action == "generar_pregunta_2":
-            relato = Relato.objects.filter(accidente=accidente, is_current=True).first()
-            if not relato or not (relato.pregunta_1 and relato.respuesta_1):
-                messages.error(request, "Para generar la Pregunta 2, debes tener la Pregunta 1 y su respuesta.")
-                return self._render(request, codigo)
-
-            relato_input = (request.POST.get("relato_input") or "").strip()
-            if relato_input:
-                if logger.isEnabledFor(logging.DEBUG):
-                    self._dbg_blob("Persist relato_inicial before P2", relato_input)
-                relato.relato_inicial = relato_input
-                relato.save(update_fields=["relato_inicial"])
-
-            qap1 = self._get_frase_qr(relato, 1)
-            if not qap1:
-                messages.warning(request, "Falta el fraseo 1 (fraseQR1). Guarda la Respuesta 1 para continuar.")
-                return self._render(request, codigo)
-
-            try:
-                payload = {"relato_inicial": relato.relato_inicial, "qap": qap1}
-                if logger.isEnabledFor(logging.DEBUG):
-                    self._dbg_blob("IA in investiga2", payload)
-
-                p2 = call_ia_text(json.dumps(payload, ensure_ascii=False), prompt_key="investiga2").strip()
-
-                if logger.isEnabledFor(logging.DEBUG):
-                    self._dbg_blob("IA out investiga2 (P2)", p2)
-
-                relato.pregunta_2 = p2
-                relato.save(update_fields=["pregunta_2"])
-                messages.success(request, "Pregunta 2 generada.")
-            except Exception as e:
-                logger.exception("Error generando pregunta 2")
-                messages.error(request, f"Error generando Pregunta 2: {e}")
-            return self._render(request, codigo)
-
-        # Guardar R2 (+ fraseQR2)
-        if action == "guardar_respuesta_2":
-            relato = Relato.objects.filter(accidente=accidente, is_current=True).first()
-            if not relato or not relato.pregunta_2:
-                messages.error(request, "Primero genera la Pregunta 2.")
-                return self._render(request, codigo)
-            r2 = (request.POST.get("respuesta_2") or "").strip()
-            if not r2:
-                messages.warning(request, "Debes escribir la respuesta 2.")
-                return self._render(request, codigo)
-
-            if logger.isEnabledFor(logging.DEBUG):
-                self._dbg_blob("Save respuesta_2", r2)
-            relato.respuesta_2 = r2
-            try:
-                frase = self._phrase_qa(relato.pregunta_2, r2)
-                self._set_frase_qr(relato, 2, frase)
-            except Exception:
-                logger.exception("No se pudo generar/guardar fraseQR2")
-            relato.save(update_fields=["respuesta_2"])
-            messages.success(request, "Respuesta 2 guardada.")
-            return self._render(request, codigo)
-
-        # == 6) Generar P3 (usa fraseQR1 + fraseQR2 desde BD) ==
-        if action == "generar_pregunta_3":
-            relato = Relato.objects.filter(accidente=accidente, is_current=True).first()
-            if not relato or not (relato.pregunta_1 and relato.respuesta_1 and relato.pregunta_2 and relato.respuesta_2):
-                messages.error(request, "Para generar la Pregunta 3, debes tener P1+R1 y P2+R2.")
-                return self._render(request, codigo)
-
-            relato_input = (request.POST.get("relato_input") or "").strip()
-            if relato_input:
-                if logger.isEnabledFor(logging.DEBUG):
-                    self._dbg_blob("Persist relato_inicial before P3", relato_input)
-                relato.relato_inicial = relato_input
-                relato.save(update_fields=["relato_inicial"])
-
-            qap1 = self._get_frase_qr(relato, 1)
-            qap2 = self._get_frase_qr(relato, 2)
-            if not qap1 or not qap2:
-                messages.warning(request, "Faltan fraseos previos (fraseQR1 y/o fraseQR2). Guarda las respuestas anteriores.")
-                return self._render(request, codigo)
-
-            try:
-                payload = {"relato_inicial": relato.relato_inicial, "qap1": qap1, "qap2": qap2}
-                if logger.isEnabledFor(logging.DEBUG):
-                    self._dbg_blob("IA in investiga3", payload)
-
-                p3 = call_ia_text(json.dumps(payload, ensure_ascii=False), prompt_key="investiga3").strip()
-
-                if logger.isEnabledFor(logging.DEBUG):
-                    self._dbg_blob("IA out investiga3 (P3)", p3)
-
-                relato.pregunta_3 = p3
-                relato.save(update_fields=["pregunta_3"])
-                messages.success(request, "Pregunta 3 generada.")
-            except Exception as e:
-                logger.exception("Error generando pregunta 3")
-                messages.error(request, f"Error generando Pregunta 3: {e}")
-            return self._render(request, codigo)
-
-        # Guardar R3 (+ fraseQR3)
-        if action == "guardar_respuesta_3":
-            relato = Relato.objects.filter(accidente=accidente, is_current=True).first()
-            if not relato or not relato.pregunta_3:
-                messages.error(request, "Primero genera la Pregunta 3.")
-                return self._render(request, codigo)
-            r3 = (request.POST.get("respuesta_3") or "").strip()
-            if not r3:
-                messages.warning(request, "Debes escribir la respuesta 3.")
-                return self._render(request, codigo)
-
-            if logger.isEnabledFor(logging.DEBUG):
-                self._dbg_blob("Save respuesta_3", r3)
-            relato.respuesta_3 = r3
-            try:
-                frase = self._phrase_qa(relato.pregunta_3, r3)
-                self._set_frase_qr(relato, 3, frase)
-            except Exception:
-                logger.exception("No se pudo generar/guardar fraseQR3")
-            relato.save(update_fields=["respuesta_3"])
-            messages.success(request, "Respuesta 3 guardada.")
-            return self._render(request, codigo)
-
-        # == 8) Generar relato final (usa fraseQRn desde BD; NO re-frasea) ==
-        if action == "generar_relato_final":
-            relato = Relato.objects.filter(accidente=accidente, is_current=True).first()
-            if not relato:
-                messages.error(request, "No existe un relato activo.")
-                return self._render(request, codigo)
-
-            relato_input = (request.POST.get("relato_input") or "").strip() or (relato.relato_inicial or "")
-            if not relato_input:
-                messages.warning(request, "El relato base no puede estar vacío.")
-                return self._render(request, codigo)
-
-            if not (relato.pregunta_1 and relato.respuesta_1 and
-                    relato.pregunta_2 and relato.respuesta_2 and
-                    relato.pregunta_3 and relato.respuesta_3):
-                messages.warning(request, "Debes completar las tres preguntas y sus respuestas antes de generar el final.")
-                return self._render(request, codigo)
-
-            qap1 = self._get_frase_qr(relato, 1)
-            qap2 = self._get_frase_qr(relato, 2)
-            qap3 = self._get_frase_qr(relato, 3)
-            if not (qap1 and qap2 and qap3):
-                messages.warning(request, "Faltan fraseos (fraseQR1, fraseQR2 y/o fraseQR3). Guarda todas las respuestas antes de continuar.")
-                return self._render(request, codigo)
-
-            try:
-                relato.relato_inicial = relato_input
-
-                final_payload = {"relato_inicial": relato_input, "qap1": qap1, "qap2": qap2, "qap3": qap3}
-                if logger.isEnabledFor(logging.DEBUG):
-                    self._dbg_blob("IA in reporte_final", final_payload)
-
-                out_final = call_ia_text(json.dumps(final_payload, ensure_ascii=False), prompt_key="reporte_final").strip()
-
-                if logger.isEnabledFor(logging.DEBUG):
-                    self._dbg_blob("IA out reporte_final", out_final)
-
-                relato.relato_final = out_final
-                relato.save(update_fields=["relato_inicial", "relato_final"])
-                messages.success(request, "Relato final generado correctamente.")
-            except Exception as e:
-                logger.exception("Error generando relato final")
-                messages.error(request, f"Error generando relato final: {e}")
-            return self._render(request, codigo)
-
         # == Guardar manual del relato final ==
         if action == "guardar_relato_final":
             relato = Relato.objects.filter(accidente=accidente, is_current=True).first()
@@ -475,3 +407,72 @@ class RelatoIAView(LoginRequiredMixin, AccidenteScopedByCodigoMixin, View):  # 
 
         messages.error(request, "Acción no reconocida.")
         return self._render(request, codigo)
+
+
+class RelatoIAStreamView(EventStreamMixin, RelatoIAView):
+    """
+    Pasos IA del relato con la respuesta en streaming (text/event-stream), para
+    accidentes/js/texto_stream.js:
+      event: parcial -> {"texto": fragmento}
+      event: fin     -> {"ok": true, "mensaje": ...}   guardado; recargar el partial
+      event: error   -> {"message": ...}              nada se guardó
+
+    Solo los pasos cuyo texto se muestra (ACCIONES_STREAM). El guardado del paso
+    (mismo guardar() que RelatoIAView) ocurre recién cuando el stream termina.
+    """
+    ACCIONES_STREAM = (
+        "generar_relato", "generar_pregunta_1", "generar_pregunta_2", "generar_pregunta_3",
+        "generar_relato_final",
+    )
+
+    async def _eventos(self, action: str, guardar: str, error: str, n, relato, payload: str, prompt_key: str):
+        partes = []
+        try:
+            async for fragmento in astream_ia_text(payload, prompt_key=prompt_key):
+                partes.append(fragmento)
+                yield self._evento("parcial", {"texto": fragmento})
+            salida = "".join(partes).strip()
+            if logger.isEnabledFor(logging.DEBUG):
+                self._dbg_blob(f"IA out {prompt_key}", salida)
+            mensaje = await sync_to_async(getattr(self, guardar))(relato, salida, n)
+            yield self._evento("fin", {"ok": True, "mensaje": mensaje})
+        except Exception as e:
+            logger.exception("Error en %s (%s, stream)", prompt_key, action)
+            yield self._evento("error", {"message": f"{error}: {e}"})
+
+    async def post(self, request, codigo: str):
+        action = (request.POST.get("action") or "").strip()
+        if action not in self.ACCIONES_STREAM:
+            return HttpResponseBadRequest("Acción sin streaming.")
+
+        preparar, guardar, error = self.ACCIONES_IA[action]
+        n = int(action[-1]) if action[-1].isdigit() else None
+        llamada = await sync_to_async(getattr(self, preparar))(request, n)
+        if llamada is None:
+            # preparar() dejó el motivo como mensaje
+            motivo = " ".join(str(m) for m in messages.get_messages(request))
+            return HttpResponseBadRequest(motivo or f"{error}.")
+        return self._event_stream(self._eventos(action, guardar, error, n, *llamada))
+
+
+def ejecutar_trabajo(trabajo) -> dict:
+    """Paso IA del relato en cola (worker_ia): misma llamada y guardado que la vista."""
+    p = trabajo.parametros
+    _, guardar, error = RelatoIAView.ACCIONES_IA[p["accion"]]
+    vista = RelatoIAView()
+    vista.accidente = trabajo.accidente
+    relato = Relato.objects.filter(pk=p["relato_id"]).first() if p.get("relato_id") else None
+    if p.get("relato_id") and relato is None:
+        raise ValueError("El relato ya no existe.")
+    n = int(p["accion"][-1]) if p["accion"][-1].isdigit() else None
+
+    trabajos_ia.avanzar(trabajo, 10, "Consultando a la IA…")
+    try:
+        salida = call_ia_text(p["payload"], prompt_key=p["prompt_key"]).strip()
+    except Exception as e:
+        if error:
+            raise RuntimeError(f"{error}: {e}") from e
+        logger.exception("Error en %s (%s)", p["prompt_key"], p["accion"])
+        salida = None
+    trabajos_ia.avanzar(trabajo, 90, "Guardando…")
+    return {"mensaje": getattr(vista, guardar)(relato, salida, n)}
@@ -0,0 +1,67 @@
+# accidentes/views_api/trabajos.py
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+import json
+
+from django.contrib import messages
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.http import HttpResponse, JsonResponse
+from django.shortcuts import get_object_or_404, render
+from django.views import View
+
+from accidentes.access import accidentes_accesibles
+from accidentes.models import TrabajoIA
+from accidentes.utils import trabajos_ia
+
+
+class TrabajoIAView(LoginRequiredMixin, View):
+    """
+    Estado de un trabajo IA en cola (lo consulta accidentes/partials/_trabajo_ia.html).
+
+    GET (HTMX)          -> activo: el aviso actualizado (vuelve a consultar en POLL_S seg.)
+                           terminado: 200 vacío + HX-Location / HX-Redirect / HX-Refresh
+                           según parametros["volver"]; el resultado llega como mensaje.
+    GET ?formato=json   -> {"estado", "progreso", "mensaje", "error", "resultado"}
+
+    Seguridad: solo trabajos de accidentes que el usuario puede abrir (404 si no).
+    """
+    template_name = "accidentes/partials/_trabajo_ia.html"
+
+    def get(self, request, pk: int):
+        trabajo = get_object_or_404(
+            TrabajoIA, pk=pk, accidente__in=accidentes_accesibles(request.user)
+        )
+
+        if request.GET.get("formato") == "json":
+            return JsonResponse({
+                "id": trabajo.pk,
+                "tipo": trabajo.tipo,
+                "estado": trabajo.estado,
+                "progreso": trabajo.progreso,
+                "mensaje": trabajo.mensaje,
+                "error": trabajo.error,
+                "resultado": trabajo.resultado,
+            })
+
+        if trabajo.activo:
+            return render(request, self.template_name, {
+                "trabajo_ia": trabajo, "trabajo_ia_poll_s": trabajos_ia.POLL_S,
+            })
+
+        if trabajo.estado == TrabajoIA.ERROR:
+            messages.error(request, trabajo.error or "La generación con IA falló.")
+        elif (trabajo.resultado or {}).get("mensaje"):
+            messages.success(request, trabajo.resultado["mensaje"])
+
+        response = HttpResponse("")
+        volver = (trabajo.parametros or {}).get("volver") or {}
+        if volver.get("redirigir") and trabajo.estado == TrabajoIA.LISTO:
+            response["HX-Redirect"] = volver["redirigir"]
+        elif volver.get("path"):
+            response["HX-Location"] = json.dumps(
+                {k: volver[k] for k in ("path", "target", "swap") if volver.get(k)}
+            )
+        else:
+            response["HX-Refresh"] = "true"
+        return response
@@ -1,19 +1,27 @@
-from .views_api.prompt_utils    import call_ia_json, call_ia_text
+from .views_api.prompt_utils    import call_ia_json, call_ia_text, acall_ia_json, acall_ia_text
 from .views_api.fotos_documentos import FotosDocumentosView
 from .views_api.declaraciones   import DeclaracionesIAView
 from .views_api.relato          import RelatoIAView
+from .views_api.relato          import RelatoIAStreamView
 from .views_api.hechos          import HechosIAView
+from .views_api.hechos          import HechosIAStreamView
 from .views_api.arbol           import ArbolIAView
+from .views_api.arbol           import ArbolLayoutView
+from .views_api.arbol           import ArbolLoteView
+from .views_api.arbol           import ArbolDiffView
+from .views_api.arbol           import ArbolBuscarView
 from .views_api.arbol           import GenerarArbolIACreateView
+from .views_api.arbol           import GenerarArbolIAStreamView
 from .views_api.medidas_correctivas import MedidasCorrectivasView
 
 from .views_api.generar_informe import GenerarInformeIAView
+from .views_api.trabajos        import TrabajoIAView
 
 
 __all__ = [
-    "call_ia_json", "call_ia_text",
+    "call_ia_json", "call_ia_text", "acall_ia_json", "acall_ia_text",
     "FotosDocumentosView", "DeclaracionesIAView",
-    "RelatoIAView", "HechosIAView", "ArbolIAView",
-    "MedidasCorrectivasView", "GenerarArbolIACreateView",
-    "GenerarInformeIAView"
+    "RelatoIAView", "RelatoIAStreamView", "HechosIAView", "HechosIAStreamView", "ArbolIAView", "ArbolLayoutView", "ArbolLoteView", "ArbolDiffView", "ArbolBuscarView",
+    "MedidasCorrectivasView", "GenerarArbolIACreateView", "GenerarArbolIAStreamView",
+    "GenerarInformeIAView", "TrabajoIAView",
 ]
\ No newline at end of file
@@ -1,12 +1,17 @@
 # accounts/middleware.py
 from django.shortcuts import redirect
 from django.urls import reverse
+from django.utils.deprecation import MiddlewareMixin
 
-class ForcePasswordChangeMiddleware:
-    def __init__(self, get_response):
-        self.get_response = get_response
 
-    def __call__(self, request):
+class ForcePasswordChangeMiddleware(MiddlewareMixin):
+    """
+    MiddlewareMixin (sync + async): un middleware solo-sync obligaría a ASGI a
+    correr toda la cadena (incluidas las vistas IA async) en un hilo.
+    En process_view ya existe request.resolver_match.
+    """
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
         user = getattr(request, "user", None)
         if user and user.is_authenticated and getattr(user, "must_change_password", False):
             rm = getattr(request, "resolver_match", None)
@@ -25,4 +30,4 @@ class ForcePasswordChangeMiddleware:
             # Evita loop; si no está en las rutas permitidas, manda a cambiarla
             if current_name not in allowed:
                 return redirect(reverse("accounts:password_change"))
-        return self.get_response(request)
+        return None
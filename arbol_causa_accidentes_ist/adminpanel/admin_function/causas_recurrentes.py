@@ -0,0 +1,57 @@
+# adminpanel/admin_function/causas_recurrentes.py
+# -*- coding: utf-8 -*-
+"""
+Tablero de causas recurrentes: solo lee CausaCluster (precalculado por
+`manage.py agrupar_causas`), nunca abre árboles en la request.
+"""
+from __future__ import annotations
+
+from django.views.generic import TemplateView
+
+from accidentes.models import CausaCluster, Empresas, Holdings
+from accidentes.utils.causa_clusters import ambito_de
+from adminpanel.permissions import AdminPanelAccessMixin
+
+# Roles que ven todos los casos y pueden elegir un holding / empresa
+ROLES_GLOBALES = {"admin", "admin_ist"}
+
+
+class CausasRecurrentesView(AdminPanelAccessMixin, TemplateView):
+    template_name = "adminpanel/causas_recurrentes.html"
+
+    def _ambito(self):
+        ambito = ambito_de(self.request.user)
+        if ambito is None or getattr(self.request.user, "rol", None) not in ROLES_GLOBALES:
+            return ambito
+        # super-roles: ?holding_id= / ?empresa_id= para acotar (ya precalculado)
+        for clave, tipo in (("empresa_id", CausaCluster.AMBITO_EMPRESA), ("holding_id", CausaCluster.AMBITO_HOLDING)):
+            try:
+                return tipo, int(self.request.GET[clave])
+            except (KeyError, TypeError, ValueError):
+                continue
+        return ambito
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        ctx["sidebar_active"] = "causas_recurrentes"
+
+        ambito = self._ambito()
+        grupos = list(CausaCluster.objects.filter(ambito=ambito[0], ambito_id=ambito[1])) if ambito else []
+        ctx["grupos"] = grupos
+        ctx["ambito"] = ambito
+        ctx["calculado_en"] = grupos[0].calculado_en if grupos else None
+        ctx["total_causas"] = grupos[0].total_causas if grupos else 0
+        ctx["total_casos"] = grupos[0].total_casos if grupos else 0
+        ctx["max_casos"] = max((g.n_casos for g in grupos), default=0)
+
+        if getattr(self.request.user, "rol", None) in ROLES_GLOBALES:
+            calculados = CausaCluster.objects.values_list("ambito_id", flat=True).distinct()
+            ctx["filtro_holdings"] = Holdings.objects.filter(
+                pk__in=calculados.filter(ambito=CausaCluster.AMBITO_HOLDING)
+            ).order_by("nombre")
+            ctx["filtro_empresas"] = Empresas.objects.filter(
+                pk__in=calculados.filter(ambito=CausaCluster.AMBITO_EMPRESA)
+            ).order_by("empresa_sel")
+            ctx["sel_holding_id"] = self.request.GET.get("holding_id") or ""
+            ctx["sel_empresa_id"] = self.request.GET.get("empresa_id") or ""
+        return ctx
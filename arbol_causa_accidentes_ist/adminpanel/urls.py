@@ -23,6 +23,7 @@ from adminpanel.admin_function.report_excel import (
     ReporteExcelTableHTMX,
     ReporteExcelFiltersHTMX
 )
+from adminpanel.admin_function.causas_recurrentes import CausasRecurrentesView
 
 app_name = "adminpanel"
 
@@ -49,4 +50,5 @@ urlpatterns = [
     path("reportes/excel/preview/", ReporteExcelPreviewHTMX.as_view(), name="report_excel_preview"),
     path("report/excel/table/", ReporteExcelTableHTMX.as_view(), name="report_excel_table"),
     path("reportes/excel/filters/", ReporteExcelFiltersHTMX.as_view(), name="report_excel_filters"),
+    path("reportes/causas/", CausasRecurrentesView.as_view(), name="causas_recurrentes"),
 ]
@@ -141,6 +141,7 @@ TEMPLATES = [
 
 
 WSGI_APPLICATION = "core.wsgi.application"
+ASGI_APPLICATION = "core.asgi.application"
 
 
 # Database
@@ -258,3 +259,53 @@ DEFAULT_FROM_EMAIL    = os.getenv("DEFAULT_FROM_EMAIL", "no-reply@ist.cl")
 # Backend personalizado para envío de emails
 EMAIL_BACKEND = "core.email_backends.ist_via_token.EmailBackend"
 
+
+# Caché compartida (disco) de SVG del árbol de causas, direccionada por sha256 del DOT
+ARBOL_SVG_CACHE_DIR       = Path(os.getenv("ARBOL_SVG_CACHE_DIR", BASE_DIR / "cache" / "arbol_svg"))
+ARBOL_SVG_CACHE_MAX_BYTES = int(os.getenv("ARBOL_SVG_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+ARBOL_SVG_CACHE_MAX_ENTRIES = int(os.getenv("ARBOL_SVG_CACHE_MAX_ENTRIES", "2000"))
+
+# Servicio de render Graphviz: cupos por proceso, espera máxima en cola y timeout por render (seg.)
+ARBOL_RENDER_MAX_CONCURRENCIA = int(os.getenv("ARBOL_RENDER_MAX_CONCURRENCIA", "2"))
+ARBOL_RENDER_COLA_TIMEOUT     = float(os.getenv("ARBOL_RENDER_COLA_TIMEOUT", "5"))
+ARBOL_RENDER_TIMEOUT          = float(os.getenv("ARBOL_RENDER_TIMEOUT", "15"))
+
+# Motor de dibujo del árbol: "nativo" (layout propio, sin Graphviz) o "dot"
+ARBOL_RENDER_ENGINE    = os.getenv("ARBOL_RENDER_ENGINE", "nativo")
+ARBOL_LAYOUT_CACHE_MAX = int(os.getenv("ARBOL_LAYOUT_CACHE_MAX", "20000"))
+# Dibujar el árbol en el navegador (layout JSON + deltas) en vez de enviar el SVG completo
+ARBOL_DIBUJO_CLIENTE   = os.getenv("ARBOL_DIBUJO_CLIENTE", "0") == "1"
+# Máximo de operaciones por lote en el endpoint de edición masiva del árbol
+ARBOL_LOTE_MAX_OPERACIONES = int(os.getenv("ARBOL_LOTE_MAX_OPERACIONES", "200"))
+# Árboles grandes: dibujar solo N niveles alrededor del nodo actual (desde cierto tamaño)
+ARBOL_VENTANA_NIVELES   = int(os.getenv("ARBOL_VENTANA_NIVELES", "3"))
+ARBOL_VENTANA_MIN_NODOS = int(os.getenv("ARBOL_VENTANA_MIN_NODOS", "60"))
+# Generación del árbol en streaming (árbol parcial mientras responde la IA)
+ARBOL_GENERACION_STREAM = os.getenv("ARBOL_GENERACION_STREAM", "1") == "1"
+ARBOL_STREAM_INTERVALO  = float(os.getenv("ARBOL_STREAM_INTERVALO", "0.5"))
+
+# Índice de búsqueda de nodos del árbol: máximo de nodos por búsqueda
+ARBOL_INDICE_MAX_RESULTADOS = int(os.getenv("ARBOL_INDICE_MAX_RESULTADOS", "200"))
+# Causas recurrentes (manage.py agrupar_causas): similitud coseno mínima y grupos por ámbito
+ARBOL_CLUSTER_UMBRAL = float(os.getenv("ARBOL_CLUSTER_UMBRAL", "0.5"))
+ARBOL_CLUSTER_MAX    = int(os.getenv("ARBOL_CLUSTER_MAX", "50"))
+
+# Generación IA en cola (manage.py worker_ia); "0" = en la request (vistas async)
+IA_EN_COLA               = os.getenv("IA_EN_COLA", "1") == "1"
+IA_TRABAJO_POLL_S        = int(os.getenv("IA_TRABAJO_POLL_S", "2"))
+IA_TRABAJO_TIMEOUT_S     = int(os.getenv("IA_TRABAJO_TIMEOUT_S", "300"))
+IA_TRABAJO_MAX_INTENTOS  = int(os.getenv("IA_TRABAJO_MAX_INTENTOS", "2"))
+# Single-flight IA entre procesos: con PostgreSQL usa advisory locks + LISTEN/NOTIFY;
+# sin él (SQLite en desarrollo), flock sobre archivos en este directorio
+IA_SINGLE_FLIGHT_DIR     = Path(os.getenv("IA_SINGLE_FLIGHT_DIR", BASE_DIR / "cache" / "ia_vuelos"))
+# Almacén persistente de respuestas IA por contenido (por tenant; manage.py respuestas_ia)
+IA_RESPUESTAS            = os.getenv("IA_RESPUESTAS", "1") == "1"
+IA_RESPUESTAS_MAX_DIAS   = int(os.getenv("IA_RESPUESTAS_MAX_DIAS", "30"))
+IA_RESPUESTAS_MAX        = int(os.getenv("IA_RESPUESTAS_MAX", "5000"))
+IA_RESPUESTAS_MAX_MB     = int(os.getenv("IA_RESPUESTAS_MAX_MB", "50"))
+# Relato y hechos en streaming (texto de la IA a medida que llega; SSE)
+IA_TEXTO_STREAM          = os.getenv("IA_TEXTO_STREAM", "1") == "1"
+# Prompts IA (se validan al cargar y se recargan al cambiar el archivo)
+IA_PROMPT_FILE           = Path(os.getenv("IA_PROMPT_FILE", BASE_DIR / "accidentes" / "setting" / "prompt" / "prompt.json"))
+# Presupuesto de tokens del payload IA (se reduce por prioridad de campos, ver accidentes/utils/payload_ia.py)
+IA_MAX_PAYLOAD_TOKENS    = int(os.getenv("IA_MAX_PAYLOAD_TOKENS", "12000"))
@@ -2,8 +2,9 @@ bind = "0.0.0.0:5005"
 
 vcpus = 4                   
 workers = 4
-worker_class = "gthread"
-threads = 4                 
+# ASGI (core.asgi): las vistas IA son async y la espera al modelo no ocupa un
+# hilo; el resto de las vistas (sync) corre en hilos de asgiref
+worker_class = "uvicorn_worker.UvicornWorker"
 
 preload_app = True
 timeout = 120